@@ -0,0 +1,18 @@
+-- CreateTable
+CREATE TABLE "RotaSeguraSegmento" (
+    "id" SERIAL NOT NULL,
+    "rotaSeguraId" INTEGER NOT NULL,
+    "ordem" INTEGER NOT NULL,
+    "latInicio" DOUBLE PRECISION NOT NULL,
+    "lngInicio" DOUBLE PRECISION NOT NULL,
+    "latFim" DOUBLE PRECISION NOT NULL,
+    "lngFim" DOUBLE PRECISION NOT NULL,
+
+    CONSTRAINT "RotaSeguraSegmento_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE INDEX "RotaSeguraSegmento_rotaSeguraId_idx" ON "RotaSeguraSegmento"("rotaSeguraId");
+
+-- AddForeignKey
+ALTER TABLE "RotaSeguraSegmento" ADD CONSTRAINT "RotaSeguraSegmento_rotaSeguraId_fkey" FOREIGN KEY ("rotaSeguraId") REFERENCES "RotaSegura"("id") ON DELETE CASCADE ON UPDATE CASCADE;
@@ -0,0 +1,46 @@
+-- CreateTable
+CREATE TABLE "RotaSeguraAlteracao" (
+    "id" BIGSERIAL NOT NULL,
+    "rotaSeguraId" INTEGER NOT NULL,
+    "criadoEm" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "RotaSeguraAlteracao_pkey" PRIMARY KEY ("id")
+);
+
+-- Triggers: registram as ruas incluídas, editadas ou removidas (lidas pela rota-segura-api)
+CREATE OR REPLACE FUNCTION rota_segura_registrar_alteracao() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.id IS DISTINCT FROM NEW.id) THEN
+        INSERT INTO "RotaSeguraAlteracao" ("rotaSeguraId") VALUES (OLD.id);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        INSERT INTO "RotaSeguraAlteracao" ("rotaSeguraId") VALUES (NEW.id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rota_segura_segmento_registrar_alteracao() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD."rotaSeguraId" IS DISTINCT FROM NEW."rotaSeguraId") THEN
+        INSERT INTO "RotaSeguraAlteracao" ("rotaSeguraId") VALUES (OLD."rotaSeguraId");
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        INSERT INTO "RotaSeguraAlteracao" ("rotaSeguraId") VALUES (NEW."rotaSeguraId");
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'RotaSegura_alteracao') THEN
+        CREATE TRIGGER "RotaSegura_alteracao" AFTER INSERT OR UPDATE OR DELETE ON "RotaSegura"
+            FOR EACH ROW EXECUTE PROCEDURE rota_segura_registrar_alteracao();
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'RotaSeguraSegmento_alteracao') THEN
+        CREATE TRIGGER "RotaSeguraSegmento_alteracao" AFTER INSERT OR UPDATE OR DELETE ON "RotaSeguraSegmento"
+            FOR EACH ROW EXECUTE PROCEDURE rota_segura_segmento_registrar_alteracao();
+    END IF;
+END
+$$;
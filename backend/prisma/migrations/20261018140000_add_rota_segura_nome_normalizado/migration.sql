@@ -0,0 +1,12 @@
+-- AlterTable
+ALTER TABLE "RotaSegura" ADD COLUMN "nomeRuaNormalizado" TEXT;
+
+-- CreateIndex
+CREATE INDEX "RotaSegura_nomeRua_idx" ON "RotaSegura"("nomeRua");
+
+-- CreateIndex
+CREATE INDEX "RotaSegura_nomeRuaNormalizado_idx" ON "RotaSegura"("nomeRuaNormalizado");
+
+-- Busca por trecho do nome (LIKE '%termo%'); os valores são preenchidos pela API Python ao iniciar
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX "RotaSegura_nomeRuaNormalizado_trgm_idx" ON "RotaSegura" USING GIN ("nomeRuaNormalizado" gin_trgm_ops);
@@ -0,0 +1,14 @@
+-- Renomear uma rua (Prisma, psql...) sem informar nomeRuaNormalizado anula o valor antigo;
+-- a rota-segura-api normaliza o nome em Python enquanto estiver NULL e o preenche de novo
+CREATE OR REPLACE FUNCTION rota_segura_anular_nome_normalizado() RETURNS trigger AS $$
+BEGIN
+    IF NEW."nomeRua" IS DISTINCT FROM OLD."nomeRua"
+       AND NEW."nomeRuaNormalizado" IS NOT DISTINCT FROM OLD."nomeRuaNormalizado" THEN
+        NEW."nomeRuaNormalizado" := NULL;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "RotaSegura_nome_normalizado" BEFORE UPDATE OF "nomeRua" ON "RotaSegura"
+    FOR EACH ROW EXECUTE PROCEDURE rota_segura_anular_nome_normalizado();
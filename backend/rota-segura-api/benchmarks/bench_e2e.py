@@ -0,0 +1,292 @@
+"""
+Benchmark ponta a ponta da API de rotas.
+
+Sobe servidores locais no lugar do OSRM e do Nominatim (latência configurável),
+popula um banco SQLite temporário (ou o indicado em --database-url) com ruas
+sintéticas, sobe a API em uma thread e dispara /calculate-route, /analyze-street
+e /geocode com a concorrência pedida. Reporta vazão e p50/p95/p99 por endpoint
+(medidos no cliente) e por fase (a partir do histograma de /metrics), em JSON.
+
+Exemplo:
+    python benchmarks/bench_e2e.py --streets 5000 --requests 500 --concurrency 16 \\
+        --osrm-latency-ms 40 --nominatim-latency-ms 80 --output resultados.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from datasets import street_names, street_records  # noqa: E402
+from stub_servers import StubConfig, start_stub_server  # noqa: E402
+
+ENDPOINTS = ('calculate-route', 'analyze-street', 'geocode')
+SAMPLE_LINE = re.compile(r'^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(?P<labels>[^}]*)\})? (?P<value>\S+)$')
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_metrics(text: str) -> Dict[Tuple, float]:
+    """
+    Texto do Prometheus -> {(nome, labels ordenados): valor}
+    """
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        match = SAMPLE_LINE.match(line)
+        if match is None:
+            continue
+        labels = tuple(sorted(LABEL.findall(match.group('labels') or '')))
+        samples[(match.group('name'), labels)] = float(match.group('value'))
+    return samples
+
+
+def histogram_quantiles(before: Dict, after: Dict, name: str, label: str,
+                        quantiles=(0.5, 0.95, 0.99)) -> Dict[str, Dict]:
+    """
+    Quantis por valor de `label` a partir da diferença dos buckets (interpolação linear, como o histogram_quantile)
+    """
+    buckets: Dict[str, List[Tuple[float, float]]] = {}
+    for (sample_name, labels), value in after.items():
+        if sample_name != f'{name}_bucket':
+            continue
+        labels_dict = dict(labels)
+        delta = value - before.get((sample_name, labels), 0.0)
+        bound = float('inf') if labels_dict['le'] == '+Inf' else float(labels_dict['le'])
+        buckets.setdefault(labels_dict[label], []).append((bound, delta))
+
+    result = {}
+    for key, points in sorted(buckets.items()):
+        points.sort()
+        total = points[-1][1]
+        if total <= 0:
+            continue
+        summary = {'count': int(total)}
+        sum_key = (f'{name}_sum', ((label, key),))
+        summary['mean_ms'] = round((after.get(sum_key, 0.0) - before.get(sum_key, 0.0)) / total * 1000, 3)
+        for q in quantiles:
+            rank = q * total
+            previous_bound, previous_count = 0.0, 0.0
+            estimate = points[-2][0] if len(points) > 1 else 0.0
+            for bound, count in points:
+                if count >= rank:
+                    if bound == float('inf'):
+                        estimate = previous_bound
+                    elif count == previous_count:
+                        estimate = bound
+                    else:
+                        estimate = previous_bound + (bound - previous_bound) * (rank - previous_count) / (count - previous_count)
+                    break
+                previous_bound, previous_count = bound, count
+            summary[f'p{int(q * 100)}_ms'] = round(estimate * 1000, 3)
+        result[key] = summary
+    return result
+
+
+def counter_deltas(before: Dict, after: Dict, name: str) -> Dict[str, float]:
+    deltas = {}
+    for (sample_name, labels), value in after.items():
+        if sample_name == name:
+            key = ','.join(f'{k}={v}' for k, v in labels)
+            deltas[key] = value - before.get((sample_name, labels), 0.0)
+    return deltas
+
+
+def latency_summary(latencies: List[float], errors: int, elapsed: float) -> Dict:
+    values = np.asarray(latencies) * 1000
+    summary = {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round((len(latencies) + errors) / elapsed, 2) if elapsed > 0 else None
+    }
+    if len(values):
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        summary.update({
+            'mean_ms': round(float(values.mean()), 3),
+            'p50_ms': round(float(p50), 3),
+            'p95_ms': round(float(p95), 3),
+            'p99_ms': round(float(p99), 3),
+            'max_ms': round(float(values.max()), 3)
+        })
+    return summary
+
+
+def build_payloads(endpoint: str, count: int, addresses: List[str], names: List[str], rng: random.Random) -> List[Dict]:
+    payloads = []
+    for _ in range(count):
+        current_time = f'{rng.randint(0, 23):02d}:{rng.choice((0, 15, 30, 45)):02d}'
+        if endpoint == 'calculate-route':
+            start, end = rng.sample(addresses, 2)
+            payloads.append({'start_address': start, 'end_address': end, 'current_time': current_time})
+        elif endpoint == 'analyze-street':
+            payloads.append({'street_name': rng.choice(names), 'current_time': current_time})
+        else:
+            payloads.append({'address': rng.choice(addresses)})
+    return payloads
+
+
+def run_endpoint(base_url: str, endpoint: str, payloads: List[Dict], concurrency: int) -> Dict:
+    import requests
+
+    local = threading.local()
+    url = f'{base_url}/api/routing/{endpoint}'
+
+    def call(payload):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            response = session.post(url, json=payload, timeout=60)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(call, payloads))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, ok in results if ok]
+    return latency_summary(latencies, len(results) - len(latencies), elapsed)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ponta a ponta da API de rotas com OSRM/Nominatim locais.")
+    parser.add_argument('--streets', type=int, default=1000, help="ruas no banco")
+    parser.add_argument('--requests', type=int, default=200, help="requisições medidas por endpoint")
+    parser.add_argument('--warmup', type=int, default=20, help="requisições de aquecimento por endpoint (não medidas)")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help="lista separada por vírgulas")
+    parser.add_argument('--addresses', type=int, default=200, help="endereços distintos (controla acertos no cache)")
+    parser.add_argument('--osrm-latency-ms', type=float, default=30.0)
+    parser.add_argument('--nominatim-latency-ms', type=float, default=60.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--route-streets', type=int, default=12, help="ruas por rota devolvida pelo OSRM local")
+    parser.add_argument('--database-url', default=None, help="padrão: SQLite temporário")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help="arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    endpoints = [endpoint.strip() for endpoint in args.endpoints.split(',') if endpoint.strip()]
+    for endpoint in endpoints:
+        if endpoint not in ENDPOINTS:
+            parser.error(f"endpoint desconhecido: {endpoint}")
+
+    rng = random.Random(args.seed)
+    names = street_names(args.streets, seed=args.seed)
+    workdir = tempfile.mkdtemp(prefix='rota-segura-bench-')
+
+    stub_config = StubConfig(
+        names,
+        osrm_latency=args.osrm_latency_ms / 1000,
+        nominatim_latency=args.nominatim_latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        route_streets=args.route_streets,
+        seed=args.seed
+    )
+    stub_server, stub_url = start_stub_server(stub_config)
+
+    # a API lê a configuração na importação: o ambiente precisa estar pronto antes
+    os.environ.update({
+        'OSRM_URL': stub_url,
+        'NOMINATIM_URL': stub_url,
+        'DATABASE_URL': args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'GEOCODING_CACHE_PATH': os.path.join(workdir, 'geocoding_cache.sqlite3'),
+        'AI_WARMUP': 'sync',
+        'LOG_LEVEL': os.getenv('LOG_LEVEL', 'WARNING')
+    })
+
+    from sqlalchemy import create_engine
+    from src.services.rota_segura_loader import RotaSeguraLoader
+
+    engine = create_engine(os.environ['DATABASE_URL'])
+    loader = RotaSeguraLoader(engine, report_every=0)
+    loader.create_table()
+    seed_stats = loader.load(street_records(names, seed=args.seed))
+    engine.dispose()
+
+    from werkzeug.serving import make_server
+    from src.main import app
+
+    # sem o log de acesso do werkzeug (uma linha por requisição)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='api-server', daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    import requests
+    addresses = [f'{name}, {rng.randint(1, 2000)}' for name in rng.sample(names, min(args.addresses, len(names)))]
+    if len(addresses) < 2:
+        parser.error("são necessários pelo menos 2 endereços")
+
+    results = {}
+    phases = {}
+    counters = {}
+    for endpoint in endpoints:
+        if args.warmup:
+            run_endpoint(base_url, endpoint, build_payloads(endpoint, args.warmup, addresses, names, rng), args.concurrency)
+        before = parse_metrics(requests.get(f'{base_url}/metrics').text)
+        payloads = build_payloads(endpoint, args.requests, addresses, names, rng)
+        results[endpoint] = run_endpoint(base_url, endpoint, payloads, args.concurrency)
+        after = parse_metrics(requests.get(f'{base_url}/metrics').text)
+        phases[endpoint] = histogram_quantiles(before, after, 'rota_segura_phase_seconds', 'phase')
+        counters[endpoint] = {
+            'cache_events': counter_deltas(before, after, 'rota_segura_cache_events_total'),
+            'upstream_errors': counter_deltas(before, after, 'rota_segura_upstream_errors_total')
+        }
+
+    server.shutdown()
+    stub_server.shutdown()
+
+    report = {
+        'benchmark': 'e2e',
+        'timestamp': datetime.now().isoformat(),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'database_url')},
+        'database': os.environ['DATABASE_URL'].split(':', 1)[0],
+        'seed': seed_stats,
+        'endpoints': results,
+        'phases': phases,
+        'counters': counters
+    }
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+        print(f"Resultados gravados em {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
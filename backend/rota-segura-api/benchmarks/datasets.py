@@ -0,0 +1,137 @@
+"""
+Geração de ruas sintéticas (nomes em português, com acentos) para popular bancos de benchmark.
+"""
+
+import random
+import unicodedata
+from typing import Dict, Iterator, List
+
+PREFIXES = ['Rua', 'Avenida', 'Travessa', 'Alameda', 'Praça', 'Estrada', 'Rodovia', 'Largo', 'Viela', 'Marginal']
+TITLES = ['', '', '', 'Dr.', 'Professor', 'Coronel', 'General', 'Padre', 'Santa', 'São', 'Dona', 'Barão de', 'Visconde de']
+NAMES = [
+    'Conceição', 'Glicério', 'Jaguara', 'Quirino', 'Andrade Neves', 'José Paulino', 'Orosimbo Maia',
+    'Luiz Gama', 'Campos Sales', 'Júlio de Mesquita', 'Atílio Martini', 'Abolição', 'Jequitibás',
+    'Expedicionários', 'Saturnino de Brito', 'Benjamin Constant', 'Marechal Deodoro', 'Regente Feijó',
+    'Itapura', 'Taquaral', 'Guanabara', 'Cambuí', 'Barão Geraldo', 'Sousas', 'Joaquim Egídio',
+    'Anhumas', 'Piçarrão', 'Paranapanema', 'Amoreiras', 'Ipês', 'Jacarandás', 'Araucárias',
+    'Tiradentes', 'Inconfidência', 'Independência', 'Bandeirantes', 'Imigrantes', 'Tropeiros',
+    'Antônio Carlos', 'João Jorge', 'Hermantino Coelho', 'Maria Monteiro', 'Irmã Serafina',
+    'Nossa Senhora de Fátima', 'Brasília', 'Goiás', 'Paraná', 'Pará', 'Maranhão', 'Piauí', 'Ceará',
+    'Acácias', 'Magnólias', 'Hortênsias', 'Orquídeas', 'Violetas', 'Crisântemos', 'Begônias'
+]
+
+
+# Complementos que geram nomes contendo outros nomes (ex.: "Rua Goiás" e "Rua Goiás Velha")
+EXTENSIONS = ['Velha', 'Nova', 'Norte', 'Sul', 'de Cima', 'de Baixo', 'Prolongamento', 'Marginal']
+
+
+def _strip_accents(text: str) -> str:
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+
+
+def street_names(count: int, seed: int = 42, extension_ratio: float = 0.15) -> List[str]:
+    """
+    `count` nomes distintos e reprodutíveis. Repetições de uma combinação recebem sufixo
+    numérico e uma fração vira extensão de um nome já gerado (substrings sobrepostas).
+    """
+    rng = random.Random(seed)
+    names = []
+    occurrences: Dict[str, int] = {}
+    while len(names) < count:
+        if names and rng.random() < extension_ratio:
+            base = f'{rng.choice(names)} {rng.choice(EXTENSIONS)}'
+        else:
+            title = rng.choice(TITLES)
+            base = ' '.join(part for part in (rng.choice(PREFIXES), title, rng.choice(NAMES)) if part)
+        occurrence = occurrences.get(base, 0) + 1
+        occurrences[base] = occurrence
+        name = base if occurrence == 1 else f'{base} {occurrence}'
+        if occurrence > 1 and name in occurrences:
+            continue
+        occurrences.setdefault(name, 1)
+        names.append(name)
+    return names
+
+
+# Janelas de perigo: (início, fim) em horas; várias cruzam a meia-noite
+WINDOW_PATTERNS = [
+    ((17, 23), (4, 8)),    # noturna, cruza a meia-noite
+    ((22, 23), (0, 3)),    # madrugada curta
+    ((6, 9), (17, 20)),    # diurna (comércio)
+    ((11, 13), (14, 15)),  # curta no meio do dia
+    ((0, 0), (23, 23)),    # quase o dia inteiro
+]
+
+
+# Centro de Campinas e meia largura (em graus) da área onde as geometrias são geradas
+CENTER_LAT = -22.9064
+CENTER_LNG = -47.0616
+AREA_DEGREES = 0.15
+
+
+def street_geometry(rng: random.Random, segments: int = 4, step: float = 0.001) -> Dict:
+    """
+    LineString em zigue-zague (trechos de ~100 m) a partir de um ponto aleatório da área
+    """
+    lat = CENTER_LAT + rng.uniform(-AREA_DEGREES, AREA_DEGREES)
+    lng = CENTER_LNG + rng.uniform(-AREA_DEGREES, AREA_DEGREES)
+    coordinates = [[round(lng, 6), round(lat, 6)]]
+    for _ in range(segments):
+        lat += rng.uniform(-step, step)
+        lng += rng.uniform(-step, step)
+        coordinates.append([round(lng, 6), round(lat, 6)])
+    return {'type': 'LineString', 'coordinates': coordinates}
+
+
+def street_records(names: List[str], seed: int = 42, with_geometry: bool = False) -> Iterator[Dict]:
+    """
+    Registros da tabela RotaSegura com janelas de perigo variadas e índices de 0 a 10
+    (com `with_geometry`, também uma LineString por rua)
+    """
+    rng = random.Random(seed)
+    for name in names:
+        (start_low, start_high), (end_low, end_high) = rng.choices(WINDOW_PATTERNS, weights=(60, 10, 15, 10, 5))[0]
+        record = {
+            'nomeRua': name,
+            'horarioInicio': f'{rng.randint(start_low, start_high):02d}:{rng.choice((0, 15, 30, 45)):02d}',
+            'horarioFim': f'{rng.randint(end_low, end_high):02d}:{rng.choice((0, 15, 30, 59)):02d}',
+            'indicePericulosidade': round(rng.uniform(0.5, 9.5), 1)
+        }
+        if with_geometry:
+            record['geometry'] = street_geometry(rng, segments=rng.randint(1, 6))
+        yield record
+
+
+def random_points(count: int, seed: int = 42) -> List[Dict]:
+    """
+    Pontos aleatórios na área das geometrias geradas, como {'lat', 'lng'}
+    """
+    rng = random.Random(seed)
+    return [
+        {'lat': CENTER_LAT + rng.uniform(-AREA_DEGREES, AREA_DEGREES),
+         'lng': CENTER_LNG + rng.uniform(-AREA_DEGREES, AREA_DEGREES)}
+        for _ in range(count)
+    ]
+
+
+def query_names(names: List[str], count: int, seed: int = 42, miss_ratio: float = 0.2) -> List[str]:
+    """
+    Nomes como chegam do OSRM: exatos, sem acento, em outra caixa, sem o prefixo
+    (substring de vários registros) e ruas que não estão no banco
+    """
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        if rng.random() < miss_ratio:
+            queries.append(f'{rng.choice(PREFIXES)} Inexistente {rng.randint(1, 10 ** 6)}')
+            continue
+        name = rng.choice(names)
+        variant = rng.randrange(4)
+        if variant == 1:
+            name = _strip_accents(name)
+        elif variant == 2:
+            name = name.upper()
+        elif variant == 3 and ' ' in name:
+            name = name.split(' ', 1)[1]
+        queries.append(name)
+    return queries
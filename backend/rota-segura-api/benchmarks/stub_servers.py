@@ -0,0 +1,139 @@
+"""
+Servidores HTTP locais que imitam as respostas do OSRM (/route/v1) e do
+Nominatim (/search, /reverse), com latência configurável, para medir a API
+sem depender dos serviços públicos.
+"""
+
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# Centro de Campinas: as coordenadas geradas ficam em volta dele
+BASE_LAT = -22.9064
+BASE_LNG = -47.0616
+
+
+class StubConfig:
+    """
+    Latência (média e variação, em segundos) e nomes de ruas usados nas rotas geradas
+    """
+
+    def __init__(self, street_names: List[str], osrm_latency: float = 0.0, nominatim_latency: float = 0.0,
+                 jitter: float = 0.0, route_streets: int = 12, alternatives: int = 2, seed: int = 42):
+        self.street_names = street_names or ['Rua Sem Nome']
+        self.osrm_latency = osrm_latency
+        self.nominatim_latency = nominatim_latency
+        self.jitter = jitter
+        self.route_streets = route_streets
+        self.alternatives = alternatives
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def sleep(self, latency: float) -> None:
+        if self.jitter:
+            with self.lock:
+                latency += self.random.uniform(-self.jitter, self.jitter)
+        if latency > 0:
+            time.sleep(latency)
+
+
+def stable_hash(text: str) -> int:
+    # hash() do Python muda entre processos; crc32 deixa as respostas reprodutíveis
+    return zlib.crc32(text.encode('utf-8'))
+
+
+def fake_coords(query: str) -> Tuple[float, float]:
+    value = stable_hash(query)
+    return BASE_LAT + ((value & 0xFFFF) / 0xFFFF - 0.5) * 0.1, BASE_LNG + ((value >> 16) / 0xFFFF - 0.5) * 0.1
+
+
+def make_handler(config: StubConfig):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, body, status: int = 200):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            # urlsplit: o urlparse separaria o ';' entre as coordenadas do OSRM como parâmetros
+            url = urlsplit(self.path)
+            query = parse_qs(url.query)
+            if url.path.startswith('/route/v1/'):
+                config.sleep(config.osrm_latency)
+                try:
+                    self.send_json(self.route(url.path, query))
+                except ValueError:
+                    self.send_json({'code': 'InvalidQuery', 'message': 'Coordenadas inválidas'}, status=400)
+            elif url.path.startswith('/search'):
+                config.sleep(config.nominatim_latency)
+                q = query.get('q', [''])[0]
+                lat, lng = fake_coords(q)
+                self.send_json([{
+                    'place_id': stable_hash(q),
+                    'lat': f'{lat:.7f}',
+                    'lon': f'{lng:.7f}',
+                    'display_name': q,
+                    'boundingbox': [f'{lat:.7f}', f'{lat:.7f}', f'{lng:.7f}', f'{lng:.7f}']
+                }])
+            elif url.path.startswith('/reverse'):
+                config.sleep(config.nominatim_latency)
+                lat = float(query.get('lat', ['0'])[0])
+                lng = float(query.get('lon', ['0'])[0])
+                self.send_json({
+                    'place_id': 1,
+                    'lat': f'{lat:.7f}',
+                    'lon': f'{lng:.7f}',
+                    'display_name': config.street_names[stable_hash(f'{lat:.4f},{lng:.4f}') % len(config.street_names)]
+                })
+            else:
+                self.send_json({'code': 'NotFound'}, status=404)
+
+        def route(self, path: str, query):
+            coordinates = path.rsplit('/', 1)[-1].split(';')
+            (start_lng, start_lat), (end_lng, end_lat) = [tuple(map(float, pair.split(','))) for pair in coordinates[:2]]
+            requested = int(query.get('alternatives', ['0'])[0] or 0)
+            seed = stable_hash(path.rsplit('/', 1)[-1])
+            names = config.street_names
+
+            routes = []
+            for option in range(min(requested, config.alternatives) + 1):
+                steps = [
+                    {'name': names[(seed + option * 7919 + step * 104729) % len(names)], 'distance': 100.0}
+                    for step in range(config.route_streets)
+                ]
+                points = [
+                    [start_lng + (end_lng - start_lng) * i / 10 + option * 0.001, start_lat + (end_lat - start_lat) * i / 10]
+                    for i in range(11)
+                ]
+                routes.append({
+                    'geometry': {'type': 'LineString', 'coordinates': points},
+                    'distance': 100.0 * config.route_streets * (1 + option * 0.1),
+                    'duration': 12.0 * config.route_streets * (1 + option * 0.1),
+                    'legs': [{'steps': steps}]
+                })
+            return {'code': 'Ok', 'routes': routes}
+
+    return StubHandler
+
+
+def start_stub_server(config: StubConfig, host: str = '127.0.0.1', port: int = 0):
+    """
+    Sobe o servidor em uma thread; retorna (servidor, url base)
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='stub-server', daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}'
@@ -0,0 +1,49 @@
+import argparse
+import json
+import os
+import sys
+
+# Adicionar o diretório raiz do projeto ao sys.path para importações
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), ".")))
+
+from src.services.database import create_database_engine, database_url, ensure_street_name_index, safe_url
+from src.services.rota_segura_loader import FORMATS, RotaSeguraLoader, iter_records
+from src.services.structured_logging import configure_logging
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Importa ruas para a tabela RotaSegura a partir de CSV, NDJSON ou GeoJSON "
+                    "(geometrias LineString viram trechos em RotaSeguraSegmento)."
+    )
+    parser.add_argument('arquivos', nargs='+', help="arquivos de entrada")
+    parser.add_argument('--formato', choices=FORMATS, help="formato dos arquivos (padrão: pela extensão)")
+    parser.add_argument('--database-url', default=None,
+                        help="URL do banco (padrão: variável DATABASE_URL ou o SQLite local da API)")
+    parser.add_argument('--chunk-size', type=int, default=None, help="linhas por transação (padrão: 5000)")
+    parser.add_argument('--atualizar', action='store_true',
+                        help="atualiza horários/índice de ruas já cadastradas em vez de pulá-las")
+    parser.add_argument('--criar-tabela', action='store_true', help="cria a tabela se não existir")
+    args = parser.parse_args()
+    configure_logging(log_format=os.getenv('LOG_FORMAT', 'text'))
+
+    url = database_url(args.database_url)
+    print(f"Banco de dados: {safe_url(url)}")
+    engine = create_database_engine(url)
+    loader = RotaSeguraLoader(engine, chunk_size=args.chunk_size, update_existing=args.atualizar)
+    if args.criar_tabela:
+        loader.create_table()
+    else:
+        ensure_street_name_index(engine)
+
+    for path in args.arquivos:
+        print(f"Importando {path}...")
+        stats = loader.load(iter_records(path, args.formato))
+        print(json.dumps(stats, ensure_ascii=False))
+        print(f"✅ {stats['inserted']} inseridas, {stats['updated']} atualizadas, "
+              f"{stats['skipped_existing']} já existentes, {stats['invalid']} inválidas, {stats['segments']} trechos "
+              f"({stats['rows_per_second']} linhas/s)")
+
+
+if __name__ == "__main__":
+    main()
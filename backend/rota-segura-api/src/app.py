@@ -0,0 +1,224 @@
+# Aplicação Flask da API (banco, rotas, warm-up e tarefas em segundo plano).
+# Importada por main.py, que carrega o .env e ajusta o sys.path antes.
+import logging
+import os
+import threading
+import time as _time
+from datetime import datetime
+from flask import Flask, Response, request, send_from_directory
+from flask_cors import CORS
+from src.services.structured_logging import configure_logging
+
+# configurar o logging antes de importar os serviços
+configure_logging()
+logger = logging.getLogger('rota_segura')
+
+from src.models.rota_segura import db, RotaSegura
+from src.routes.routing import routing_bp, safety_analyzer
+from src.services.ai_service import route_ai
+from src.services.change_log import install_change_tracking
+from src.services.database import configure_sqlite, database_url, engine_options, ensure_street_name_index, safe_url
+from src.services.geocoding_cache import geocoding_cache
+from src.services.heatmap_tiles import heatmap_tiles
+from src.services.index_watcher import IndexWatcher
+from src.services.local_router import local_router
+from src.services.metrics import REQUEST_SECONDS, metrics
+from src.services.profiling import request_profiler
+from src.services.route_cache import route_cache
+
+app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+
+# configuração do bd: DATABASE_URL (a mesma do Prisma) ou o SQLite local em instance/
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+# inicializa SQLAlchemy com a aplicação
+db.init_app(app)
+
+# criar  astabelas se não existirem
+with app.app_context():
+    logger.info("Banco de dados: %s", safe_url(app.config['SQLALCHEMY_DATABASE_URI']))
+    configure_sqlite(db.engine)
+    db.create_all()
+    # bancos criados antes da coluna nomeRuaNormalizado e dos índices de nome
+    ensure_street_name_index(db.engine)
+    # triggers que registram ruas alteradas, para os índices em memória se atualizarem sozinhos
+    change_tracking = install_change_tracking(db.engine)
+
+# habilitar CORS para todas as rotas
+CORS(app)
+
+app.register_blueprint(routing_bp, url_prefix='/api/routing')
+
+# profiling por requisição (PROFILING_ENABLED); desligado não registra nenhum hook
+request_profiler.install(app)
+
+# sinaliza quando modelo de IA e índice de periculosidade estão carregados (ou o warm-up desistiu)
+ready = threading.Event()
+# 'starting', 'ready' ou 'degraded' (warm-up falhou: cada serviço carrega na primeira requisição)
+warmup = {'state': 'starting', 'attempts': 0, 'error': None}
+
+# tentativas do warm-up e espera inicial entre elas (dobra a cada falha)
+WARMUP_ATTEMPTS = int(os.getenv('WARMUP_ATTEMPTS', '3'))
+WARMUP_RETRY_SECONDS = float(os.getenv('WARMUP_RETRY_SECONDS', '5'))
+
+def warm_up_once():
+    """Carrega modelo de IA e índice de periculosidade antes da primeira requisição"""
+    with app.app_context():
+        try:
+            safety_analyzer.index.ensure_loaded(db.session)
+            safety_analyzer.segments.ensure_loaded(db.session)
+        finally:
+            db.session.remove()
+    # grafo do motor local (LOCAL_GRAPH_PATH) e os pesos da faixa de horário atual
+    if local_router.ensure_loaded():
+        now = datetime.now()
+        local_router.edge_weights(now.hour * 60 + now.minute)
+    route_ai.warm_up()
+
+def warm_up():
+    """Warm-up com novas tentativas; se todas falharem, a API segue pronta em modo degradado"""
+    delay = WARMUP_RETRY_SECONDS
+    for attempt in range(1, max(WARMUP_ATTEMPTS, 1) + 1):
+        warmup['attempts'] = attempt
+        try:
+            warm_up_once()
+        except Exception as e:
+            warmup['error'] = str(e)
+            logger.exception("Erro no warm-up", extra={'attempt': attempt, 'attempts': WARMUP_ATTEMPTS})
+            if attempt < WARMUP_ATTEMPTS:
+                _time.sleep(delay)
+                delay *= 2
+            continue
+        warmup.update(state='ready', error=None)
+        ready.set()
+        logger.info("API pronta")
+        return
+    warmup['state'] = 'degraded'
+    ready.set()
+    logger.error("Warm-up falhou; API pronta em modo degradado (carregamento na primeira requisição)",
+                 extra={'error': warmup['error']})
+
+# AI_WARMUP: 'background' (padrão, /ready indica quando terminar), 'sync' ou 'off'
+warmup_mode = os.getenv('AI_WARMUP', 'background')
+if warmup_mode == 'sync':
+    warm_up()
+elif warmup_mode == 'background':
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+else:
+    warmup['state'] = 'ready'
+    ready.set()
+
+# AI_MODEL_POLL_SECONDS: passa a usar o modelo retreinado por qualquer worker (ponteiro CURRENT do ModelStore)
+route_ai.start_store_watch()
+
+# DANGER_INDEX_WATCH: aplica as alterações da RotaSegura aos índices em memória em segundos
+index_watcher = IndexWatcher({'danger': safety_analyzer.index, 'segments': safety_analyzer.segments})
+if change_tracking and os.getenv('DANGER_INDEX_WATCH', 'true').lower() == 'true':
+    index_watcher.start(app, db.session)
+
+@app.route('/health')
+def health_check():
+    """Health check endpoint (200 sempre que o processo responde; veja 'ready' ou /ready)"""
+    import time
+    bundle = route_ai.bundle
+    is_ready = ready.is_set()
+    return {
+        'status': 'OK',
+        'ready': is_ready,
+        'warmup': dict(warmup),
+        'message': 'InfraAlert API Python está funcionando',
+        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'), #horario do request 
+        'service': 'rota-segura-api',
+        'version': '1.0.0',
+        'model': {
+            'version': bundle.version if bundle is not None else None,
+            'artifact': bundle.artifact if bundle is not None else None,
+            'backend': 'compiled' if bundle is not None and bundle.compiled is not None else 'sklearn'
+        },
+        'indexes': {
+            'danger': safety_analyzer.index.stats(),
+            'segments': safety_analyzer.segments.stats()
+        }
+    }, 200
+
+@app.route('/ready')
+def readiness_check():
+    """Prontidão para receber tráfego (balanceadores, orquestradores): 503 durante o warm-up"""
+    is_ready = ready.is_set()
+    return {
+        'ready': is_ready,
+        'warmup': dict(warmup)
+    }, 200 if is_ready else 503
+
+@app.before_request
+def start_timer():
+    request.started_at = _time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = getattr(request, 'started_at', None)
+    if started is not None and request.endpoint != 'metrics_endpoint':
+        REQUEST_SECONDS.observe(
+            _time.perf_counter() - started,
+            endpoint=request.endpoint or 'not_found',
+            method=request.method,
+            status=response.status_code
+        )
+    return response
+
+def service_metrics():
+    """Valores mantidos pelos próprios serviços, lidos apenas na exportação"""
+    geocoding = geocoding_cache.stats()
+    route = route_cache.stats()
+    bundle = route_ai.bundle
+    yield ('rota_segura_cache_entries', 'gauge', 'Entradas em memória por cache', [
+        ({'cache': 'geocoding'}, geocoding['memory_entries']),
+        ({'cache': 'route'}, route['entries'])
+    ])
+    yield ('rota_segura_cache_evictions_total', 'counter', 'Entradas descartadas por falta de espaço', [
+        ({'cache': 'route'}, route['evictions'])
+    ])
+    yield ('rota_segura_danger_index_streets', 'gauge', 'Ruas no índice de periculosidade em memória', [
+        ({}, len(safety_analyzer.index))
+    ])
+    yield ('rota_segura_segment_index_segments', 'gauge', 'Trechos de ruas no índice espacial em memória', [
+        ({}, len(safety_analyzer.segments))
+    ])
+    tiles = heatmap_tiles.stats()
+    yield ('rota_segura_tile_cache_bytes', 'gauge', 'Bytes de tiles do mapa de calor em cache', [
+        ({'tier': 'memory'}, tiles.get('memory_bytes', 0)),
+        ({'tier': 'disk'}, tiles.get('disk_bytes', 0))
+    ])
+    yield ('rota_segura_model_version', 'gauge', 'Versão do modelo de IA em uso', [
+        ({}, bundle.version if bundle is not None else 0)
+    ])
+    yield ('rota_segura_ready', 'gauge', 'API aquecida e pronta para receber tráfego', [
+        ({}, 1 if ready.is_set() else 0)
+    ])
+
+metrics.register_collector(service_metrics)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Métricas no formato texto do Prometheus"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/', defaults={'path': ''})
+@app.route('/<path:path>')
+def serve(path):
+    static_folder_path = app.static_folder
+    if static_folder_path is None:
+            return "Static folder not configured", 404
+
+    if path != "" and os.path.exists(os.path.join(static_folder_path, path)): # se o caminho nao existir, retorna 404
+        return send_from_directory(static_folder_path, path)
+    else:
+        index_path = os.path.join(static_folder_path, 'index.html')
+        if os.path.exists(index_path):
+            return send_from_directory(static_folder_path, 'index.html')
+        else:
+            return "index.html not found", 404
+
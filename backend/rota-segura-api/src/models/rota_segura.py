@@ -1,16 +1,41 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import validates
+
+from src.services.text_utils import normalize_street_name
 
 db = SQLAlchemy()
 
+
+def _normalized_name(context):
+    """
+    Valor padrão de nomeRuaNormalizado nas inserções (ORM ou Core, inclusive em lote)
+    """
+    return normalize_street_name(context.get_current_parameters().get('nomeRua'))
+
+
 class RotaSegura(db.Model):
     __tablename__ = 'RotaSegura'
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     nomeRua = db.Column(db.String(255), nullable=False)
+    # nome sem acentos, em minúsculas e com espaços colapsados (normalize_street_name)
+    nomeRuaNormalizado = db.Column(db.Text, default=_normalized_name)
     horarioInicio = db.Column(db.String(10), nullable=False)  # ex: "20:00"
     horarioFim = db.Column(db.String(10), nullable=False)     # ex: "05:00"
     indicePericulosidade = db.Column(db.Float, nullable=False)  # valor de 0.0 a 10.0
-    
+
+    # mesmos nomes da migração do Prisma; o índice trigram (PostgreSQL) é criado à parte
+    __table_args__ = (
+        db.Index('RotaSegura_nomeRua_idx', 'nomeRua'),
+        db.Index('RotaSegura_nomeRuaNormalizado_idx', 'nomeRuaNormalizado'),
+    )
+
+    @validates('nomeRua')
+    def _update_normalized_name(self, key, value):
+        # renomeação pelo ORM: o nome normalizado acompanha (fora do ORM, um trigger o anula)
+        self.nomeRuaNormalizado = normalize_street_name(value)
+        return value
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -20,3 +45,39 @@ class RotaSegura(db.Model):
             'indicePericulosidade': self.indicePericulosidade
         }
 
+
+
+class RotaSeguraSegmento(db.Model):
+    """
+    Trecho (linha reta entre dois pontos) da geometria de uma rua catalogada em RotaSegura
+    """
+    __tablename__ = 'RotaSeguraSegmento'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    rotaSeguraId = db.Column(db.Integer, db.ForeignKey('RotaSegura.id', ondelete='CASCADE'), nullable=False, index=True)
+    ordem = db.Column(db.Integer, nullable=False)  # posição do trecho na geometria da rua
+    latInicio = db.Column(db.Float, nullable=False)
+    lngInicio = db.Column(db.Float, nullable=False)
+    latFim = db.Column(db.Float, nullable=False)
+    lngFim = db.Column(db.Float, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'rotaSeguraId': self.rotaSeguraId,
+            'ordem': self.ordem,
+            'inicio': [self.latInicio, self.lngInicio],
+            'fim': [self.latFim, self.lngFim]
+        }
+
+
+class RotaSeguraAlteracao(db.Model):
+    """
+    Registro de alteração (inclusão, edição ou remoção) de uma rua ou de seus trechos,
+    preenchido por triggers no banco e lido pelos índices em memória para se atualizar
+    """
+    __tablename__ = 'RotaSeguraAlteracao'
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    rotaSeguraId = db.Column(db.Integer, nullable=False)  # sem chave estrangeira: a rua pode ter sido removida
+    criadoEm = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
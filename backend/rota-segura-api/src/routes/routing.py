@@ -1,11 +1,37 @@
-from flask import Blueprint, request, jsonify
+import logging
+import math
+import os
+from flask import Blueprint, Response, request, jsonify
 from datetime import datetime, time
-from src.services.routing_service import RoutingService, SafetyAnalyzer
+from typing import Optional
+from src.services.routing_service import SafetyAnalyzer, routing_service
 from src.services.ai_service import route_ai
+from src.services.training_jobs import training_jobs
+from src.services.metrics import PHASE_SECONDS
+from src.services.heatmap_tiles import heatmap_tiles
+from src.services.segment_index import LocalProjection
 from src.models.rota_segura import db
 
 routing_bp = Blueprint('routing', __name__)
 
+logger = logging.getLogger(__name__)
+
+# db.session é um scoped_session: o analisador pode ser compartilhado entre requisições
+safety_analyzer = SafetyAnalyzer(db.session)
+
+# Limite de rotas por chamada de /score-routes
+SCORE_ROUTES_MAX_BATCH = int(os.getenv('SCORE_ROUTES_MAX_BATCH', '1000'))
+
+# Limites de /nearby: raio padrão e máximo (o retângulo é limitado pela meia diagonal) e resultados
+NEARBY_DEFAULT_RADIUS_METERS = float(os.getenv('NEARBY_DEFAULT_RADIUS_METERS', '500'))
+NEARBY_MAX_RADIUS_METERS = float(os.getenv('NEARBY_MAX_RADIUS_METERS', '10000'))
+NEARBY_MAX_RESULTS = int(os.getenv('NEARBY_MAX_RESULTS', '1000'))
+
+# Zooms aceitos em /tiles e tempo máximo de cache no cliente
+TILE_MIN_ZOOM = int(os.getenv('TILE_MIN_ZOOM', '8'))
+TILE_MAX_ZOOM = int(os.getenv('TILE_MAX_ZOOM', '19'))
+TILE_MAX_AGE_SECONDS = int(os.getenv('TILE_MAX_AGE_SECONDS', '300'))
+
 @routing_bp.route('/calculate-route', methods=['POST'])
 def calculate_route():
     """
@@ -32,56 +58,68 @@ def calculate_route():
         else:
             current_time = datetime.now().time()
         
-        # Calcular rota
-        routing_service = RoutingService()
-        route_result = routing_service.calculate_route(start_address, end_address)
+        # Com "alternatives": true, pede rotas alternativas ao OSRM e devolve todas ranqueadas
+        try:
+            alternatives = parse_flag(data.get('alternatives'), default=False)
+        except ValueError:
+            return jsonify({
+                'error': 'alternatives deve ser true ou false'
+            }), 400
         
-        if not route_result:
+        # Calcular rota (o motor local, se ativo, usa o índice de perigo para ponderar as ruas)
+        safety_analyzer.index.ensure_loaded(db.session)
+        route_options = routing_service.calculate_route_options(
+            start_address, 
+            end_address, 
+            current_time=current_time, 
+            alternatives=alternatives
+        )
+        
+        if not route_options:
             return jsonify({
                 'error': 'Não foi possível calcular a rota'
             }), 404
         
-        # Analisar segurança da rota
-        safety_analyzer = SafetyAnalyzer(db.session)
-        safety_analysis = safety_analyzer.analyze_route_safety(
-            route_result['street_names'], 
-            current_time
-        )
+        # Analisar segurança de todas as opções de uma vez (união das ruas em uma consulta)
+        with PHASE_SECONDS.time(phase='safety_analysis'):
+            safety_analyses = safety_analyzer.analyze_routes_batch(
+                [route_result['street_names'] for route_result in route_options], 
+                current_time,
+                geometries=[route_result['route_data'].get('geometry') for route_result in route_options]
+            )
         
-        # Análise com IA
-        ai_analysis = route_ai.predict_route_quality(
-            route_result, 
-            safety_analysis, 
-            current_time
-        )
+        # Análise com IA (uma única predição para todas as opções)
+        with PHASE_SECONDS.time(phase='ai_scoring'):
+            ai_analyses = route_ai.predict_many(
+                [route_features(route_result) for route_result in route_options],
+                safety_analyses,
+                current_time
+            )
         
-        # Sugestões de melhoria
-        suggestions = route_ai.suggest_route_improvements(
-            route_result, 
-            safety_analysis, 
-            current_time
+        # Ranquear: menor perigo médio primeiro, desempate pelo score da IA
+        ranked = sorted(
+            zip(route_options, safety_analyses, ai_analyses),
+            key=lambda option: (option[1]['average_danger_index'], -option[2]['final_score'])
         )
-        
-        # Preparar resposta
-        response = {
-            'route': {
-                'start_coords': route_result['start_coords'],
-                'end_coords': route_result['end_coords'],
-                'distance_meters': route_result['distance'],
-                'duration_seconds': route_result['duration'],
-                'geometry': route_result['route_data']['geometry'],
-                'street_names': route_result['street_names']
-            },
-            'safety_analysis': safety_analysis,
-            'ai_analysis': ai_analysis,
-            'suggestions': suggestions,
-            'recommendation': generate_route_recommendation(safety_analysis, ai_analysis),
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        return jsonify(response), 200
+        with PHASE_SECONDS.time(phase='serialization'):
+            candidates = [
+                build_route_response(route_result, safety_analysis, ai_analysis, current_time)
+                for route_result, safety_analysis, ai_analysis in ranked
+            ]
+            
+            # Preparar resposta (a rota principal é a mais segura)
+            response = dict(candidates[0])
+            response['timestamp'] = datetime.now().isoformat()
+            if alternatives:
+                response['alternatives'] = [
+                    dict(candidate, rank=rank) for rank, candidate in enumerate(candidates, start=1)
+                ]
+            
+            body = jsonify(response)
+        return body, 200
         
     except Exception as e:
+        logger.exception("Erro em /calculate-route")
         return jsonify({
             'error': f'Erro interno do servidor: {str(e)}'
         }), 500
@@ -96,9 +134,7 @@ def test_route():
         start_address = data.get('start_address', 'Origem Teste')
         end_address = data.get('end_address', 'Destino Teste')
         
-        print(f"🧪 Teste de rota simulada")
-        print(f"📍 Origem: {start_address}")
-        print(f"🎯 Destino: {end_address}")
+        logger.debug("Teste de rota simulada", extra={'start': start_address, 'end': end_address})
         
         # Dados simulados para Campinas
         mock_response = {
@@ -139,11 +175,10 @@ def test_route():
             'timestamp': datetime.now().isoformat()
         }
         
-        print(f"✅ Retornando dados simulados")
         return jsonify(mock_response), 200
         
     except Exception as e:
-        print(f"❌ Erro no teste: {e}")
+        logger.exception("Erro no teste de rota")
         return jsonify({
             'error': f'Erro no teste: {str(e)}'
         }), 500
@@ -174,7 +209,6 @@ def analyze_street():
             current_time = datetime.now().time()
         
         # Analisar segurança
-        safety_analyzer = SafetyAnalyzer(db.session)
         analysis = safety_analyzer.analyze_street_safety(street_name, current_time)
         
         return jsonify(analysis), 200
@@ -184,6 +218,118 @@ def analyze_street():
             'error': f'Erro interno do servidor: {str(e)}'
         }), 500
 
+@routing_bp.route('/nearby', methods=['GET'])
+def nearby_streets():
+    """
+    Ruas catalogadas perigosas em volta de um ponto (lat, lng, radius em metros)
+    ou dentro de um retângulo (bbox=south,west,north,east), com o índice no horário
+    """
+    try:
+        args = request.args
+        try:
+            limit = int(args.get('limit', 200))
+            min_danger = float(args.get('min_danger', 0))
+            if args.get('bbox'):
+                south, west, north, east = (float(value) for value in args['bbox'].split(','))
+                lat = lng = radius = None
+            else:
+                lat, lng = float(args['lat']), float(args['lng'])
+                radius = float(args.get('radius', NEARBY_DEFAULT_RADIUS_METERS))
+        except (KeyError, ValueError):
+            return jsonify({
+                'error': 'Informe lat e lng (e opcionalmente radius) ou bbox=south,west,north,east'
+            }), 400
+        
+        if not 1 <= limit <= NEARBY_MAX_RESULTS:
+            return jsonify({'error': f'limit deve estar entre 1 e {NEARBY_MAX_RESULTS}'}), 400
+        
+        bbox = None
+        if lat is None:
+            if not (-90 <= south < north <= 90 and -180 <= west < east <= 180):
+                return jsonify({'error': 'bbox inválido'}), 400
+            bbox = (south, west, north, east)
+            corners = LocalProjection((south + north) / 2, (west + east) / 2).to_xy([south, north], [west, east])
+            if float(((corners[1] - corners[0]) ** 2).sum()) ** 0.5 / 2 > NEARBY_MAX_RADIUS_METERS:
+                return jsonify({'error': 'bbox grande demais'}), 400
+        else:
+            if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+                return jsonify({'error': 'Coordenadas inválidas'}), 400
+            if not 0 < radius <= NEARBY_MAX_RADIUS_METERS:
+                return jsonify({'error': f'radius deve estar entre 0 e {NEARBY_MAX_RADIUS_METERS:.0f} metros'}), 400
+        
+        # Parse do horário atual
+        current_time_str = args.get('current_time')
+        if current_time_str:
+            try:
+                current_time = datetime.strptime(current_time_str, "%H:%M").time()
+            except ValueError:
+                current_time = datetime.now().time()
+        else:
+            current_time = datetime.now().time()
+        
+        with PHASE_SECONDS.time(phase='nearby_query'):
+            result = safety_analyzer.analyze_area(
+                lat=lat, lng=lng, radius=radius, bbox=bbox,
+                current_time=current_time, limit=limit, min_danger=min_danger
+            )
+        
+        result['current_time'] = current_time.strftime("%H:%M")
+        return jsonify(result), 200
+        
+    except Exception as e:
+        logger.exception("Erro em /nearby")
+        return jsonify({
+            'error': f'Erro interno do servidor: {str(e)}'
+        }), 500
+
+@routing_bp.route('/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+@routing_bp.route('/tiles/<int:z>/<int:x>/<int:y>.png', methods=['GET'])
+def danger_tile(z, x, y):
+    """
+    Tile PNG (256x256, XYZ/Web Mercator) do mapa de calor de periculosidade no horário
+    """
+    try:
+        if not TILE_MIN_ZOOM <= z <= TILE_MAX_ZOOM:
+            return jsonify({'error': f'Zoom deve estar entre {TILE_MIN_ZOOM} e {TILE_MAX_ZOOM}'}), 400
+        if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            return jsonify({'error': 'Tile inexistente'}), 404
+        
+        # Parse do horário atual
+        current_time_str = request.args.get('current_time')
+        current_time = None
+        if current_time_str:
+            try:
+                current_time = datetime.strptime(current_time_str, "%H:%M").time()
+            except ValueError:
+                current_time = None
+        explicit_time = current_time is not None
+        if current_time is None:
+            current_time = datetime.now().time()
+        minute = current_time.hour * 60 + current_time.minute
+        
+        tile, bucket = heatmap_tiles.tile(db.session, z, x, y, minute)
+        
+        # sem horário explícito, o tile vale até o fim da faixa de horário atual
+        max_age = TILE_MAX_AGE_SECONDS
+        if not explicit_time:
+            remaining = (bucket + heatmap_tiles.bucket_minutes - minute) * 60 - current_time.second
+            max_age = max(0, min(max_age, remaining))
+        
+        if tile.etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            response = Response(tile.data, mimetype='image/png')
+        response.set_etag(tile.etag)
+        response.headers['Cache-Control'] = f'public, max-age={max_age}'
+        response.headers['X-Time-Bucket'] = f"{bucket // 60:02d}:{bucket % 60:02d}"
+        return response
+        
+    except Exception as e:
+        logger.exception("Erro em /tiles")
+        return jsonify({
+            'error': f'Erro interno do servidor: {str(e)}'
+        }), 500
+
 @routing_bp.route('/geocode', methods=['POST'])
 def geocode_address():
     """
@@ -199,7 +345,6 @@ def geocode_address():
                 'error': 'Endereço é obrigatório'
             }), 400
         
-        routing_service = RoutingService()
         coords = routing_service.geocoding.geocode_address(address, city)
         
         if coords:
@@ -220,21 +365,220 @@ def geocode_address():
             'error': f'Erro interno do servidor: {str(e)}'
         }), 500
 
+@routing_bp.route('/score-routes', methods=['POST'])
+def score_routes():
+    """
+    Endpoint para (re)pontuar rotas já calculadas em lote.
+    Cada item de "routes" segue o formato de 'route' da resposta de /calculate-route
+    (distance_meters, duration_seconds, street_names) e pode trazer 'safety_analysis';
+    quando ausente, a análise de segurança é feita em lote para todas as rotas.
+    """
+    try:
+        data = request.get_json(silent=True)
+        routes = data.get('routes') if isinstance(data, dict) else None
+        current_time_str = data.get('current_time') if isinstance(data, dict) else None
+        
+        if not isinstance(routes, list) or not routes:
+            return jsonify({
+                'error': 'Lista de rotas é obrigatória'
+            }), 400
+        
+        if len(routes) > SCORE_ROUTES_MAX_BATCH:
+            return jsonify({
+                'error': f'Máximo de {SCORE_ROUTES_MAX_BATCH} rotas por requisição'
+            }), 400
+        
+        # Parse do horário atual
+        current_time = None
+        if current_time_str:
+            try:
+                current_time = datetime.strptime(current_time_str, "%H:%M").time()
+            except:
+                current_time = datetime.now().time()
+        else:
+            current_time = datetime.now().time()
+        
+        for index, item in enumerate(routes):
+            problem = validate_scored_route(item)
+            if problem is not None:
+                return jsonify({
+                    'error': f'Rota {index}: {problem}',
+                    'index': index
+                }), 400
+        
+        routes_data = []
+        for item in routes:
+            route = item.get('route', item)
+            routes_data.append({
+                'distance_meters': route.get('distance_meters', 0),
+                'duration_seconds': route.get('duration_seconds', 0),
+                'street_names': route.get('street_names', []),
+                'geometry': route.get('geometry')
+            })
+        
+        # Análise de segurança em lote apenas para as rotas que não trouxeram a sua
+        missing = [i for i, item in enumerate(routes) if not item.get('safety_analysis')]
+        computed = safety_analyzer.analyze_routes_batch(
+            [routes_data[i]['street_names'] for i in missing], 
+            current_time,
+            geometries=[routes_data[i]['geometry'] for i in missing]
+        ) if missing else []
+        safety_analyses = [item.get('safety_analysis') for item in routes]
+        for i, safety_analysis in zip(missing, computed):
+            safety_analyses[i] = safety_analysis
+        
+        # Uma única predição para todas as rotas
+        ai_analyses = route_ai.predict_many(routes_data, safety_analyses, current_time)
+        
+        return jsonify({
+            'results': [
+                {
+                    'safety_analysis': safety_analysis,
+                    'ai_analysis': ai_analysis,
+                    'recommendation': generate_route_recommendation(safety_analysis, ai_analysis)
+                }
+                for safety_analysis, ai_analysis in zip(safety_analyses, ai_analyses)
+            ],
+            'total_routes': len(routes),
+            'timestamp': datetime.now().isoformat()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'error': f'Erro interno do servidor: {str(e)}'
+        }), 500
+
 @routing_bp.route('/train-ai', methods=['POST'])
 def train_ai():
     """
-    Endpoint para retreinar o modelo de IA
+    Endpoint para retreinar o modelo de IA em segundo plano
     """
     try:
-        route_ai.train_model(force_retrain=True)
+        data = request.get_json(silent=True) or {}
+        num_samples = data.get('num_samples')
+        if num_samples is not None and (not isinstance(num_samples, int) or num_samples < 100):
+            return jsonify({
+                'error': 'num_samples deve ser um inteiro maior ou igual a 100'
+            }), 400
+        
+        job = training_jobs.submit(num_samples)
         return jsonify({
-            'message': 'Modelo de IA retreinado com sucesso'
-        }), 200
+            'message': 'Treinamento da IA em andamento' if job.get('already_running') else 'Treinamento da IA iniciado',
+            'job': job,
+            'current_model_version': route_ai.bundle.version if route_ai.bundle is not None else None
+        }), 202
     except Exception as e:
         return jsonify({
             'error': f'Erro ao treinar IA: {str(e)}'
         }), 500
 
+@routing_bp.route('/train-ai/<job_id>', methods=['GET'])
+def train_ai_status(job_id):
+    """
+    Endpoint para acompanhar um retreino da IA
+    """
+    job = training_jobs.status(job_id)
+    if job is None:
+        return jsonify({
+            'error': 'Job de treinamento não encontrado'
+        }), 404
+    return jsonify(job), 200
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def validate_scored_route(item) -> Optional[str]:
+    """
+    Confere um item de /score-routes antes de pontuar: a rota e, se enviada, a análise de
+    segurança com os campos lidos pela IA e pela recomendação. Retorna o problema ou None.
+    """
+    if not isinstance(item, dict):
+        return 'cada item deve ser um objeto'
+    route = item.get('route', item)
+    if not isinstance(route, dict):
+        return "'route' deve ser um objeto"
+    for field in ('distance_meters', 'duration_seconds'):
+        if not is_number(route.get(field)) or route[field] < 0:
+            return f"'{field}' deve ser um número não negativo"
+    street_names = route.get('street_names')
+    if not isinstance(street_names, list) or not all(isinstance(name, str) for name in street_names):
+        return "'street_names' deve ser uma lista de nomes"
+    if route.get('geometry') is not None and not isinstance(route['geometry'], dict):
+        return "'geometry' deve ser um objeto GeoJSON"
+    
+    safety_analysis = item.get('safety_analysis')
+    if not safety_analysis:
+        # ausente: a análise é feita aqui
+        return None
+    if not isinstance(safety_analysis, dict):
+        return "'safety_analysis' deve ser um objeto"
+    for field in ('average_danger_index', 'database_coverage'):
+        if not is_number(safety_analysis.get(field)):
+            return f"'safety_analysis.{field}' deve ser um número"
+    if not isinstance(safety_analysis.get('safety_level'), str):
+        return "'safety_analysis.safety_level' é obrigatório"
+    if 'streets_in_database' in safety_analysis and not is_number(safety_analysis['streets_in_database']):
+        return "'safety_analysis.streets_in_database' deve ser um número"
+    street_analyses = safety_analysis.get('street_analyses', [])
+    if not isinstance(street_analyses, list) or not all(
+        isinstance(street, dict) and is_number(street.get('current_danger_index', 5.0)) for street in street_analyses
+    ):
+        return "'safety_analysis.street_analyses' deve ser uma lista de objetos com current_danger_index numérico"
+    return None
+
+def parse_flag(value, default: bool = False) -> bool:
+    """
+    Booleano do JSON: aceita true/false (ou 1/0 e as mesmas palavras em texto) e usa
+    o padrão quando ausente ou null; qualquer outro valor gera ValueError
+    """
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ('true', 'false', '1', '0'):
+        return value.strip().lower() in ('true', '1')
+    raise ValueError(f'valor booleano inválido: {value!r}')
+
+def route_features(route_result):
+    """
+    Rota de calculate_route_options no formato lido pelo modelo de IA
+    (o mesmo dos itens de /score-routes)
+    """
+    return {
+        'distance_meters': route_result['distance'],
+        'duration_seconds': route_result['duration'],
+        'street_names': route_result['street_names'],
+        'geometry': route_result['route_data'].get('geometry')
+    }
+
+def build_route_response(route_result, safety_analysis, ai_analysis, current_time):
+    """
+    Monta a resposta de uma rota analisada
+    """
+    # Sugestões de melhoria
+    suggestions = route_ai.suggest_route_improvements(
+        route_features(route_result), 
+        safety_analysis, 
+        current_time
+    )
+    
+    return {
+        'route': {
+            'start_coords': route_result['start_coords'],
+            'end_coords': route_result['end_coords'],
+            'distance_meters': route_result['distance'],
+            'duration_seconds': route_result['duration'],
+            'geometry': route_result['route_data']['geometry'],
+            'street_names': route_result['street_names']
+        },
+        'safety_analysis': safety_analysis,
+        'ai_analysis': ai_analysis,
+        'suggestions': suggestions,
+        'recommendation': generate_route_recommendation(safety_analysis, ai_analysis)
+    }
+
 def generate_route_recommendation(safety_analysis, ai_analysis):
     """
     Gera recomendação baseada na análise de segurança e IA
@@ -3,10 +3,39 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from datetime import datetime, time
-import pickle
+import logging
 import os
-from typing import List, Dict, Tuple, Optional
+import threading
+from typing import Iterator, List, Dict, Tuple, Optional
 import json
+from src.services.compiled_forest import CompiledForest
+from src.services.model_store import ModelStore
+
+logger = logging.getLogger(__name__)
+
+# Incrementar sempre que extract_features_matrix mudar: modelos salvos com outro esquema são descartados
+FEATURE_SCHEMA_VERSION = 1
+
+# Amostras por bloco lógico dos dados sintéticos: cada bloco tem o próprio gerador,
+# derivado de (semente, índice do bloco). Mudar este valor muda os dados gerados.
+SYNTHETIC_BLOCK_SIZE = 8192
+
+class ModelBundle:
+    """
+    Modelo, scaler e floresta compilada de uma mesma versão.
+    É publicado como um único objeto, então uma predição nunca mistura versões.
+    """
+    
+    def __init__(self, model: RandomForestRegressor, scaler: StandardScaler, compiled: Optional[CompiledForest] = None,
+                 metrics: Optional[Dict] = None, version: int = 0, trained_at: str = None, artifact: str = None):
+        self.model = model
+        self.scaler = scaler
+        self.compiled = compiled
+        self.metrics = metrics or {}
+        self.version = version
+        self.trained_at = trained_at or datetime.now().isoformat()
+        # nome da versão no ModelStore (None enquanto não for salvo)
+        self.artifact = artifact
 
 class RouteOptimizationAI:
     """
@@ -14,77 +43,104 @@ class RouteOptimizationAI:
     """
     
     def __init__(self):
-        self.model = None
-        self.scaler = StandardScaler()
-        self.is_trained = False
-        self.model_path = '/tmp/route_optimization_model.pkl'
-        self.scaler_path = '/tmp/route_scaler.pkl'
+        self.bundle: Optional[ModelBundle] = None
+        self.store = ModelStore()
+        # 'compiled' (floresta em arrays NumPy, padrão) ou 'sklearn'
+        self.inference_backend = os.getenv('AI_INFERENCE_BACKEND', 'compiled')
+        self._train_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self._version = 0
+        # versão do ModelStore (ponteiro CURRENT) já vista por este processo, lida ou salva
+        self._store_artifact: Optional[str] = None
+        self._store_lock = threading.Lock()
+        self._watch_stop = threading.Event()
+        self._watch_thread = None
+    
+    @property
+    def is_trained(self) -> bool:
+        return self.bundle is not None
+    
+    @property
+    def model(self) -> Optional[RandomForestRegressor]:
+        bundle = self.bundle
+        return bundle.model if bundle is not None else None
+    
+    @property
+    def scaler(self) -> Optional[StandardScaler]:
+        bundle = self.bundle
+        return bundle.scaler if bundle is not None else None
+    
+    @property
+    def compiled(self) -> Optional[CompiledForest]:
+        bundle = self.bundle
+        return bundle.compiled if bundle is not None else None
         
     def extract_features(self, route_data: Dict, safety_analysis: Dict, current_time: time) -> np.array:
         """
         Extrai características da rota para o modelo de IA
         """
-        features = []
+        return self.extract_features_matrix([route_data], [safety_analysis], current_time)
+    
+    def extract_features_matrix(self, routes_data: List[Dict], safety_analyses: List[Dict], current_time: time) -> np.array:
+        """
+        Extrai as características de N rotas em uma única matriz N x 13
+        """
+        num_routes = len(routes_data)
         
-        # Características temporais
+        # Características temporais (iguais para todas as rotas)
         hour = current_time.hour
         minute = current_time.minute
         time_decimal = hour + minute / 60.0
-        
-        # Características da rota
-        distance = route_data.get('distance_meters', 0) / 1000.0  # em km
-        duration = route_data.get('duration_seconds', 0) / 3600.0  # em horas
-        num_streets = len(route_data.get('street_names', []))
-        
-        # Características de segurança
-        avg_danger = safety_analysis.get('average_danger_index', 5.0)
-        coverage = safety_analysis.get('database_coverage', 0.0) / 100.0
-        streets_in_db = safety_analysis.get('streets_in_database', 0)
-        
-        # Análise por período do dia
         is_night = 1 if 22 <= hour or hour <= 6 else 0
         is_rush_hour = 1 if (7 <= hour <= 9) or (17 <= hour <= 19) else 0
         is_weekend = 1 if datetime.now().weekday() >= 5 else 0
         
-        # Análise de ruas perigosas
-        dangerous_streets = 0
-        moderate_streets = 0
-        safe_streets = 0
+        # Características da rota
+        distance = np.array([r.get('distance_meters', 0) for r in routes_data], dtype=float) / 1000.0  # em km
+        duration = np.array([r.get('duration_seconds', 0) for r in routes_data], dtype=float) / 3600.0  # em horas
+        num_streets = np.array([len(r.get('street_names', [])) for r in routes_data], dtype=float)
         
-        for street_analysis in safety_analysis.get('street_analyses', []):
-            danger_index = street_analysis.get('current_danger_index', 5.0)
-            if danger_index >= 7:
-                dangerous_streets += 1
-            elif danger_index >= 4:
-                moderate_streets += 1
-            else:
-                safe_streets += 1
+        # Características de segurança
+        avg_danger = np.array([s.get('average_danger_index', 5.0) for s in safety_analyses], dtype=float)
+        coverage = np.array([s.get('database_coverage', 0.0) for s in safety_analyses], dtype=float) / 100.0
+        streets_in_db = np.array([s.get('streets_in_database', 0) for s in safety_analyses], dtype=float)
+        
+        # Análise de ruas perigosas: índices de todas as ruas achatados, com a rota de origem de cada um
+        danger_values = []
+        owners = []
+        for route_idx, safety_analysis in enumerate(safety_analyses):
+            for street_analysis in safety_analysis.get('street_analyses', []):
+                danger_values.append(street_analysis.get('current_danger_index', 5.0))
+                owners.append(route_idx)
+        danger_values = np.array(danger_values, dtype=float)
+        owners = np.array(owners, dtype=np.int64)
+        
+        dangerous_streets = np.bincount(owners[danger_values >= 7], minlength=num_routes)
+        moderate_streets = np.bincount(owners[(danger_values >= 4) & (danger_values < 7)], minlength=num_routes)
+        safe_streets = np.bincount(owners[danger_values < 4], minlength=num_routes)
         
         # Normalizar contadores de ruas
-        if num_streets > 0:
-            dangerous_ratio = dangerous_streets / num_streets
-            moderate_ratio = moderate_streets / num_streets
-            safe_ratio = safe_streets / num_streets
-        else:
-            dangerous_ratio = moderate_ratio = safe_ratio = 0
-        
-        features = [
-            time_decimal,
+        has_streets = num_streets > 0
+        denominator = np.where(has_streets, num_streets, 1.0)
+        dangerous_ratio = np.where(has_streets, dangerous_streets / denominator, 0.0)
+        moderate_ratio = np.where(has_streets, moderate_streets / denominator, 0.0)
+        safe_ratio = np.where(has_streets, safe_streets / denominator, 0.0)
+        
+        return np.column_stack([
+            np.full(num_routes, time_decimal),
             distance,
             duration,
             num_streets,
             avg_danger,
             coverage,
             streets_in_db,
-            is_night,
-            is_rush_hour,
-            is_weekend,
+            np.full(num_routes, is_night),
+            np.full(num_routes, is_rush_hour),
+            np.full(num_routes, is_weekend),
             dangerous_ratio,
             moderate_ratio,
             safe_ratio
-        ]
-        
-        return np.array(features).reshape(1, -1)
+        ])
     
     def calculate_route_score(self, route_data: Dict, safety_analysis: Dict, current_time: time) -> float:
         """
@@ -122,66 +178,115 @@ class RouteOptimizationAI:
         
         return min(10.0, max(0.0, final_score))
     
-    def generate_synthetic_training_data(self, num_samples: int = 1000) -> Tuple[np.array, np.array]:
+    def generate_synthetic_training_data(self, num_samples: int = 1000, seed: int = 42,
+                                         chunk_size: int = 100000) -> Tuple[np.array, np.array]:
         """
         Gera dados sintéticos para treinar o modelo
         """
-        np.random.seed(42)
-        
-        X = []
-        y = []
+        chunks = list(self.iter_synthetic_training_data(num_samples, seed, chunk_size))
+        if not chunks:
+            return np.empty((0, 13)), np.empty(0)
+        X = np.concatenate([chunk[0] for chunk in chunks])
+        y = np.concatenate([chunk[1] for chunk in chunks])
+        return X, y
+    
+    def iter_synthetic_training_data(self, num_samples: int, seed: int = 42,
+                                     chunk_size: int = 100000) -> Iterator[Tuple[np.array, np.array]]:
+        """
+        Gera os dados sintéticos em blocos de até chunk_size amostras, sem manter tudo em memória.
+        O resultado depende só da semente e de num_samples: as amostras vêm de blocos lógicos
+        de SYNTHETIC_BLOCK_SIZE, reagrupados em blocos de chunk_size.
+        """
+        chunk_size = max(1, chunk_size)
+        pending_X: List[np.ndarray] = []
+        pending_y: List[np.ndarray] = []
+        pending = 0
+        for block, start in enumerate(range(0, num_samples, SYNTHETIC_BLOCK_SIZE)):
+            rng = np.random.default_rng([seed, block])
+            X, y = self._synthetic_chunk(rng, min(SYNTHETIC_BLOCK_SIZE, num_samples - start))
+            pending_X.append(X)
+            pending_y.append(y)
+            pending += len(y)
+            if pending < chunk_size:
+                continue
+            X = np.concatenate(pending_X)
+            y = np.concatenate(pending_y)
+            full = pending - pending % chunk_size
+            for offset in range(0, full, chunk_size):
+                yield X[offset:offset + chunk_size], y[offset:offset + chunk_size]
+            pending_X, pending_y, pending = [X[full:]], [y[full:]], pending - full
+        if pending:
+            yield np.concatenate(pending_X), np.concatenate(pending_y)
+    
+    def write_synthetic_training_data(self, path: str, num_samples: int, seed: int = 42,
+                                      chunk_size: int = 100000) -> Tuple[str, str]:
+        """
+        Grava os dados sintéticos em arquivos .npy (X e y) bloco a bloco
+        """
+        X_path = f"{path}_X.npy"
+        y_path = f"{path}_y.npy"
+        X_out = np.lib.format.open_memmap(X_path, mode='w+', dtype=np.float64, shape=(num_samples, 13))
+        y_out = np.lib.format.open_memmap(y_path, mode='w+', dtype=np.float64, shape=(num_samples,))
+        start = 0
+        for X, y in self.iter_synthetic_training_data(num_samples, seed, chunk_size):
+            X_out[start:start + len(y)] = X
+            y_out[start:start + len(y)] = y
+            start += len(y)
+        X_out.flush()
+        y_out.flush()
+        del X_out, y_out
+        return X_path, y_path
+    
+    def _synthetic_chunk(self, rng: np.random.Generator, n: int) -> Tuple[np.array, np.array]:
+        """
+        Gera um bloco de n amostras com operações vetorizadas
+        """
+        # Gerar características aleatórias
+        time_decimal = rng.uniform(0, 24, n)
+        distance = rng.exponential(5, n)  # Média de 5km
+        duration = distance / rng.uniform(20, 60, n)  # Velocidade entre 20-60 km/h
+        num_streets = np.maximum(1, rng.poisson(10, n))
+        avg_danger = rng.uniform(0, 10, n)
+        coverage = rng.uniform(0, 1, n)
+        streets_in_db = np.floor(num_streets * coverage)
         
-        for _ in range(num_samples):
-            # Gerar características aleatórias
-            time_decimal = np.random.uniform(0, 24)
-            distance = np.random.exponential(5)  # Média de 5km
-            duration = distance / np.random.uniform(20, 60)  # Velocidade entre 20-60 km/h
-            num_streets = max(1, int(np.random.poisson(10)))
-            avg_danger = np.random.uniform(0, 10)
-            coverage = np.random.uniform(0, 1)
-            streets_in_db = int(num_streets * coverage)
-            
-            # Características temporais
-            is_night = 1 if 22 <= time_decimal or time_decimal <= 6 else 0
-            is_rush_hour = 1 if (7 <= time_decimal <= 9) or (17 <= time_decimal <= 19) else 0
-            is_weekend = np.random.choice([0, 1], p=[5/7, 2/7])
-            
-            # Distribuição de ruas por perigo
-            dangerous_ratio = np.random.beta(2, 5) if avg_danger > 6 else np.random.beta(1, 10)
-            safe_ratio = np.random.beta(5, 2) if avg_danger < 4 else np.random.beta(1, 5)
-            moderate_ratio = max(0, 1 - dangerous_ratio - safe_ratio)
-            
-            features = [
-                time_decimal, distance, duration, num_streets, avg_danger,
-                coverage, streets_in_db, is_night, is_rush_hour, is_weekend,
-                dangerous_ratio, moderate_ratio, safe_ratio
-            ]
-            
-            # Calcular score baseado em regras heurísticas
-            safety_score = max(0, 10 - avg_danger)
-            distance_score = max(0, 10 - (distance / 5))
-            time_score = max(0, 10 - (duration * 10))
-            coverage_score = coverage * 10
-            
-            # Penalidades por período noturno e ruas perigosas
-            night_penalty = 2 if is_night else 0
-            danger_penalty = dangerous_ratio * 3
-            
-            score = (
-                safety_score * 0.4 +
-                distance_score * 0.3 +
-                time_score * 0.2 +
-                coverage_score * 0.1 -
-                night_penalty -
-                danger_penalty
-            )
-            
-            score = min(10.0, max(0.0, score))
-            
-            X.append(features)
-            y.append(score)
+        # Características temporais
+        is_night = ((time_decimal >= 22) | (time_decimal <= 6)).astype(float)
+        is_rush_hour = (((time_decimal >= 7) & (time_decimal <= 9)) | ((time_decimal >= 17) & (time_decimal <= 19))).astype(float)
+        is_weekend = (rng.random(n) < 2 / 7).astype(float)
+        
+        # Distribuição de ruas por perigo
+        dangerous_ratio = np.where(avg_danger > 6, rng.beta(2, 5, n), rng.beta(1, 10, n))
+        safe_ratio = np.where(avg_danger < 4, rng.beta(5, 2, n), rng.beta(1, 5, n))
+        moderate_ratio = np.maximum(0, 1 - dangerous_ratio - safe_ratio)
+        
+        X = np.column_stack([
+            time_decimal, distance, duration, num_streets, avg_danger,
+            coverage, streets_in_db, is_night, is_rush_hour, is_weekend,
+            dangerous_ratio, moderate_ratio, safe_ratio
+        ])
+        
+        # Calcular score baseado em regras heurísticas
+        safety_score = np.maximum(0, 10 - avg_danger)
+        distance_score = np.maximum(0, 10 - (distance / 5))
+        time_score = np.maximum(0, 10 - (duration * 10))
+        coverage_score = coverage * 10
+        
+        # Penalidades por período noturno e ruas perigosas
+        night_penalty = is_night * 2
+        danger_penalty = dangerous_ratio * 3
+        
+        score = (
+            safety_score * 0.4 +
+            distance_score * 0.3 +
+            time_score * 0.2 +
+            coverage_score * 0.1 -
+            night_penalty -
+            danger_penalty
+        )
         
-        return np.array(X), np.array(y)
+        y = np.clip(score, 0.0, 10.0)
+        return X, y
     
     def train_model(self, force_retrain: bool = False):
         """
@@ -190,92 +295,236 @@ class RouteOptimizationAI:
         if self.is_trained and not force_retrain:
             return
         
-        # Tentar carregar modelo existente
-        if os.path.exists(self.model_path) and os.path.exists(self.scaler_path) and not force_retrain:
-            try:
-                with open(self.model_path, 'rb') as f:
-                    self.model = pickle.load(f)
-                with open(self.scaler_path, 'rb') as f:
-                    self.scaler = pickle.load(f)
-                self.is_trained = True
+        with self._train_lock:
+            if self.is_trained and not force_retrain:
                 return
-            except:
-                pass
-        
-        # Gerar dados de treinamento
-        X, y = self.generate_synthetic_training_data(2000)
-        
-        # Dividir dados
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-        
-        # Normalizar características
-        X_train_scaled = self.scaler.fit_transform(X_train)
-        X_test_scaled = self.scaler.transform(X_test)
-        
-        # Treinar modelo
-        self.model = RandomForestRegressor(
-            n_estimators=100,
-            max_depth=10,
-            random_state=42,
-            n_jobs=-1
+            
+            # Tentar carregar modelo existente
+            if not force_retrain:
+                bundle = self.load_saved_bundle()
+                if bundle is not None:
+                    self.swap_bundle(bundle)
+                    return
+            
+            bundle = fit_route_model(
+                int(os.getenv('AI_TRAINING_SAMPLES', '2000')),
+                inference_backend=self.inference_backend
+            )
+            self.swap_bundle(bundle)
+            self.save_bundle(bundle)
+    
+    def swap_bundle(self, bundle: ModelBundle, expected_version: int = None) -> Optional[ModelBundle]:
+        """
+        Publica um novo modelo: uma única atribuição troca modelo, scaler e floresta compilada juntos.
+        Com expected_version, só troca se nenhum outro modelo foi publicado desde então (retorna None).
+        """
+        with self._swap_lock:
+            if expected_version is not None and self._version != expected_version:
+                return None
+            self._version += 1
+            bundle.version = self._version
+            self.bundle = bundle
+        logger.info("Modelo de IA em uso", extra={'model_version': bundle.version, 'artifact': bundle.artifact})
+        return bundle
+    
+    def load_saved_bundle(self) -> Optional[ModelBundle]:
+        """
+        Carrega a versão em uso do ModelStore, se existir e for do esquema atual
+        """
+        try:
+            # o modelo do sklearn é carregado sempre: referência da paridade e alternativa da floresta compilada
+            saved = self.store.load(FEATURE_SCHEMA_VERSION)
+        except Exception as e:
+            logger.warning("Erro ao carregar modelo salvo: %s", e)
+            return None
+        if saved is None:
+            return None
+        self._store_artifact = saved['artifact']
+        
+        compiled = None
+        if self.inference_backend == 'compiled':
+            compiled = saved['compiled']
+            if compiled is None:
+                # versão salva sem floresta compilada: compila agora
+                compiled = self.compile_model(saved['model'], saved['scaler'])
+            elif not self.check_parity(compiled, saved['model'], saved['scaler']):
+                compiled = None
+        return ModelBundle(
+            saved['model'],
+            saved['scaler'],
+            compiled,
+            metrics=saved['metrics'],
+            trained_at=saved['trained_at'],
+            artifact=saved['artifact']
         )
-        
-        self.model.fit(X_train_scaled, y_train)
-        
-        # Avaliar modelo
-        train_score = self.model.score(X_train_scaled, y_train)
-        test_score = self.model.score(X_test_scaled, y_test)
-        
-        print(f"Modelo treinado - Score treino: {train_score:.3f}, Score teste: {test_score:.3f}")
-        
-        # Salvar modelo
+    
+    def save_bundle(self, bundle: ModelBundle) -> None:
+        """
+        Salva o modelo como uma nova versão no ModelStore
+        """
         try:
-            with open(self.model_path, 'wb') as f:
-                pickle.dump(self.model, f)
-            with open(self.scaler_path, 'wb') as f:
-                pickle.dump(self.scaler, f)
+            with self._store_lock:
+                bundle.artifact = self.store.save(
+                    bundle.model,
+                    bundle.scaler,
+                    bundle.compiled,
+                    FEATURE_SCHEMA_VERSION,
+                    metrics=bundle.metrics,
+                    trained_at=bundle.trained_at
+                )
+                self._store_artifact = bundle.artifact
         except Exception as e:
-            print(f"Erro ao salvar modelo: {e}")
-        
-        self.is_trained = True
+            logger.error("Erro ao salvar modelo: %s", e)
+    
+    def refresh_from_store(self) -> bool:
+        """
+        Carrega a versão em uso no ModelStore se o ponteiro CURRENT mudou desde a última
+        leitura ou gravação deste processo (retreino publicado por outro worker).
+        Retorna True se o modelo foi trocado.
+        """
+        if not self.is_trained:
+            # a primeira carga fica com o warm-up / primeira predição
+            return False
+        with self._store_lock:
+            current = self.store.current_artifact()
+            if current is None or current == self._store_artifact:
+                return False
+            version = self._version
+            bundle = self.load_saved_bundle()
+            # ilegível ou de outro esquema: não tenta de novo até o ponteiro mudar
+            self._store_artifact = current
+        if bundle is None:
+            return False
+        # um modelo publicado durante a leitura (retreino deste processo) é mais novo: mantém
+        if self.swap_bundle(bundle, expected_version=version) is None:
+            return False
+        logger.info("Modelo recarregado do ModelStore", extra={'artifact': bundle.artifact})
+        return True
+    
+    def _watch_store(self, interval: float) -> None:
+        while not self._watch_stop.wait(interval):
+            try:
+                self.refresh_from_store()
+            except Exception:
+                logger.exception("Erro ao verificar o ModelStore")
+    
+    def start_store_watch(self, interval: float = None) -> None:
+        """
+        Verifica o ModelStore periodicamente (AI_MODEL_POLL_SECONDS), para que todos os
+        workers passem a usar o modelo retreinado em qualquer um deles
+        """
+        interval = interval if interval is not None else float(os.getenv('AI_MODEL_POLL_SECONDS', '10'))
+        if self._watch_thread is not None or interval <= 0:
+            return
+        self._watch_thread = threading.Thread(
+            target=self._watch_store, args=(interval,), name='model-store-watch', daemon=True
+        )
+        self._watch_thread.start()
+    
+    def stop_store_watch(self) -> None:
+        self._watch_stop.set()
+    
+    def warm_up(self) -> None:
+        """
+        Carrega (ou treina) o modelo e faz uma predição para trazer os arrays para a memória
+        """
+        self.train_model()
+        X, _ = self.generate_synthetic_training_data(8, seed=1)
+        bundle = self.bundle
+        if bundle.compiled is not None:
+            bundle.compiled.predict(X)
+        else:
+            bundle.model.predict(bundle.scaler.transform(X))
+    
+    def compile_model(self, model: RandomForestRegressor, scaler: StandardScaler) -> Optional[CompiledForest]:
+        """
+        Compila a floresta para o backend rápido e confere a paridade com o sklearn;
+        em caso de divergência a predição continua pelo sklearn
+        """
+        if self.inference_backend != 'compiled':
+            return None
+        try:
+            compiled = CompiledForest.from_sklearn(model, scaler)
+        except Exception as e:
+            logger.warning("Erro ao compilar modelo, usando sklearn: %s", e)
+            return None
+        return compiled if self.check_parity(compiled, model, scaler) else None
+    
+    def check_parity(self, compiled: CompiledForest, model: RandomForestRegressor, scaler: StandardScaler) -> bool:
+        """
+        Confere a floresta compilada (recém-compilada ou lida do ModelStore) contra o sklearn
+        em linhas sintéticas; False se divergir ou falhar
+        """
+        try:
+            X_check, _ = self.generate_synthetic_training_data(256, seed=7)
+            difference = compiled.verify(model, scaler, X_check)
+        except Exception as e:
+            logger.warning("Erro ao conferir floresta compilada, usando sklearn: %s", e)
+            return False
+        if difference is None:
+            logger.warning("Floresta compilada diverge do sklearn, usando sklearn")
+            return False
+        return True
     
     def predict_route_quality(self, route_data: Dict, safety_analysis: Dict, current_time: time) -> Dict:
         """
         Prediz a qualidade da rota usando IA
         """
+        return self.predict_many([route_data], [safety_analysis], current_time)[0]
+
+    def predict_many(self, routes_data: List[Dict], safety_analyses: List[Dict], current_time: time) -> List[Dict]:
+        """
+        Prediz a qualidade de várias rotas com uma única chamada ao modelo
+        """
         if not self.is_trained:
             self.train_model()
-        
-        # Extrair características
-        features = self.extract_features(route_data, safety_analysis, current_time)
-        features_scaled = self.scaler.transform(features)
-        
-        # Fazer predição
-        ai_score = self.model.predict(features_scaled)[0]
-        
-        # Calcular score heurístico para comparação
-        heuristic_score = self.calculate_route_score(route_data, safety_analysis, current_time)
-        
-        # Score final (média ponderada)
-        final_score = (ai_score * 0.7 + heuristic_score * 0.3)
-        
-        # Classificar qualidade
+
+        if not routes_data:
+            return []
+
+        # Ler o modelo publicado uma única vez: um retreino concorrente não afeta esta predição
+        bundle = self.bundle
+
+        # Extrair características de todas as rotas em uma única matriz
+        features = self.extract_features_matrix(routes_data, safety_analyses, current_time)
+
+        # Fazer predição (uma chamada para todas as rotas)
+        if bundle.compiled is not None:
+            # o scaler já está incorporado aos limiares da floresta compilada
+            ai_scores = bundle.compiled.predict(features)
+        else:
+            features_scaled = bundle.scaler.transform(features)
+            ai_scores = bundle.model.predict(features_scaled)
+
+        results = []
+        for route_data, safety_analysis, ai_score in zip(routes_data, safety_analyses, ai_scores):
+            # Calcular score heurístico para comparação
+            heuristic_score = self.calculate_route_score(route_data, safety_analysis, current_time)
+
+            # Score final (média ponderada)
+            final_score = (ai_score * 0.7 + heuristic_score * 0.3)
+
+            results.append({
+                'ai_score': float(ai_score),
+                'heuristic_score': float(heuristic_score),
+                'final_score': float(final_score),
+                'quality_rating': self.classify_quality(final_score),
+                'confidence': min(1.0, safety_analysis.get('database_coverage', 0) / 100.0)
+            })
+        return results
+
+    def classify_quality(self, final_score: float) -> str:
+        """
+        Classifica a qualidade a partir do score final
+        """
         if final_score >= 8:
-            quality = "EXCELENTE"
+            return "EXCELENTE"
         elif final_score >= 6:
-            quality = "BOA"
+            return "BOA"
         elif final_score >= 4:
-            quality = "REGULAR"
+            return "REGULAR"
         else:
-            quality = "RUIM"
-        
-        return {
-            'ai_score': float(ai_score),
-            'heuristic_score': float(heuristic_score),
-            'final_score': float(final_score),
-            'quality_rating': quality,
-            'confidence': min(1.0, safety_analysis.get('database_coverage', 0) / 100.0)
-        }
+            return "RUIM"
     
     def suggest_route_improvements(self, route_data: Dict, safety_analysis: Dict, current_time: time) -> List[str]:
         """
@@ -311,6 +560,48 @@ class RouteOptimizationAI:
         
         return suggestions
 
+def fit_route_model(num_samples: int = 2000, seed: int = 42, inference_backend: str = 'compiled') -> ModelBundle:
+    """
+    Treina modelo e scaler com dados sintéticos e devolve um ModelBundle.
+    Função de módulo para poder ser executada em outro processo.
+    """
+    trainer = RouteOptimizationAI()
+    trainer.inference_backend = inference_backend
+    
+    # Gerar dados de treinamento
+    X, y = trainer.generate_synthetic_training_data(num_samples, seed)
+    
+    # Dividir dados
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    
+    # Normalizar características
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
+    
+    # Treinar modelo
+    model = RandomForestRegressor(
+        n_estimators=100,
+        max_depth=10,
+        random_state=42,
+        n_jobs=-1
+    )
+    
+    model.fit(X_train_scaled, y_train)
+    
+    # Avaliar modelo
+    train_score = model.score(X_train_scaled, y_train)
+    test_score = model.score(X_test_scaled, y_test)
+    
+    logger.info("Modelo treinado", extra={'train_score': round(train_score, 3), 'test_score': round(test_score, 3)})
+    
+    return ModelBundle(
+        model,
+        scaler,
+        trainer.compile_model(model, scaler),
+        metrics={'train_score': train_score, 'test_score': test_score, 'num_samples': num_samples}
+    )
+
 # Instância global da IA
 route_ai = RouteOptimizationAI()
 
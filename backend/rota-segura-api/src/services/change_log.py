@@ -0,0 +1,201 @@
+import logging
+import os
+import threading
+from typing import Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.models.rota_segura import RotaSeguraAlteracao
+
+logger = logging.getLogger(__name__)
+
+# Ids abaixo do último aplicado que continuam sendo relidos: no PostgreSQL a sequência é
+# consumida na ordem do INSERT, mas as transações podem confirmar fora de ordem
+CHANGE_WINDOW = int(os.getenv('DANGER_CHANGE_WINDOW', '1000'))
+
+# Triggers que registram em RotaSeguraAlteracao toda rua incluída, editada ou removida
+# (inclusive por fora da API: populate_db.py, importador, psql...). Idempotentes.
+SQLITE_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS "RotaSegura_alteracao_insert" AFTER INSERT ON "RotaSegura"
+       BEGIN INSERT INTO "RotaSeguraAlteracao" ("rotaSeguraId") VALUES (NEW.id); END''',
+    '''CREATE TRIGGER IF NOT EXISTS "RotaSegura_alteracao_update" AFTER UPDATE ON "RotaSegura"
+       BEGIN
+           INSERT INTO "RotaSeguraAlteracao" ("rotaSeguraId") SELECT OLD.id WHERE OLD.id <> NEW.id;
+           INSERT INTO "RotaSeguraAlteracao" ("rotaSeguraId") VALUES (NEW.id);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS "RotaSegura_alteracao_delete" AFTER DELETE ON "RotaSegura"
+       BEGIN INSERT INTO "RotaSeguraAlteracao" ("rotaSeguraId") VALUES (OLD.id); END''',
+    '''CREATE TRIGGER IF NOT EXISTS "RotaSeguraSegmento_alteracao_insert" AFTER INSERT ON "RotaSeguraSegmento"
+       BEGIN INSERT INTO "RotaSeguraAlteracao" ("rotaSeguraId") VALUES (NEW."rotaSeguraId"); END''',
+    '''CREATE TRIGGER IF NOT EXISTS "RotaSeguraSegmento_alteracao_update" AFTER UPDATE ON "RotaSeguraSegmento"
+       BEGIN
+           INSERT INTO "RotaSeguraAlteracao" ("rotaSeguraId")
+               SELECT OLD."rotaSeguraId" WHERE OLD."rotaSeguraId" <> NEW."rotaSeguraId";
+           INSERT INTO "RotaSeguraAlteracao" ("rotaSeguraId") VALUES (NEW."rotaSeguraId");
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS "RotaSeguraSegmento_alteracao_delete" AFTER DELETE ON "RotaSeguraSegmento"
+       BEGIN INSERT INTO "RotaSeguraAlteracao" ("rotaSeguraId") VALUES (OLD."rotaSeguraId"); END''',
+]
+
+# Mesmo conteúdo da migração do Prisma add_rota_segura_alteracao
+POSTGRES_TRIGGERS = [
+    '''CREATE OR REPLACE FUNCTION rota_segura_registrar_alteracao() RETURNS trigger AS $$
+       BEGIN
+           IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.id IS DISTINCT FROM NEW.id) THEN
+               INSERT INTO "RotaSeguraAlteracao" ("rotaSeguraId") VALUES (OLD.id);
+           END IF;
+           IF TG_OP <> 'DELETE' THEN
+               INSERT INTO "RotaSeguraAlteracao" ("rotaSeguraId") VALUES (NEW.id);
+           END IF;
+           RETURN NULL;
+       END;
+       $$ LANGUAGE plpgsql''',
+    '''CREATE OR REPLACE FUNCTION rota_segura_segmento_registrar_alteracao() RETURNS trigger AS $$
+       BEGIN
+           IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD."rotaSeguraId" IS DISTINCT FROM NEW."rotaSeguraId") THEN
+               INSERT INTO "RotaSeguraAlteracao" ("rotaSeguraId") VALUES (OLD."rotaSeguraId");
+           END IF;
+           IF TG_OP <> 'DELETE' THEN
+               INSERT INTO "RotaSeguraAlteracao" ("rotaSeguraId") VALUES (NEW."rotaSeguraId");
+           END IF;
+           RETURN NULL;
+       END;
+       $$ LANGUAGE plpgsql''',
+    '''DO $$
+       BEGIN
+           IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'RotaSegura_alteracao') THEN
+               CREATE TRIGGER "RotaSegura_alteracao" AFTER INSERT OR UPDATE OR DELETE ON "RotaSegura"
+                   FOR EACH ROW EXECUTE PROCEDURE rota_segura_registrar_alteracao();
+           END IF;
+           IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'RotaSeguraSegmento_alteracao') THEN
+               CREATE TRIGGER "RotaSeguraSegmento_alteracao" AFTER INSERT OR UPDATE OR DELETE ON "RotaSeguraSegmento"
+                   FOR EACH ROW EXECUTE PROCEDURE rota_segura_segmento_registrar_alteracao();
+           END IF;
+       END
+       $$''',
+]
+
+
+def install_change_tracking(engine: Engine) -> bool:
+    """
+    Cria a tabela de alterações e os triggers (SQLite ou PostgreSQL); retorna False
+    se o banco não for suportado ou a instalação falhar
+    """
+    statements = {'sqlite': SQLITE_TRIGGERS, 'postgresql': POSTGRES_TRIGGERS}.get(engine.dialect.name)
+    if statements is None:
+        logger.warning("Registro de alterações não suportado no banco %s", engine.dialect.name)
+        return False
+    try:
+        RotaSeguraAlteracao.__table__.create(engine, checkfirst=True)
+        with engine.begin() as connection:
+            for statement in statements:
+                connection.execute(text(statement))
+    except SQLAlchemyError as e:
+        logger.warning("Não foi possível instalar o registro de alterações: %s", e)
+        return False
+    return True
+
+
+def latest_change_id(db_session) -> Optional[int]:
+    """
+    Id da última alteração registrada (0 se nenhuma); None se a tabela não existir
+    """
+    try:
+        return db_session.execute(select(func.max(RotaSeguraAlteracao.id))).scalar() or 0
+    except SQLAlchemyError:
+        db_session.rollback()
+        return None
+
+
+def recent_change_ids(db_session, window: int = None) -> Optional[List[int]]:
+    """
+    Ids das alterações dentro da janela que termina na última; None se a tabela não existir
+    """
+    window = CHANGE_WINDOW if window is None else window
+    latest = latest_change_id(db_session)
+    if latest is None:
+        return None
+    return list(db_session.execute(
+        select(RotaSeguraAlteracao.id).where(RotaSeguraAlteracao.id > latest - window)
+    ).scalars())
+
+
+def changes_after(db_session, after: int) -> List[Tuple[int, int]]:
+    """
+    (id da alteração, id da rua) com id > after
+    """
+    return [tuple(row) for row in db_session.execute(
+        select(RotaSeguraAlteracao.id, RotaSeguraAlteracao.rotaSeguraId)
+        .where(RotaSeguraAlteracao.id > after)
+        .order_by(RotaSeguraAlteracao.id)
+    ).all()]
+
+
+class ChangeCursor:
+    """
+    Posição de um índice no registro de alterações. Em vez de um cursor estrito (id > último),
+    guarda os ids já aplicados dentro de uma janela abaixo do último: uma alteração com id
+    menor confirmada depois ainda é encontrada e aplicada.
+    """
+
+    def __init__(self, window: int = None):
+        self.window = CHANGE_WINDOW if window is None else window
+        self.change_id = 0
+        self.seen: Set[int] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def low(self) -> int:
+        """
+        Ids até este valor não são mais relidos
+        """
+        return self.change_id - self.window
+
+    def reset(self, change_ids: Iterable[int]) -> None:
+        """
+        Recarga completa: as alterações visíveis antes da leitura da tabela já estão refletidas
+        """
+        with self._lock:
+            self.seen = set(change_ids)
+            self.change_id = max(self.seen, default=0)
+            self._trim()
+
+    def pending(self, changes: Iterable[Tuple[int, int]]) -> Tuple[List[int], List[int]]:
+        """
+        Ids das alterações ainda não aplicadas e as ruas afetadas por elas
+        """
+        with self._lock:
+            low, seen = self.low, self.seen
+            new = [(change_id, street_id) for change_id, street_id in changes
+                   if change_id > low and change_id not in seen]
+        return [change_id for change_id, _ in new], sorted({street_id for _, street_id in new})
+
+    def advance(self, change_ids: Iterable[int]) -> None:
+        with self._lock:
+            self.seen.update(change_ids)
+            self.change_id = max(self.seen, default=self.change_id)
+            self._trim()
+
+    def _trim(self) -> None:
+        low = self.low
+        self.seen = {change_id for change_id in self.seen if change_id > low}
+
+
+def oldest_change_id(db_session) -> int:
+    return db_session.execute(select(func.min(RotaSeguraAlteracao.id))).scalar() or 0
+
+
+def prune_changes(db_session, keep: int) -> int:
+    """
+    Mantém apenas as `keep` alterações mais recentes (nunca menos que a janela); um processo
+    que ficar para trás percebe a lacuna (oldest_change_id) e recarrega o índice inteiro
+    """
+    keep = max(keep, CHANGE_WINDOW)
+    latest = latest_change_id(db_session)
+    if not latest or latest <= keep:
+        return 0
+    result = db_session.execute(delete(RotaSeguraAlteracao).where(RotaSeguraAlteracao.id <= latest - keep))
+    db_session.commit()
+    return result.rowcount or 0
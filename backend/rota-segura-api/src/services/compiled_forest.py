@@ -0,0 +1,154 @@
+import numpy as np
+from typing import Optional
+
+_SIGN_MASK = np.int64(0x7FFFFFFFFFFFFFFF)
+
+
+def _ordered_keys(values: np.ndarray) -> np.ndarray:
+    # mapeia float64 para int64 preservando a ordem (permite busca binária sobre os bits)
+    bits = np.asarray(values, dtype=np.float64).view(np.int64)
+    return np.where(bits >= 0, bits, -(bits & _SIGN_MASK))
+
+
+def _from_ordered_keys(keys: np.ndarray) -> np.ndarray:
+    bits = np.where(keys >= 0, keys, (-keys) | ~_SIGN_MASK)
+    return bits.view(np.float64)
+
+
+def fold_thresholds(threshold: np.ndarray, mean: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    """
+    Converte limiares do espaço normalizado para o espaço original.
+
+    O sklearn compara float32((x - mean) / scale) <= t; como essa expressão é
+    monotônica em x, existe um maior x* que satisfaz a condição. Ele é encontrado
+    por busca binária vetorizada sobre os bits do float64, o que reproduz
+    exatamente as decisões do sklearn (inclusive em características discretas).
+    """
+    threshold = np.asarray(threshold, dtype=np.float64)
+
+    def goes_left(x):
+        with np.errstate(over='ignore', invalid='ignore'):
+            return ((x - mean) / scale).astype(np.float32) <= threshold
+
+    lowest = np.full(threshold.shape, -np.finfo(np.float64).max)
+    highest = np.full(threshold.shape, np.finfo(np.float64).max)
+    lo = _ordered_keys(lowest)
+    hi = _ordered_keys(highest)
+    # invariante: goes_left(lo) é verdadeiro e goes_left(hi) é falso
+    for _ in range(64):
+        mid = (lo >> 1) + (hi >> 1) + (lo & hi & 1)  # média sem estouro de int64
+        left = goes_left(_from_ordered_keys(mid))
+        lo = np.where(left, mid, lo)
+        hi = np.where(left, hi, mid)
+
+    folded = _from_ordered_keys(lo)
+    folded = np.where(goes_left(lowest), folded, -np.inf)
+    return np.where(goes_left(highest), np.inf, folded)
+
+
+class CompiledForest:
+    """
+    RandomForestRegressor compilado em arrays NumPy contíguos (feature/limiar/filhos/valor).
+    A normalização do StandardScaler é incorporada aos limiares, então a predição
+    recebe as características originais, sem passar pelo scaler.
+    """
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, left: np.ndarray,
+                 right: np.ndarray, value: np.ndarray, roots: np.ndarray, max_depth: int):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+
+    @classmethod
+    def from_sklearn(cls, model, scaler=None) -> 'CompiledForest':
+        """
+        Compila as árvores treinadas do sklearn (e o scaler, se houver)
+        """
+        n_features = model.n_features_in_
+        mean = np.zeros(n_features)
+        scale = np.ones(n_features)
+        if scaler is not None:
+            if getattr(scaler, 'mean_', None) is not None:
+                mean = np.asarray(scaler.mean_, dtype=np.float64)
+            if getattr(scaler, 'scale_', None) is not None:
+                scale = np.asarray(scaler.scale_, dtype=np.float64)
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes)
+            is_leaf = tree.children_left < 0
+
+            feature = np.where(is_leaf, 0, tree.feature).astype(np.int32)
+            threshold = np.where(is_leaf, np.inf, tree.threshold)
+            # folhas apontam para si mesmas: o laço de profundidade fixa fica parado nelas
+            left = np.where(is_leaf, node_ids, tree.children_left) + offset
+            right = np.where(is_leaf, node_ids, tree.children_right) + offset
+
+            features.append(feature)
+            thresholds.append(threshold)
+            lefts.append(left.astype(np.int32))
+            rights.append(right.astype(np.int32))
+            values.append(tree.value[:, 0, 0].astype(np.float64))
+            roots.append(offset)
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        feature = np.concatenate(features)
+        threshold = np.concatenate(thresholds)
+        split = np.isfinite(threshold)
+        # uma única busca vetorizada para os limiares de todas as árvores
+        threshold[split] = fold_thresholds(threshold[split], mean[feature[split]], scale[feature[split]])
+
+        return cls(
+            feature=np.ascontiguousarray(feature),
+            threshold=np.ascontiguousarray(threshold),
+            left=np.ascontiguousarray(np.concatenate(lefts)),
+            right=np.ascontiguousarray(np.concatenate(rights)),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.array(roots, dtype=np.int32),
+            max_depth=int(max_depth)
+        )
+
+    @property
+    def n_estimators(self) -> int:
+        return len(self.roots)
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """
+        Folha alcançada em cada árvore (linhas x árvores), numerada dentro da própria árvore
+        como no estimator.apply do sklearn. Todas as árvores avançam um nível por iteração.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], len(self.roots))).copy()
+
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+
+        return node - self.roots
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        Predição para uma ou poucas linhas
+        """
+        return self.value[self.apply(X) + self.roots].mean(axis=1)
+
+    def verify(self, model, scaler, X: np.ndarray, tolerance: float = 1e-9) -> Optional[float]:
+        """
+        Compara com o sklearn nas linhas dadas; retorna a maior diferença ou None se passar da tolerância
+        """
+        X = np.asarray(X, dtype=np.float64)
+        expected = model.predict(scaler.transform(X) if scaler is not None else X)
+        difference = float(np.max(np.abs(self.predict(X) - expected))) if len(X) else 0.0
+        return difference if difference <= tolerance else None
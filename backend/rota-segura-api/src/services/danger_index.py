@@ -0,0 +1,257 @@
+from bisect import bisect_right
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from src.models.rota_segura import RotaSegura
+from src.services.snapshot_index import SnapshotIndex
+from src.services.text_utils import normalize_street_name
+
+
+MINUTES_PER_DAY = 1440
+
+# Ids por consulta IN ao reler ruas alteradas (abaixo do limite de parâmetros do SQLite)
+CHANGE_QUERY_CHUNK = 500
+
+
+@lru_cache(maxsize=4096)
+def parse_clock_minutes(value: str) -> int:
+    """
+    Converte "HH:MM" em minuto do dia (0-1439); retorna -1 se o horário for inválido
+    """
+    try:
+        parsed = datetime.strptime(value, "%H:%M")
+        return parsed.hour * 60 + parsed.minute
+    except (TypeError, ValueError):
+        return -1
+
+
+class StreetRecord(NamedTuple):
+    id: int
+    nomeRua: str
+    horarioInicio: str
+    horarioFim: str
+    indicePericulosidade: float
+
+
+class DangerSnapshot:
+    """
+    Estrutura imutável construída a partir da tabela RotaSegura.
+    Os períodos de perigo ficam pré-calculados em minutos do dia.
+    """
+    SEPARATOR = '\x00'
+
+    def __init__(self, records: List[StreetRecord], names: List[str] = None,
+                 start_minute: np.ndarray = None, end_minute: np.ndarray = None):
+        """
+        `names` e as janelas em minutos podem vir prontos (atualização incremental)
+        """
+        self.records = records
+        if names is None:
+            names = [normalize_street_name(record.nomeRua) for record in records]
+        self.names = names
+        self.exact: Dict[str, int] = {}
+        for position, name in enumerate(names):
+            self.exact.setdefault(name, position)
+        lengths = np.fromiter((len(name) + 1 for name in names), dtype=np.int64, count=len(names))
+        self.starts: List[int] = (np.cumsum(lengths) - lengths).tolist()
+        # todos os nomes concatenados na ordem do id: str.find devolve a primeira rua que contém o termo
+        self.haystack = self.SEPARATOR.join(names)
+        self.memo: Dict[str, int] = {}
+
+        self.ids = np.array([record.id for record in records], dtype=np.int64)
+        self.base_index = np.array([record.indicePericulosidade for record in records], dtype=float)
+        if start_minute is None or end_minute is None:
+            start_minute, end_minute = self.window_minutes(records)
+        self.start_minute = start_minute
+        self.end_minute = end_minute
+
+    @staticmethod
+    def window_minutes(records: List[StreetRecord]):
+        """
+        Início e fim do período de perigo em minutos do dia (int16, -1 quando inválido)
+        """
+        start = np.array([parse_clock_minutes(record.horarioInicio) for record in records], dtype=np.int16)
+        end = np.array([parse_clock_minutes(record.horarioFim) for record in records], dtype=np.int16)
+        # horário inválido em qualquer ponta desativa a janela (como o antigo except: return False)
+        valid = (start >= 0) & (end >= 0)
+        return np.where(valid, start, -1).astype(np.int16), np.where(valid, end, -1).astype(np.int16)
+
+    def with_changes(self, records: List[StreetRecord], changed_ids, names: List[str] = None) -> 'DangerSnapshot':
+        """
+        Novo snapshot com as ruas `changed_ids` substituídas por `records` (as ausentes
+        em `records` foram removidas); só as ruas alteradas são normalizadas de novo
+        """
+        if names is None:
+            names = [normalize_street_name(record.nomeRua) for record in records]
+        changed = np.fromiter(set(changed_ids) | {record.id for record in records}, dtype=np.int64)
+        kept = np.flatnonzero(~np.isin(self.ids, changed)).tolist()
+        start, end = self.window_minutes(records)
+
+        merged = [self.records[i] for i in kept] + list(records)
+        names = [self.names[i] for i in kept] + list(names)
+        start = np.concatenate((self.start_minute[kept], start)).astype(np.int16)
+        end = np.concatenate((self.end_minute[kept], end)).astype(np.int16)
+
+        order = np.argsort(np.fromiter((record.id for record in merged), dtype=np.int64, count=len(merged)),
+                           kind='stable')
+        positions = order.tolist()
+        return DangerSnapshot(
+            [merged[i] for i in positions], [names[i] for i in positions], start[order], end[order]
+        )
+
+    def find(self, normalized: str) -> int:
+        """
+        Retorna a posição da primeira rua (menor id) cujo nome contém o termo, ou -1
+        """
+        cached = self.memo.get(normalized)
+        if cached is not None:
+            return cached
+
+        if not self.records:
+            return -1
+
+        # nome exato conhecido: a primeira ocorrência não pode estar depois dele
+        end = len(self.haystack)
+        exact_position = self.exact.get(normalized)
+        if exact_position is not None:
+            end = self.starts[exact_position] + len(normalized)
+
+        offset = self.haystack.find(normalized, 0, end)
+        position = bisect_right(self.starts, offset) - 1 if offset >= 0 else -1
+
+        if len(self.memo) >= 50000:
+            self.memo.clear()
+        self.memo[normalized] = position
+        return position
+
+    def lookup_positions(self, street_names: List[str]) -> np.ndarray:
+        """
+        Posições das ruas no snapshot (-1 para ruas não catalogadas)
+        """
+        return np.array(
+            [self.find(normalize_street_name(street_name)) for street_name in street_names],
+            dtype=np.int64
+        )
+
+    def positions_for_ids(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Posições no snapshot dos ids da RotaSegura (-1 para ids ausentes), por busca binária vetorizada
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if not self.records:
+            return np.full(ids.shape, -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+        return np.where(self.ids[positions] == ids, positions, -1)
+
+    def base_indices(self, positions: np.ndarray, default: float = 2.0) -> np.ndarray:
+        """
+        Índice de periculosidade base das ruas (default para ruas não catalogadas)
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        if not self.records:
+            return np.full(positions.shape, default, dtype=float)
+        return np.where(positions >= 0, self.base_index[np.where(positions >= 0, positions, 0)], default)
+
+    def danger_mask(self, positions: np.ndarray, minute: int) -> np.ndarray:
+        """
+        Indica, de forma vetorizada, quais ruas estão no período de perigo no minuto dado
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        if not self.records:
+            return np.zeros(positions.shape, dtype=bool)
+        safe = np.where(positions >= 0, positions, 0)
+        start = self.start_minute[safe]
+        end = self.end_minute[safe]
+        active = (positions >= 0) & (start >= 0)
+        # período que cruza a meia-noite (ex: 20:00 às 05:00)
+        in_window = np.where(start > end, (minute >= start) | (minute <= end), (start <= minute) & (minute <= end))
+        return active & in_window
+
+    def current_indices(self, positions: np.ndarray, minute: int, default: float = 2.0) -> np.ndarray:
+        """
+        Índice de periculosidade ajustado ao horário (aumenta 50% no período crítico, até 10.0)
+        """
+        base_index = self.base_indices(positions, default)
+        return np.where(self.danger_mask(positions, minute), np.minimum(10.0, base_index * 1.5), base_index)
+
+    def next_boundary(self, positions: np.ndarray, minute: int) -> Optional[int]:
+        """
+        Próximo minuto do dia em que algum período de perigo das ruas começa ou termina
+        (o fim é inclusivo, então a mudança ocorre no minuto seguinte). None se nenhuma rua tem período.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        positions = positions[positions >= 0]
+        if positions.size == 0:
+            return None
+        start = self.start_minute[positions].astype(np.int64)
+        end = self.end_minute[positions].astype(np.int64)
+        valid = start >= 0
+        if not valid.any():
+            return None
+        boundaries = np.concatenate([start[valid], (end[valid] + 1) % MINUTES_PER_DAY])
+        # distância circular estritamente positiva até cada fronteira (1..1440)
+        delta = (boundaries - minute - 1) % MINUTES_PER_DAY + 1
+        return int((minute + delta.min()) % MINUTES_PER_DAY)
+
+
+class StreetDangerIndex(SnapshotIndex):
+    """
+    Índice em memória (por processo) das ruas catalogadas em RotaSegura.
+    Mantém a semântica do antigo ILIKE '%nome%' ... first(): devolve a
+    primeira rua, em ordem de id, cujo nome contém o termo buscado.
+    """
+
+    size_key = 'streets'
+
+    def _query(self, db_session, ids: List[int] = None) -> Tuple[List[StreetRecord], List[str]]:
+        """
+        Ruas (todas ou só `ids`) e seus nomes normalizados; usa nomeRuaNormalizado
+        gravado no banco e só normaliza em Python as linhas sem ele
+        """
+        query = db_session.query(
+            RotaSegura.id,
+            RotaSegura.nomeRua,
+            RotaSegura.horarioInicio,
+            RotaSegura.horarioFim,
+            RotaSegura.indicePericulosidade,
+            RotaSegura.nomeRuaNormalizado
+        )
+        if ids is None:
+            rows = query.order_by(RotaSegura.id).all()
+        else:
+            rows = []
+            for begin in range(0, len(ids), CHANGE_QUERY_CHUNK):
+                chunk = ids[begin:begin + CHANGE_QUERY_CHUNK]
+                rows.extend(query.filter(RotaSegura.id.in_(chunk)).all())
+        records = [StreetRecord(*row[:5]) for row in rows]
+        names = [row[5] if row[5] is not None else normalize_street_name(row[1]) for row in rows]
+        return records, names
+
+    def _build(self, db_session) -> DangerSnapshot:
+        # uma única consulta à tabela
+        records, names = self._query(db_session)
+        return DangerSnapshot(records, names)
+
+    def _build_changes(self, db_session, snapshot: DangerSnapshot, street_ids: List[int]) -> DangerSnapshot:
+        records, names = self._query(db_session, street_ids)
+        return snapshot.with_changes(records, street_ids, names)
+
+    def _size(self, snapshot: DangerSnapshot) -> int:
+        return len(snapshot.records)
+
+    def lookup(self, street_name: str) -> Optional[StreetRecord]:
+        """
+        Busca a rua no índice sem acessar o banco
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        position = snapshot.find(normalize_street_name(street_name))
+        return snapshot.records[position] if position >= 0 else None
+
+
+# Instância global do índice
+danger_index = StreetDangerIndex()
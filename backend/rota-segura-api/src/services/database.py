@@ -0,0 +1,230 @@
+import logging
+import os
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, create_engine, event, inspect, select, text, update
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.models.rota_segura import RotaSegura
+from src.services.text_utils import normalize_street_name
+
+logger = logging.getLogger(__name__)
+
+# Banco local padrão, com caminho absoluto: a API, populate_db.py e o importador
+# usam o mesmo arquivo qualquer que seja o diretório de execução. É o mesmo arquivo
+# da antiga configuração 'sqlite:///rota_segura.db', que o Flask-SQLAlchemy resolvia
+# em app.instance_path (<api>/instance)
+DEFAULT_SQLITE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'instance', 'rota_segura.db'
+)
+
+# Linhas por UPDATE ao preencher nomeRuaNormalizado em bancos antigos
+BACKFILL_CHUNK = 5000
+
+# Renomear uma rua por fora do ORM (SQL direto, Prisma) sem informar nomeRuaNormalizado anula
+# o valor antigo: a normalização (acentos Unicode) só existe em Python, então o índice em
+# memória normaliza as linhas NULL e backfill_normalized_names as preenche de novo
+NAME_TRIGGERS = {
+    'sqlite': [
+        '''CREATE TRIGGER IF NOT EXISTS "RotaSegura_nome_normalizado" AFTER UPDATE OF "nomeRua" ON "RotaSegura"
+           WHEN NEW."nomeRua" IS NOT OLD."nomeRua" AND NEW."nomeRuaNormalizado" IS OLD."nomeRuaNormalizado"
+           BEGIN UPDATE "RotaSegura" SET "nomeRuaNormalizado" = NULL WHERE id = NEW.id; END''',
+    ],
+    # mesmo conteúdo da migração do Prisma rota_segura_nome_normalizado_trigger
+    'postgresql': [
+        '''CREATE OR REPLACE FUNCTION rota_segura_anular_nome_normalizado() RETURNS trigger AS $$
+           BEGIN
+               IF NEW."nomeRua" IS DISTINCT FROM OLD."nomeRua"
+                  AND NEW."nomeRuaNormalizado" IS NOT DISTINCT FROM OLD."nomeRuaNormalizado" THEN
+                   NEW."nomeRuaNormalizado" := NULL;
+               END IF;
+               RETURN NEW;
+           END;
+           $$ LANGUAGE plpgsql''',
+        '''DO $$
+           BEGIN
+               IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'RotaSegura_nome_normalizado') THEN
+                   CREATE TRIGGER "RotaSegura_nome_normalizado" BEFORE UPDATE OF "nomeRua" ON "RotaSegura"
+                       FOR EACH ROW EXECUTE PROCEDURE rota_segura_anular_nome_normalizado();
+               END IF;
+           END
+           $$''',
+    ],
+}
+
+
+def database_url(url: str = None) -> str:
+    """
+    URL do banco: argumento, variável DATABASE_URL (a mesma do Prisma) ou o SQLite local.
+    Aceita o formato do Prisma (postgres://, ?schema=...)
+    """
+    url = url or os.getenv('DATABASE_URL')
+    if not url:
+        os.makedirs(os.path.dirname(DEFAULT_SQLITE_PATH), exist_ok=True)
+        url = f'sqlite:///{DEFAULT_SQLITE_PATH}'
+    parsed = make_url(url)
+    if parsed.drivername == 'postgres':
+        parsed = parsed.set(drivername='postgresql')
+    if parsed.get_backend_name() == 'postgresql' and 'schema' in parsed.query:
+        # o psycopg2 não conhece o parâmetro schema do Prisma: vira search_path
+        schema = parsed.query['schema']
+        parsed = parsed.difference_update_query(['schema']).update_query_dict(
+            {'options': f'-csearch_path={schema}'}
+        )
+    return parsed.render_as_string(hide_password=False)
+
+
+def safe_url(url: str) -> str:
+    """
+    URL sem a senha, para logs
+    """
+    return make_url(url).render_as_string(hide_password=True)
+
+
+def is_sqlite_memory(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == 'sqlite' and parsed.database in (None, '', ':memory:')
+
+
+def engine_options(url: str) -> Dict:
+    """
+    Opções do create_engine (e do SQLALCHEMY_ENGINE_OPTIONS) conforme o banco
+    """
+    if is_sqlite_memory(url):
+        # SQLite em memória usa um pool próprio (uma conexão por thread)
+        return {'connect_args': {'check_same_thread': False}}
+    options = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '10')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '20')),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT_SECONDS', '30')),
+        # conexões mais velhas que isto são descartadas (firewalls/pgbouncer derrubam as ociosas)
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE_SECONDS', '1800')),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    }
+    if make_url(url).get_backend_name() == 'sqlite':
+        # conexões compartilhadas entre as threads do servidor; a espera por lock fica no busy_timeout
+        options['connect_args'] = {
+            'check_same_thread': False,
+            'timeout': float(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')) / 1000
+        }
+    return options
+
+
+def configure_sqlite(engine: Engine) -> None:
+    """
+    Ajustes por conexão do SQLite local: WAL (leitores não bloqueiam o escritor nem
+    uns aos outros), synchronous NORMAL, cache e mmap maiores
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+    memory = is_sqlite_memory(str(engine.url))
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))}",
+        'PRAGMA synchronous = NORMAL',
+        f"PRAGMA cache_size = -{int(os.getenv('SQLITE_CACHE_KB', '65536'))}",
+        f"PRAGMA mmap_size = {int(os.getenv('SQLITE_MMAP_BYTES', str(256 * 1024 * 1024)))}",
+        'PRAGMA temp_store = MEMORY'
+    ]
+    if not memory:
+        pragmas.insert(0, 'PRAGMA journal_mode = WAL')
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def create_database_engine(url: str = None) -> Engine:
+    """
+    Engine para os scripts (importador, benchmarks) com as mesmas opções da API
+    """
+    url = database_url(url)
+    engine = create_engine(url, **engine_options(url))
+    configure_sqlite(engine)
+    return engine
+
+
+def backfill_normalized_names(engine: Engine, verify: bool = False) -> int:
+    """
+    Preenche nomeRuaNormalizado das ruas gravadas sem ele (bancos antigos, inserções e
+    renomeações por fora da API); com verify, confere também os valores já gravados
+    (renomeações anteriores ao trigger). Retorna quantas ruas foram atualizadas.
+    """
+    table = RotaSegura.__table__
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam('_id'))
+        .values(nomeRuaNormalizado=bindparam('_normalized'))
+    )
+    updated = 0
+    after = None
+    while True:
+        with engine.begin() as connection:
+            query = select(table.c.id, table.c.nomeRua, table.c.nomeRuaNormalizado).order_by(table.c.id)
+            if not verify:
+                query = query.where(table.c.nomeRuaNormalizado.is_(None))
+            if after is not None:
+                query = query.where(table.c.id > after)
+            rows = connection.execute(query.limit(BACKFILL_CHUNK)).all()
+            if not rows:
+                return updated
+            after = rows[-1][0]
+            changes = [
+                {'_id': row_id, '_normalized': normalized}
+                for row_id, name, stored in rows
+                for normalized in (normalize_street_name(name),)
+                if stored != normalized
+            ]
+            if changes:
+                connection.execute(statement, changes)
+        updated += len(changes)
+
+
+def ensure_street_name_index(engine: Engine) -> Optional[int]:
+    """
+    Garante a coluna nomeRuaNormalizado (com índice; trigram no PostgreSQL), o índice de
+    nomeRua e o trigger que anula o valor ao renomear, em bancos criados antes deles, e
+    preenche ou corrige os valores gravados. Retorna quantas ruas foram atualizadas, ou
+    None se a tabela não existir.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table(RotaSegura.__tablename__):
+        return None
+    table = RotaSegura.__table__
+    columns = {column['name'] for column in inspector.get_columns(table.name)}
+    if 'nomeRuaNormalizado' not in columns:
+        with engine.begin() as connection:
+            connection.execute(text('ALTER TABLE "RotaSegura" ADD COLUMN "nomeRuaNormalizado" TEXT'))
+        logger.info("Coluna nomeRuaNormalizado criada")
+    for index in table.indexes:
+        index.create(engine, checkfirst=True)
+
+    if engine.dialect.name == 'postgresql':
+        # busca por trecho do nome (LIKE '%termo%') usa o índice trigram; requer pg_trgm
+        try:
+            with engine.begin() as connection:
+                connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+                connection.execute(text(
+                    'CREATE INDEX IF NOT EXISTS "RotaSegura_nomeRuaNormalizado_trgm_idx" '
+                    'ON "RotaSegura" USING GIN ("nomeRuaNormalizado" gin_trgm_ops)'
+                ))
+        except SQLAlchemyError as e:
+            logger.warning("Índice trigram indisponível (extensão pg_trgm): %s", e)
+
+    statements = NAME_TRIGGERS.get(engine.dialect.name, [])
+    try:
+        with engine.begin() as connection:
+            for statement in statements:
+                connection.execute(text(statement))
+    except SQLAlchemyError as e:
+        logger.warning("Trigger de nomeRuaNormalizado indisponível: %s", e)
+
+    updated = backfill_normalized_names(engine, verify=True)
+    if updated:
+        logger.info("Nomes normalizados preenchidos", extra={'streets': updated})
+    return updated
@@ -0,0 +1,196 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time as _time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from src.services.metrics import CACHE_EVENTS
+from src.services.text_utils import normalize_street_name
+from src.services.ttl_cache import MISSING, TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class GeocodingCache:
+    """
+    Cache de geocoding em dois níveis: LRU limitado em memória + tabela SQLite em disco.
+    Resultados negativos (endereço não encontrado) também são cacheados, com TTL menor.
+    """
+
+    def __init__(self, path: str = None, max_entries: int = None, ttl: float = None,
+                 negative_ttl: float = None, reverse_precision: int = None):
+        self.path = path if path is not None else os.getenv('GEOCODING_CACHE_PATH', '/tmp/geocoding_cache.sqlite3')
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('GEOCODING_CACHE_SIZE', '10000'))
+        self.ttl = ttl if ttl is not None else float(os.getenv('GEOCODING_CACHE_TTL', str(30 * 24 * 3600)))
+        self.negative_ttl = negative_ttl if negative_ttl is not None else float(os.getenv('GEOCODING_CACHE_NEGATIVE_TTL', '3600'))
+        self.reverse_precision = reverse_precision if reverse_precision is not None else int(os.getenv('GEOCODING_REVERSE_PRECISION', '4'))
+
+        self._memory = TTLCache(self.max_entries, self.ttl)
+        # protege só os contadores; o SQLite é acessado fora dele, cada conexão por uma thread de cada vez
+        self._lock = threading.Lock()
+        # conexões livres; conexões a mais que isso são fechadas ao serem devolvidas
+        self._connections: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self.max_connections = int(os.getenv('GEOCODING_CACHE_CONNECTIONS', '8'))
+        self._disk_enabled = bool(self.path)
+        # falha ao abrir o SQLite (disco cheio, arquivo bloqueado...): só a memória é usada até
+        # a próxima tentativa, cujo intervalo dobra a cada falha seguida
+        self.retry_seconds = float(os.getenv('GEOCODING_CACHE_RETRY_SECONDS', '1'))
+        self.max_retry_seconds = float(os.getenv('GEOCODING_CACHE_MAX_RETRY_SECONDS', '300'))
+        self._disk_failures = 0
+        self._disk_retry_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.negative_hits = 0
+
+    def forward_key(self, address: str, city: str) -> str:
+        """
+        Chave normalizada para (endereço, cidade)
+        """
+        return f"forward:{normalize_street_name(address)}|{normalize_street_name(city)}"
+
+    def reverse_key(self, lat: float, lng: float) -> str:
+        """
+        Chave para reverse geocoding com coordenadas arredondadas
+        """
+        precision = self.reverse_precision
+        return f"reverse:{lat:.{precision}f},{lng:.{precision}f}"
+
+    def _open_connection(self) -> Optional[sqlite3.Connection]:
+        if not self._disk_enabled or _time.monotonic() < self._disk_retry_at:
+            return None
+        connection = None
+        try:
+            connection = sqlite3.connect(
+                self.path, check_same_thread=False,
+                timeout=float(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')) / 1000
+            )
+            # WAL: leituras não esperam a gravação de outra thread
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS geocoding_cache ("
+                "key TEXT PRIMARY KEY, value TEXT, expires_at REAL NOT NULL)"
+            )
+            connection.commit()
+        except sqlite3.Error as e:
+            if connection is not None:
+                connection.close()
+            with self._lock:
+                self._disk_failures += 1
+                delay = min(self.retry_seconds * 2 ** min(self._disk_failures - 1, 30), self.max_retry_seconds)
+                self._disk_retry_at = _time.monotonic() + delay
+            logger.warning("Cache de geocoding em disco indisponível, nova tentativa em %.0fs: %s", delay, e)
+            return None
+        with self._lock:
+            self._disk_failures = 0
+        return connection
+
+    @contextmanager
+    def _connection(self) -> Iterator[Optional[sqlite3.Connection]]:
+        """
+        Conexão exclusiva da thread durante o bloco (reaproveitada das livres ou nova)
+        """
+        try:
+            connection = self._connections.get_nowait()
+        except queue.Empty:
+            connection = self._open_connection()
+        try:
+            yield connection
+        finally:
+            if connection is not None:
+                if self._connections.qsize() < self.max_connections:
+                    self._connections.put(connection)
+                else:
+                    connection.close()
+
+    def get(self, key: str) -> Any:
+        """
+        Retorna o valor cacheado (pode ser None para resultados negativos) ou MISSING
+        """
+        value = self._memory.get(key)
+        if value is not MISSING:
+            self._record_hit(value)
+            return value
+
+        row = None
+        with self._connection() as connection:
+            if connection is not None:
+                try:
+                    row = connection.execute(
+                        "SELECT value, expires_at FROM geocoding_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.warning("Erro ao ler cache de geocoding: %s", e)
+        if row is not None and row[1] > _time.time():
+            value = json.loads(row[0])
+            self._memory.set(key, value, expires_at=row[1])
+            with self._lock:
+                self.disk_hits += 1
+            self._record_hit(value)
+            return value
+
+        with self._lock:
+            self.misses += 1
+        CACHE_EVENTS.inc(cache='geocoding', result='miss')
+        return MISSING
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Armazena o valor nos dois níveis; None é cacheado como resultado negativo
+        """
+        ttl = self.negative_ttl if value is None else self.ttl
+        expires_at = _time.time() + ttl
+        self._memory.set(key, value, expires_at=expires_at)
+        with self._connection() as connection:
+            if connection is not None:
+                try:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO geocoding_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                        (key, json.dumps(value), expires_at)
+                    )
+                    connection.commit()
+                except sqlite3.Error as e:
+                    connection.rollback()
+                    logger.warning("Erro ao gravar cache de geocoding: %s", e)
+
+    def purge_expired(self) -> int:
+        """
+        Remove entradas expiradas do disco; retorna quantas foram removidas
+        """
+        with self._connection() as connection:
+            if connection is None:
+                return 0
+            cursor = connection.execute("DELETE FROM geocoding_cache WHERE expires_at <= ?", (_time.time(),))
+            connection.commit()
+            return cursor.rowcount
+
+    def stats(self) -> Dict:
+        """
+        Contadores de acertos/falhas do cache
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'disk_hits': self.disk_hits,
+                'negative_hits': self.negative_hits,
+                'memory_entries': len(self._memory),
+                'disk_enabled': self._disk_enabled,
+                'disk_failures': self._disk_failures
+            }
+
+    def _record_hit(self, value: Any) -> None:
+        with self._lock:
+            self.hits += 1
+            if value is None:
+                self.negative_hits += 1
+        CACHE_EVENTS.inc(cache='geocoding', result='hit')
+
+
+# Instância global do cache de geocoding
+geocoding_cache = GeocodingCache()
@@ -0,0 +1,442 @@
+import atexit
+import logging
+import math
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+from scipy import ndimage
+
+from src.services.danger_index import DangerSnapshot, StreetDangerIndex, danger_index
+from src.services.metrics import CACHE_EVENTS, PHASE_SECONDS
+from src.services.segment_index import SegmentSnapshot, SegmentSpatialIndex, densify_segments, segment_index
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+MAX_MERCATOR_LAT = 85.05112878
+
+# Rampa de cores do índice de periculosidade (0 a 10): verde, amarelo, laranja, vermelho
+COLOR_STOPS = np.array([0.0, 3.0, 6.0, 10.0])
+COLOR_RGB = np.array([[46, 204, 113], [241, 196, 15], [230, 126, 34], [192, 57, 43]], dtype=float)
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """
+    Limites (south, west, north, east) do tile XYZ (Web Mercator)
+    """
+    n = 2 ** z
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return south, west, north, east
+
+
+def mercator_pixels(lat: np.ndarray, lng: np.ndarray, z: int) -> np.ndarray:
+    """
+    Coordenadas globais em pixels (x, y) no zoom `z`
+    """
+    size = TILE_SIZE * 2 ** z
+    sin_lat = np.sin(np.radians(np.clip(lat, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT)))
+    px = (np.asarray(lng, dtype=float) + 180.0) / 360.0 * size
+    py = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * size
+    return np.column_stack((px, py))
+
+
+def encode_png(rgba: np.ndarray, level: int = 6) -> bytes:
+    """
+    Codifica uma imagem RGBA (uint8, altura x largura x 4) em PNG, sem dependências externas
+    """
+    height, width, _ = rgba.shape
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)  # byte de filtro 0 no início de cada linha
+    raw[:, 1:] = rgba.reshape(height, -1)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(raw.tobytes(), level)) + chunk(b'IEND', b''))
+
+
+def colorize(value: np.ndarray, coverage: np.ndarray, max_alpha: float = 200.0) -> np.ndarray:
+    """
+    Índice (0-10) e cobertura (0-1) por pixel -> RGBA; a opacidade cresce com o índice
+    """
+    rgba = np.zeros(value.shape + (4,), dtype=np.uint8)
+    for channel in range(3):
+        rgba[..., channel] = np.interp(value, COLOR_STOPS, COLOR_RGB[:, channel]).astype(np.uint8)
+    alpha = np.clip(coverage, 0.0, 1.0) * (0.35 + 0.65 * np.clip(value / 10.0, 0.0, 1.0)) * max_alpha
+    rgba[..., 3] = alpha.astype(np.uint8)
+    return rgba
+
+
+EMPTY_TILE = encode_png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+
+
+class Tile(NamedTuple):
+    data: bytes
+    etag: str
+
+    @classmethod
+    def of(cls, data: bytes) -> 'Tile':
+        return cls(data, f'{zlib.crc32(data):08x}-{len(data)}')
+
+
+class TileRenderer:
+    """
+    Rasteriza os trechos das ruas de um tile com o índice ajustado ao horário:
+    cada trecho é amostrado a cada pixel, o maior índice de cada pixel fica na grade
+    (np.maximum.at) e a linha é engrossada e suavizada com filtros do scipy.ndimage
+    """
+
+    def __init__(self, line_width: int = None, blur: float = None):
+        self.line_width = line_width if line_width is not None else int(os.getenv('TILE_LINE_WIDTH_PX', '3'))
+        self.blur = blur if blur is not None else float(os.getenv('TILE_BLUR_PX', '1.5'))
+        # borda renderizada além do tile para que linhas e desfoque não sejam cortados
+        self.pad = int(math.ceil(self.line_width / 2 + 3 * self.blur)) + 1
+
+    def render(self, segments: SegmentSnapshot, danger: DangerSnapshot, z: int, x: int, y: int, minute: int) -> bytes:
+        south, west, north, east = tile_bounds(z, x, y)
+        meters_per_pixel = 156543.03392 * math.cos(math.radians((south + north) / 2)) / 2 ** z
+        selected = segments.segments_in_bbox(
+            south, west, north, east, margin=segments.sample_spacing + self.pad * meters_per_pixel
+        )
+        if selected.size == 0:
+            return EMPTY_TILE
+
+        positions = danger.positions_for_ids(segments.segment_street_id[selected])
+        values = np.where(positions >= 0, danger.current_indices(positions, minute), 0.0)
+        keep = values > 0
+        if not keep.any():
+            return EMPTY_TILE
+        coordinates = segments.coordinates[selected[keep]]
+        values = values[keep]
+
+        origin = np.array([x * TILE_SIZE - self.pad, y * TILE_SIZE - self.pad], dtype=float)
+        start = mercator_pixels(coordinates[:, 0], coordinates[:, 1], z) - origin
+        end = mercator_pixels(coordinates[:, 2], coordinates[:, 3], z) - origin
+        points, owner = densify_segments(start, end, 1.0)
+
+        size = TILE_SIZE + 2 * self.pad
+        col = np.floor(points[:, 0]).astype(np.int64)
+        row = np.floor(points[:, 1]).astype(np.int64)
+        inside = (col >= 0) & (col < size) & (row >= 0) & (row < size)
+        grid = np.zeros(size * size)
+        np.maximum.at(grid, row[inside] * size + col[inside], values[owner[inside]])
+        grid = grid.reshape(size, size)
+
+        lines = ndimage.grey_dilation(grid, size=(self.line_width, self.line_width)) if self.line_width > 1 else grid
+        coverage = (lines > 0).astype(float)
+        if self.blur > 0:
+            coverage = ndimage.gaussian_filter(coverage, self.blur)
+        spread = self.line_width + 2 * int(round(self.blur))
+        value = ndimage.grey_dilation(grid, size=(spread, spread)) if spread > 1 else grid
+
+        crop = (slice(self.pad, self.pad + TILE_SIZE), slice(self.pad, self.pad + TILE_SIZE))
+        return encode_png(colorize(value[crop], coverage[crop]))
+
+
+class TileCache:
+    """
+    Cache de tiles LRU limitado em bytes na memória; o que sai da memória vai para
+    um diretório temporário no disco (também limitado) e volta à memória ao ser lido
+    """
+
+    def __init__(self, max_bytes: int = None, directory: str = None, disk_max_bytes: int = None):
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv('TILE_CACHE_MAX_BYTES', str(64 << 20)))
+        self.disk_max_bytes = disk_max_bytes if disk_max_bytes is not None else int(
+            os.getenv('TILE_DISK_CACHE_MAX_BYTES', str(512 << 20))
+        )
+        base = directory or os.getenv('TILE_DISK_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'rota_segura_tiles'))
+        os.makedirs(base, exist_ok=True)
+        # diretório próprio do processo: tiles de outra execução podem estar desatualizados
+        self.directory = tempfile.mkdtemp(prefix='tiles-', dir=base)
+        atexit.register(shutil.rmtree, self.directory, True)
+
+        self._memory: "OrderedDict[Tuple, Tile]" = OrderedDict()
+        self._disk: "OrderedDict[Tuple, int]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.spills = 0
+        self.invalidations = 0
+
+    def _path(self, key: Tuple) -> str:
+        return os.path.join(self.directory, '_'.join(str(part) for part in key) + '.png')
+
+    def get(self, key: Tuple) -> Tuple[Optional[Tile], str]:
+        """
+        (tile, origem) com origem 'hit' (memória), 'disk_hit' ou 'miss'
+        """
+        with self._lock:
+            tile = self._memory.get(key)
+            if tile is not None:
+                self._memory.move_to_end(key)
+                return tile, 'hit'
+            size = self._disk.pop(key, None)
+            if size is None:
+                return None, 'miss'
+            self._disk_bytes -= size
+            path = self._path(key)
+            try:
+                with open(path, 'rb') as f:
+                    tile = Tile.of(f.read())
+                os.remove(path)
+            except OSError:
+                return None, 'miss'
+            self._store_locked(key, tile)
+            return tile, 'disk_hit'
+
+    def put(self, key: Tuple, tile: Tile) -> None:
+        with self._lock:
+            self._store_locked(key, tile)
+
+    def _store_locked(self, key: Tuple, tile: Tile) -> None:
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous.data)
+        self._memory[key] = tile
+        self._memory_bytes += len(tile.data)
+        # a escrita em disco acontece com o lock: tiles são pequenos e assim uma
+        # invalidação concorrente nunca deixa um tile antigo para trás
+        while self._memory_bytes > self.max_bytes and len(self._memory) > 1:
+            old_key, old_tile = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old_tile.data)
+            self._spill_locked(old_key, old_tile)
+
+    def _spill_locked(self, key: Tuple, tile: Tile) -> None:
+        if self.disk_max_bytes <= 0:
+            return
+        try:
+            with open(self._path(key), 'wb') as f:
+                f.write(tile.data)
+        except OSError as e:
+            logger.warning("Falha ao gravar tile em disco: %s", e)
+            return
+        self._disk[key] = len(tile.data)
+        self._disk_bytes += len(tile.data)
+        self.spills += 1
+        while self._disk_bytes > self.disk_max_bytes and self._disk:
+            old_key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self._remove_file(old_key)
+
+    def _remove_file(self, key: Tuple) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def invalidate_regions(self, bboxes: np.ndarray, margin_tiles: float = 0.0, chunk: int = 256) -> int:
+        """
+        Remove (memória e disco) os tiles, de qualquer faixa de horário, que cruzam algum
+        dos retângulos (south, west, north, east); retorna quantos foram removidos
+        """
+        bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 4)
+        if bboxes.size == 0:
+            return 0
+        with self._lock:
+            keys = list(self._memory) + list(self._disk)
+            by_zoom: Dict[int, list] = {}
+            for key in keys:
+                by_zoom.setdefault(key[0], []).append(key)
+
+            removed = []
+            for z, zoom_keys in by_zoom.items():
+                corners_low = mercator_pixels(bboxes[:, 2], bboxes[:, 1], z) / TILE_SIZE - margin_tiles
+                corners_high = mercator_pixels(bboxes[:, 0], bboxes[:, 3], z) / TILE_SIZE + margin_tiles
+                tiles = np.array([key[1:3] for key in zoom_keys], dtype=float)
+                hit = np.zeros(len(zoom_keys), dtype=bool)
+                for begin in range(0, len(bboxes), chunk):
+                    low = corners_low[begin:begin + chunk]
+                    high = corners_high[begin:begin + chunk]
+                    # o tile [x, x+1) x [y, y+1) cruza o retângulo [low, high]
+                    hit |= ((tiles[:, None, 0] <= high[None, :, 0]) & (tiles[:, None, 0] + 1 >= low[None, :, 0])
+                            & (tiles[:, None, 1] <= high[None, :, 1]) & (tiles[:, None, 1] + 1 >= low[None, :, 1])
+                            ).any(axis=1)
+                removed.extend(key for key, flag in zip(zoom_keys, hit.tolist()) if flag)
+
+            for key in removed:
+                self._discard_locked(key)
+            self.invalidations += len(removed)
+            return len(removed)
+
+    def _discard_locked(self, key: Tuple) -> None:
+        tile = self._memory.pop(key, None)
+        if tile is not None:
+            self._memory_bytes -= len(tile.data)
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+            self._remove_file(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._disk):
+                self._remove_file(key)
+            self._memory.clear()
+            self._disk.clear()
+            self._memory_bytes = 0
+            self._disk_bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_bytes,
+                'spills': self.spills,
+                'invalidations': self.invalidations
+            }
+
+
+# multiplicadores ímpares de 64 bits para combinar os campos de um trecho em um hash
+HASH_MULTIPLIERS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9,
+                             0x85EBCA77C2B2AE63, 0x27D4EB2F165667C5], dtype=np.uint64)
+
+
+def segment_hashes(segments: SegmentSnapshot) -> np.ndarray:
+    """
+    Hash de 64 bits por trecho (id da rua e coordenadas): compara snapshots sem ordenar linhas
+    """
+    rows = np.column_stack((segments.segment_street_id.astype(float), segments.coordinates))
+    bits = np.ascontiguousarray(rows).view(np.uint64)
+    # ^ (bits >> 29): sem isso, bits iguais nas partes baixas dos floats dominariam o produto
+    return ((bits ^ (bits >> np.uint64(29))) * HASH_MULTIPLIERS).sum(axis=1, dtype=np.uint64)
+
+
+def changed_regions(old_danger: DangerSnapshot, old_segments: SegmentSnapshot,
+                    new_danger: DangerSnapshot, new_segments: SegmentSnapshot) -> np.ndarray:
+    """
+    Retângulos (south, west, north, east) dos trechos, antigos e novos, das ruas cuja
+    geometria, índice ou período mudou entre os dois pares de snapshots
+    """
+    # ruas com índice/período diferente, incluídas ou removidas
+    common, old_at, new_at = np.intersect1d(old_danger.ids, new_danger.ids, assume_unique=True, return_indices=True)
+    differs = ((old_danger.base_index[old_at] != new_danger.base_index[new_at])
+               | (old_danger.start_minute[old_at] != new_danger.start_minute[new_at])
+               | (old_danger.end_minute[old_at] != new_danger.end_minute[new_at]))
+    changed = np.union1d(common[differs], np.setxor1d(old_danger.ids, new_danger.ids, assume_unique=True))
+
+    # trechos que só existem em um dos snapshots (geometria incluída, alterada ou removida)
+    if new_segments is not old_segments:
+        old_hashes = segment_hashes(old_segments)
+        new_hashes = segment_hashes(new_segments)
+        changed = np.union1d(changed, np.concatenate((
+            old_segments.segment_street_id[~np.isin(old_hashes, new_hashes)],
+            new_segments.segment_street_id[~np.isin(new_hashes, old_hashes)]
+        )))
+
+    affected = np.concatenate((
+        old_segments.coordinates[np.isin(old_segments.segment_street_id, changed)],
+        new_segments.coordinates[np.isin(new_segments.segment_street_id, changed)]
+    ))
+    return np.column_stack((
+        np.minimum(affected[:, 0], affected[:, 2]), np.minimum(affected[:, 1], affected[:, 3]),
+        np.maximum(affected[:, 0], affected[:, 2]), np.maximum(affected[:, 1], affected[:, 3])
+    ))
+
+
+class HeatmapTileService:
+    """
+    Tiles do mapa de calor de periculosidade por (tile, faixa de horário).
+    Quando os snapshots dos índices mudam, só os tiles que cruzam as ruas alteradas são descartados.
+    """
+
+    def __init__(self, index: StreetDangerIndex = None, segments: SegmentSpatialIndex = None,
+                 cache: TileCache = None, renderer: TileRenderer = None, bucket_minutes: int = None,
+                 max_invalidation_regions: int = None):
+        self.index = index if index is not None else danger_index
+        self.segments = segments if segments is not None else segment_index
+        self.renderer = renderer if renderer is not None else TileRenderer()
+        self.bucket_minutes = bucket_minutes if bucket_minutes is not None else int(
+            os.getenv('TILE_TIME_BUCKET_MINUTES', '15')
+        )
+        # acima disso (ex.: recarga completa da tabela) é mais barato descartar tudo
+        self.max_invalidation_regions = max_invalidation_regions if max_invalidation_regions is not None else int(
+            os.getenv('TILE_MAX_INVALIDATION_REGIONS', '20000')
+        )
+        self._cache = cache
+        # (danger, segments, geração) publicados juntos em uma única atribuição
+        self._seen: Tuple = (None, None, 0)
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self) -> TileCache:
+        # criado sob demanda: o diretório em disco só existe se algum tile for pedido
+        if self._cache is None:
+            with self._lock:
+                if self._cache is None:
+                    self._cache = TileCache()
+        return self._cache
+
+    def bucket(self, minute: int) -> int:
+        return minute // self.bucket_minutes * self.bucket_minutes
+
+    def sync(self) -> Tuple[DangerSnapshot, SegmentSnapshot, int]:
+        """
+        Snapshots atuais dos índices e a geração do cache correspondente a eles. Descarta os
+        tiles afetados se algum snapshot mudou desde a última sincronização.
+        """
+        seen = self._seen
+        if seen[0] is self.index.snapshot() and seen[1] is self.segments.snapshot():
+            return seen
+        with self._lock:
+            # relidos sob o lock: uma thread atrasada nunca sincroniza de volta para snapshots antigos
+            danger, segments = self.index.snapshot(), self.segments.snapshot()
+            old_danger, old_segments, generation = self._seen
+            if old_danger is danger and old_segments is segments:
+                return self._seen
+            cache = self._cache
+            if cache is not None and old_danger is not None:
+                regions = changed_regions(old_danger, old_segments, danger, segments)
+                if len(regions) > self.max_invalidation_regions:
+                    cache.clear()
+                    removed = 'all'
+                else:
+                    removed = cache.invalidate_regions(regions, margin_tiles=self.renderer.pad / TILE_SIZE)
+                logger.info("Tiles invalidados", extra={'regions': len(regions), 'removed': removed})
+            self._seen = (danger, segments, generation + 1)
+            return self._seen
+
+    def tile(self, db_session, z: int, x: int, y: int, minute: int) -> Tuple[Tile, int]:
+        """
+        (tile, início da faixa de horário em minutos) do cache, ou renderizado e cacheado
+        """
+        self.index.ensure_loaded(db_session)
+        self.segments.ensure_loaded(db_session)
+        danger, segments, generation = self.sync()
+
+        bucket = self.bucket(minute)
+        key = (z, x, y, bucket)
+        cache = self.cache
+        tile, source = cache.get(key)
+        CACHE_EVENTS.inc(cache='tiles', result=source)
+        if tile is not None:
+            return tile, bucket
+
+        with PHASE_SECONDS.time(phase='tile_render'):
+            tile = Tile.of(self.renderer.render(segments, danger, z, x, y, bucket))
+        with self._lock:
+            # não guarda um tile renderizado com snapshots que já foram substituídos
+            if self._seen[2] == generation:
+                cache.put(key, tile)
+        return tile, bucket
+
+    def stats(self) -> Dict:
+        stats = self._cache.stats() if self._cache is not None else {}
+        stats['bucket_minutes'] = self.bucket_minutes
+        return stats
+
+
+# Instância global do serviço de tiles
+heatmap_tiles = HeatmapTileService()
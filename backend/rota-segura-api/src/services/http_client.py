@@ -0,0 +1,81 @@
+import os
+import threading
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+from geopy.adapters import RequestsAdapter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# URLs dos serviços externos (podem apontar para instâncias próprias ou stubs locais)
+OSRM_URL = os.getenv('OSRM_URL', 'http://router.project-osrm.org').rstrip('/')
+NOMINATIM_URL = os.getenv('NOMINATIM_URL', 'https://nominatim.openstreetmap.org').rstrip('/')
+
+# Limites do pool de conexões
+HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', '10'))  # hosts distintos mantidos no pool
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '20'))          # conexões keep-alive por host
+HTTP_POOL_BLOCK = os.getenv('HTTP_POOL_BLOCK', 'true').lower() in ('1', 'true', 'yes')
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '2'))
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def build_retry() -> Retry:
+    """
+    Política de retentativas limitada (apenas GET, erros de conexão e 502/503/504)
+    """
+    return Retry(
+        total=HTTP_MAX_RETRIES,
+        connect=HTTP_MAX_RETRIES,
+        read=0,
+        backoff_factor=0.2,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False
+    )
+
+
+def get_http_session() -> requests.Session:
+    """
+    Sessão HTTP compartilhada pelo processo, com pool de conexões e keep-alive por host
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=HTTP_POOL_MAXSIZE,
+                    pool_block=HTTP_POOL_BLOCK,
+                    max_retries=build_retry()
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers['User-Agent'] = 'rota-segura-app'
+                _session = session
+    return _session
+
+
+def nominatim_adapter_factory(proxies, ssl_context) -> RequestsAdapter:
+    """
+    Adapter do geopy com os mesmos limites de pool e retentativas da sessão compartilhada
+    """
+    return RequestsAdapter(
+        proxies=proxies,
+        ssl_context=ssl_context,
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=build_retry(),
+        pool_block=HTTP_POOL_BLOCK
+    )
+
+
+def nominatim_location() -> tuple:
+    """
+    Separa NOMINATIM_URL em (scheme, domain) no formato esperado pelo geopy
+    """
+    parts = urlsplit(NOMINATIM_URL)
+    return parts.scheme or 'https', parts.netloc + parts.path
@@ -0,0 +1,120 @@
+import logging
+import os
+import threading
+import time as _time
+from typing import Dict, List, Tuple
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.services.change_log import changes_after, latest_change_id, oldest_change_id, prune_changes
+from src.services.database import backfill_normalized_names
+from src.services.metrics import INDEX_UPDATES
+
+logger = logging.getLogger(__name__)
+
+
+class IndexWatcher:
+    """
+    Acompanha a tabela RotaSeguraAlteracao e atualiza os índices em memória
+    (periculosidade e espacial) assim que ruas são incluídas, editadas ou removidas,
+    sem esperar a recarga periódica nem reiniciar o processo.
+    """
+
+    def __init__(self, indexes: Dict, interval: float = None, full_reload_ratio: float = None,
+                 keep: int = None, prune_interval: float = None):
+        """
+        indexes: {nome: índice}; cada índice expõe change_id, cursor (ChangeCursor), snapshot(),
+        apply_changes(), reload() e __len__
+        """
+        self.indexes = indexes
+        self.interval = interval if interval is not None else float(os.getenv('DANGER_INDEX_POLL_SECONDS', '2'))
+        # acima desta fração de ruas alteradas, recarregar tudo sai mais barato que mesclar
+        self.full_reload_ratio = full_reload_ratio if full_reload_ratio is not None else float(
+            os.getenv('DANGER_INDEX_FULL_RELOAD_RATIO', '0.2')
+        )
+        self.keep = keep if keep is not None else int(os.getenv('DANGER_CHANGE_LOG_KEEP', '10000'))
+        self.prune_interval = prune_interval if prune_interval is not None else float(
+            os.getenv('DANGER_CHANGE_LOG_PRUNE_SECONDS', '600')
+        )
+        self._pruned_at = _time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _update(self, db_session, name: str, index, oldest: int, changes: List[Tuple[int, int]]) -> bool:
+        if oldest > index.change_id + 1:
+            # alterações já descartadas por prune_changes: não dá para saber quais ruas mudaram
+            kind, change_ids, street_ids = 'full', None, None
+        else:
+            change_ids, street_ids = index.cursor.pending(changes)
+            if not change_ids:
+                return False
+            kind = 'full' if len(street_ids) > self.full_reload_ratio * max(len(index), 1) else 'incremental'
+        started = _time.perf_counter()
+        if kind == 'full':
+            index.reload(db_session)
+        else:
+            index.apply_changes(db_session, street_ids, change_ids)
+        INDEX_UPDATES.inc(index=name, kind=kind)
+        logger.info("Índice atualizado", extra={
+            'index': name, 'kind': kind, 'change_id': index.change_id, 'generation': index.generation,
+            'streets': len(street_ids) if kind == 'incremental' else None,
+            'duration_ms': round((_time.perf_counter() - started) * 1000, 2)
+        })
+        return True
+
+    def poll(self, db_session) -> bool:
+        """
+        Aplica as alterações pendentes; retorna False se o registro de alterações não existir.
+        A recarga completa periódica (refresh_interval) continua independente daqui.
+        """
+        if latest_change_id(db_session) is None:
+            return False
+        # índices ainda não carregados ficam para o warm-up / primeira consulta
+        loaded = {name: index for name, index in self.indexes.items() if index.snapshot() is not None}
+        if loaded:
+            oldest = oldest_change_id(db_session)
+            # relê a janela abaixo de cada cursor: ids confirmados fora de ordem ainda aparecem
+            changes = changes_after(db_session, min(index.cursor.low for index in loaded.values()))
+            updated = [self._update(db_session, name, index, oldest, changes) for name, index in loaded.items()]
+            if any(updated):
+                # ruas renomeadas por fora do ORM ficam com nomeRuaNormalizado NULL (trigger)
+                filled = backfill_normalized_names(db_session.get_bind())
+                if filled:
+                    logger.info("Nomes normalizados preenchidos", extra={'streets': filled})
+
+        if self.keep > 0 and _time.monotonic() - self._pruned_at >= self.prune_interval:
+            self._pruned_at = _time.monotonic()
+            removed = prune_changes(db_session, self.keep)
+            if removed:
+                logger.info("Registro de alterações podado", extra={'removed': removed})
+        return True
+
+    def _run(self, app, session) -> None:
+        available = True
+        while not self._stop.wait(self.interval):
+            with app.app_context():
+                try:
+                    found = self.poll(session)
+                    if found != available:
+                        available = found
+                        if not found:
+                            logger.warning("Registro de alterações indisponível; índices seguem com a recarga periódica")
+                except SQLAlchemyError as e:
+                    logger.warning("Erro ao verificar alterações dos índices: %s", e)
+                except Exception:
+                    logger.exception("Erro ao atualizar os índices")
+                finally:
+                    # sessão própria desta thread (scoped_session): devolve a conexão ao pool
+                    session.remove()
+
+    def start(self, app, session) -> None:
+        """
+        Inicia a verificação em segundo plano; `session` é a scoped_session do Flask-SQLAlchemy
+        """
+        if self._thread is not None or self.interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, args=(app, session), name='index-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,335 @@
+"""
+Motor de rotas local (offline), ponderado pela periculosidade das ruas.
+
+O grafo viário é lido de um arquivo com networkx:
+  - GraphML exportado pelo osmnx (nós com 'x'/'y', arestas com 'length', 'name',
+    'speed_kph' ou 'travel_time');
+  - CSV de arestas com cabeçalho
+    from_lat,from_lng,to_lat,to_lng,length_m,speed_kmh,name,oneway
+
+Depois de carregado, a adjacência fica no formato CSR (indptr/indices, em listas
+Python, lidas escalar a escalar pelo A*) e os atributos das arestas em arrays NumPy.
+"""
+import csv
+import heapq
+import logging
+import math
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+from scipy.spatial import cKDTree
+
+from src.services.danger_index import StreetDangerIndex, danger_index
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371000.0
+DEFAULT_SPEED_KMH = 30.0
+# Faixas de horário com pesos em cache (um array float32 por faixa, do tamanho do número de arestas)
+WEIGHTS_CACHE_BUCKETS = int(os.getenv('LOCAL_ROUTER_WEIGHTS_CACHE', '8'))
+
+
+def _as_float(value, default: float = None) -> Optional[float]:
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _as_name(value) -> str:
+    # osmnx grava listas de nomes como "['Rua A', 'Rua B']"
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else ''
+    value = str(value or '').strip()
+    if value.startswith('[') and value.endswith(']'):
+        value = value[1:-1].split(',')[0].strip().strip('\'"')
+    return value
+
+
+class LocalRoutingEngine:
+    """
+    Grafo viário compacto com A* sobre pesos que combinam tempo de viagem e periculosidade
+    """
+
+    def __init__(self, graph_path: str = None, index: StreetDangerIndex = None,
+                 danger_weight: float = None, time_bucket_minutes: int = None, max_snap_meters: float = None):
+        self.graph_path = graph_path if graph_path is not None else os.getenv('LOCAL_GRAPH_PATH', '')
+        self.index = index if index is not None else danger_index
+        self.danger_weight = danger_weight if danger_weight is not None else float(os.getenv('LOCAL_ROUTER_DANGER_WEIGHT', '1.0'))
+        self.time_bucket_minutes = time_bucket_minutes if time_bucket_minutes is not None else int(os.getenv('LOCAL_ROUTER_TIME_BUCKET_MINUTES', '15'))
+        self.max_snap_meters = max_snap_meters if max_snap_meters is not None else float(os.getenv('LOCAL_ROUTER_MAX_SNAP_METERS', '500'))
+
+        self.loaded = False
+        self._load_lock = threading.Lock()
+        # faixa de horário -> (snapshot usado, pesos); guarda o próprio snapshot (e não id()),
+        # assim um snapshot novo nunca é confundido com um antigo já liberado
+        self._weights_cache: Dict[int, Tuple[object, np.ndarray]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.graph_path)
+
+    # ------------------------------------------------------------------ carga
+
+    def read_graph(self, path: str) -> nx.MultiDiGraph:
+        """
+        Lê o arquivo do grafo para um MultiDiGraph com atributos lat/lng, length, speed e name
+        """
+        if path.lower().endswith('.csv'):
+            graph = nx.MultiDiGraph()
+            with open(path, newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    u = (round(float(row['from_lat']), 7), round(float(row['from_lng']), 7))
+                    v = (round(float(row['to_lat']), 7), round(float(row['to_lng']), 7))
+                    for node in (u, v):
+                        if node not in graph:
+                            graph.add_node(node, lat=node[0], lng=node[1])
+                    attrs = {
+                        'length': _as_float(row.get('length_m')),
+                        'speed': _as_float(row.get('speed_kmh'), DEFAULT_SPEED_KMH),
+                        'name': _as_name(row.get('name'))
+                    }
+                    graph.add_edge(u, v, **attrs)
+                    if str(row.get('oneway', '')).strip().lower() not in ('1', 'true', 'yes'):
+                        graph.add_edge(v, u, **attrs)
+            return graph
+
+        raw = nx.read_graphml(path)
+        graph = nx.MultiDiGraph()
+        for node, data in raw.nodes(data=True):
+            graph.add_node(node, lat=_as_float(data.get('y', data.get('lat'))), lng=_as_float(data.get('x', data.get('lng'))))
+        for u, v, data in raw.edges(data=True):
+            length = _as_float(data.get('length'))
+            speed = _as_float(data.get('speed_kph', data.get('maxspeed')), None)
+            travel_time = _as_float(data.get('travel_time'))
+            if speed is None and travel_time and length:
+                speed = length / travel_time * 3.6
+            graph.add_edge(u, v, length=length, speed=speed or DEFAULT_SPEED_KMH, name=_as_name(data.get('name')))
+            if not raw.is_directed():
+                graph.add_edge(v, u, length=length, speed=speed or DEFAULT_SPEED_KMH, name=_as_name(data.get('name')))
+        return graph
+
+    def load(self, path: str = None) -> None:
+        """
+        Carrega o grafo e o converte para CSR
+        """
+        path = path or self.graph_path
+        graph = self.read_graph(path)
+
+        nodes = list(graph.nodes)
+        node_ids = {node: i for i, node in enumerate(nodes)}
+        node_lat = np.array([graph.nodes[node]['lat'] for node in nodes], dtype=np.float64)
+        node_lng = np.array([graph.nodes[node]['lng'] for node in nodes], dtype=np.float64)
+
+        edges = sorted(
+            ((node_ids[u], node_ids[v], data) for u, v, data in graph.edges(data=True)),
+            key=lambda e: (e[0], e[1])
+        )
+        sources = np.array([e[0] for e in edges], dtype=np.int32)
+        targets = np.array([e[1] for e in edges], dtype=np.int32)
+
+        lengths = np.array([e[2].get('length') if e[2].get('length') is not None else np.nan for e in edges], dtype=np.float64)
+        missing = np.isnan(lengths)
+        if missing.any():
+            lengths[missing] = self._haversine(
+                node_lat[sources[missing]], node_lng[sources[missing]],
+                node_lat[targets[missing]], node_lng[targets[missing]]
+            )
+        speeds = np.array([e[2].get('speed') or DEFAULT_SPEED_KMH for e in edges], dtype=np.float64)
+
+        names = []
+        name_ids = {}
+        edge_names = np.empty(len(edges), dtype=np.int32)
+        for i, edge in enumerate(edges):
+            name = edge[2].get('name') or ''
+            if name not in name_ids:
+                name_ids[name] = len(names)
+                names.append(name)
+            edge_names[i] = name_ids[name]
+
+        # listas Python: o acesso escalar no laço do A* é bem mais rápido que em arrays NumPy
+        self.indptr = np.searchsorted(sources, np.arange(len(nodes) + 1)).tolist()
+        self.indices = targets.tolist()
+        self.node_lat = node_lat.tolist()
+        self.node_lng = node_lng.tolist()
+        self.edge_length = lengths.astype(np.float32)
+        self.edge_time = (lengths / (speeds / 3.6)).astype(np.float32)
+        self.edge_name = edge_names
+        self.names = names
+        self.max_speed_ms = float(speeds.max() / 3.6) if len(speeds) else DEFAULT_SPEED_KMH / 3.6
+
+        # Projeção equirretangular local para busca do nó mais próximo
+        self._lat0 = math.radians(float(node_lat.mean())) if len(nodes) else 0.0
+        self._tree = cKDTree(self._project(node_lat, node_lng))
+        self._weights_cache = {}
+        self.loaded = True
+        logger.info("Grafo local carregado", extra={'nodes': len(nodes), 'edges': len(edges)})
+
+    def ensure_loaded(self) -> bool:
+        if self.loaded:
+            return True
+        if not self.enabled:
+            return False
+        with self._load_lock:
+            if not self.loaded:
+                self.load()
+        return True
+
+    # ------------------------------------------------------------- geometria
+
+    def _project(self, lat, lng) -> np.ndarray:
+        lat = np.radians(np.asarray(lat, dtype=np.float64))
+        lng = np.radians(np.asarray(lng, dtype=np.float64))
+        return np.column_stack([lng * math.cos(self._lat0) * EARTH_RADIUS_M, lat * EARTH_RADIUS_M])
+
+    @staticmethod
+    def _haversine_scalar(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+        lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+        a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+        return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+    @staticmethod
+    def _haversine(lat1, lng1, lat2, lng2):
+        lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+        return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+    def nearest_node(self, coords: Tuple[float, float]) -> Optional[int]:
+        """
+        Nó do grafo mais próximo de (lat, lng), ou None se estiver além do limite de snap
+        """
+        distance, node = self._tree.query(self._project([coords[0]], [coords[1]])[0])
+        if distance > self.max_snap_meters:
+            return None
+        return int(node)
+
+    # ------------------------------------------------------------------ pesos
+
+    def time_bucket(self, minute: int) -> int:
+        """
+        Início do intervalo de horário usado para os pesos (as rotas são cacheadas por intervalo)
+        """
+        return minute - minute % max(1, self.time_bucket_minutes)
+
+    def edge_weights(self, minute: int) -> np.ndarray:
+        """
+        Peso de cada aresta no minuto dado: tempo de viagem * (1 + peso_perigo * índice/10)
+        """
+        snapshot = self.index.snapshot()
+        bucket = self.time_bucket(minute)
+        cached = self._weights_cache.get(bucket)
+        if cached is not None and cached[0] is snapshot:
+            return cached[1]
+
+        if snapshot is None:
+            danger = np.full(len(self.edge_time), 2.0)
+        else:
+            positions = snapshot.lookup_positions(self.names)
+            # ruas sem nome não devem casar com a primeira rua do catálogo
+            positions[[i for i, name in enumerate(self.names) if not name]] = -1
+            danger = snapshot.current_indices(positions, bucket)[self.edge_name]
+
+        weights = (self.edge_time * (1.0 + self.danger_weight * danger / 10.0)).astype(np.float32)
+        # descarta os pesos de snapshots anteriores (e não retém os snapshots em memória)
+        cache = {b: entry for b, entry in self._weights_cache.items() if entry[0] is snapshot}
+        while cache and len(cache) >= WEIGHTS_CACHE_BUCKETS:
+            # a faixa mais antiga sai primeiro (dict preserva a ordem de inserção)
+            del cache[next(iter(cache))]
+        cache[bucket] = (snapshot, weights)
+        self._weights_cache = cache
+        return weights
+
+    # -------------------------------------------------------------------- A*
+
+    def shortest_path(self, source: int, target: int, minute: int) -> Optional[List[int]]:
+        """
+        A* entre dois nós; retorna a lista de índices de arestas do caminho
+        """
+        weights = self.edge_weights(minute)
+        indptr = self.indptr
+        indices = self.indices
+
+        # heurística admissível: distância em linha reta na velocidade máxima (pesos >= tempo de viagem)
+        node_lat = self.node_lat
+        node_lng = self.node_lng
+        target_lat, target_lng = node_lat[target], node_lng[target]
+        inv_speed = 1.0 / self.max_speed_ms
+
+        def heuristic(node: int) -> float:
+            return self._haversine_scalar(node_lat[node], node_lng[node], target_lat, target_lng) * inv_speed
+
+        best = {source: 0.0}
+        came_from: Dict[int, Tuple[int, int]] = {}
+        closed = set()
+        queue = [(heuristic(source), 0.0, source)]
+
+        while queue:
+            _, cost, node = heapq.heappop(queue)
+            if node == target:
+                path = []
+                while node != source:
+                    node, edge = came_from[node]
+                    path.append(edge)
+                path.reverse()
+                return path
+            if node in closed:
+                continue
+            closed.add(node)
+
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbor = indices[edge]
+                if neighbor in closed:
+                    continue
+                new_cost = cost + weights[edge]
+                if new_cost < best.get(neighbor, math.inf):
+                    best[neighbor] = new_cost
+                    came_from[neighbor] = (node, edge)
+                    heapq.heappush(queue, (new_cost + heuristic(neighbor), new_cost, neighbor))
+        return None
+
+    def route(self, start_coords: Tuple[float, float], end_coords: Tuple[float, float], minute: int) -> Optional[Dict]:
+        """
+        Calcula a rota e devolve no mesmo formato de uma rota OSRM (geometry/distance/duration/legs)
+        """
+        if not self.ensure_loaded():
+            return None
+        source = self.nearest_node(start_coords)
+        target = self.nearest_node(end_coords)
+        if source is None or target is None:
+            return None
+
+        path = self.shortest_path(source, target, minute)
+        if path is None:
+            return None
+
+        nodes = [source] + [self.indices[edge] for edge in path]
+        coordinates = [[self.node_lng[n], self.node_lat[n]] for n in nodes]
+
+        # agrupa arestas consecutivas da mesma rua em "steps"
+        steps = []
+        for edge in path:
+            name = self.names[self.edge_name[edge]]
+            if steps and steps[-1]['name'] == name:
+                steps[-1]['distance'] += float(self.edge_length[edge])
+                steps[-1]['duration'] += float(self.edge_time[edge])
+            else:
+                steps.append({'name': name, 'distance': float(self.edge_length[edge]), 'duration': float(self.edge_time[edge])})
+
+        path = np.array(path, dtype=np.int64)
+        distance = float(self.edge_length[path].sum()) if len(path) else 0.0
+        duration = float(self.edge_time[path].sum()) if len(path) else 0.0
+        return {
+            'geometry': {'type': 'LineString', 'coordinates': coordinates},
+            'distance': distance,
+            'duration': duration,
+            'legs': [{'steps': steps, 'distance': distance, 'duration': duration}]
+        }
+
+
+# Instância global do motor local (inativo se LOCAL_GRAPH_PATH não estiver definido)
+local_router = LocalRoutingEngine()
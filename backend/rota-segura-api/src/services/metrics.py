@@ -0,0 +1,213 @@
+import threading
+import time as _time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Limites (em segundos) dos histogramas de latência
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Contador monotônico, opcionalmente com labels
+    """
+
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+            for key, value in sorted(items)
+        ]
+
+
+class Histogram:
+    """
+    Histograma cumulativo no formato do Prometheus (buckets, _sum e _count)
+    """
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # por combinação de labels: [contagem por bucket (+Inf no fim), soma, total]
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels[name] for name in self.labelnames)
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][position] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Mede a duração do bloco `with` (inclusive quando ele levanta exceção)
+        """
+        started = _time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(_time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            return entry[2] if entry is not None else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(entry[0]), entry[1], entry[2]) for key, entry in self._values.items()]
+
+        lines = []
+        for key, counts, total, count in sorted(items):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+# Um coletor devolve (nome, tipo, descrição, [(labels, valor), ...]) no momento da exportação
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+
+class MetricsRegistry:
+    """
+    Registro das métricas da API, exportadas em texto no formato do Prometheus
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._collectors: List[Collector] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Collector) -> None:
+        """
+        Registra uma função chamada a cada exportação (para valores que já são mantidos em outro lugar)
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type_name}')
+            lines.extend(metric.samples())
+
+        for collector in collectors:
+            for name, type_name, documentation, samples in collector():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {type_name}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+# Registro global e métricas compartilhadas pelos serviços
+metrics = MetricsRegistry()
+
+PHASE_SECONDS = metrics.histogram(
+    'rota_segura_phase_seconds',
+    'Duração de cada fase do cálculo de rota',
+    ('phase',)
+)
+CACHE_EVENTS = metrics.counter(
+    'rota_segura_cache_events_total',
+    'Acertos e falhas dos caches',
+    ('cache', 'result')
+)
+UPSTREAM_ERRORS = metrics.counter(
+    'rota_segura_upstream_errors_total',
+    'Erros em serviços externos (Nominatim, OSRM) e no motor de rotas local',
+    ('upstream', 'kind')
+)
+SINGLE_FLIGHT_EVENTS = metrics.counter(
+    'rota_segura_single_flight_total',
+    'Chamadas agrupadas: executadas (leader), que reaproveitaram outra em andamento (shared) ou esgotaram a espera (timeout)',
+    ('flight', 'result')
+)
+INDEX_UPDATES = metrics.counter(
+    'rota_segura_index_updates_total',
+    'Atualizações dos índices em memória (incrementais ou recargas completas)',
+    ('index', 'kind')
+)
+REQUEST_SECONDS = metrics.histogram(
+    'rota_segura_http_request_seconds',
+    'Duração das requisições HTTP por endpoint',
+    ('endpoint', 'method', 'status')
+)
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.services.compiled_forest import CompiledForest
+
+logger = logging.getLogger(__name__)
+
+# Arrays da floresta compilada, salvos um por arquivo .npy para poderem ser mapeados em memória
+FOREST_ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots')
+
+
+def file_checksum(path: str) -> str:
+    """
+    SHA-256 do arquivo
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ModelStore:
+    """
+    Repositório versionado de modelos em disco.
+
+    Cada versão fica em um diretório próprio com manifest.json (checksums, versão do
+    esquema de características, métricas), os arrays da floresta compilada em .npy
+    e o modelo/scaler do sklearn em pickle. O arquivo CURRENT aponta para a versão em uso.
+    Os .npy são abertos com mmap, então vários workers compartilham a mesma cópia no page cache.
+    """
+
+    def __init__(self, directory: str = None, keep: int = None, verify_checksums: bool = None):
+        self.directory = directory if directory is not None else os.getenv('AI_MODEL_DIR', '/tmp/rota_segura_models')
+        self.keep = keep if keep is not None else int(os.getenv('AI_MODEL_KEEP', '3'))
+        if verify_checksums is None:
+            verify_checksums = os.getenv('AI_MODEL_VERIFY_CHECKSUMS', 'true').lower() == 'true'
+        self.verify_checksums = verify_checksums
+
+    @property
+    def current_path(self) -> str:
+        return os.path.join(self.directory, 'CURRENT')
+
+    def current_artifact(self) -> Optional[str]:
+        """
+        Nome da versão em uso, ou None se ainda não houver modelo salvo
+        """
+        try:
+            with open(self.current_path) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def list_artifacts(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name for name in os.listdir(self.directory)
+            if os.path.isfile(os.path.join(self.directory, name, 'manifest.json'))
+        )
+
+    def save(self, model, scaler, compiled: Optional[CompiledForest], schema_version: int,
+             metrics: Dict = None, trained_at: str = None) -> str:
+        """
+        Grava uma nova versão e a publica em CURRENT; retorna o nome da versão
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        artifact = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=self.directory)
+        try:
+            files = ['model.pkl', 'scaler.pkl']
+            with open(os.path.join(staging, 'model.pkl'), 'wb') as f:
+                pickle.dump(model, f)
+            with open(os.path.join(staging, 'scaler.pkl'), 'wb') as f:
+                pickle.dump(scaler, f)
+
+            if compiled is not None:
+                for name in FOREST_ARRAYS:
+                    np.save(os.path.join(staging, f'{name}.npy'), np.ascontiguousarray(getattr(compiled, name)))
+                    files.append(f'{name}.npy')
+
+            manifest = {
+                'artifact': artifact,
+                'schema_version': schema_version,
+                'trained_at': trained_at,
+                'saved_at': datetime.now().isoformat(),
+                'metrics': metrics or {},
+                'compiled': compiled is not None,
+                'max_depth': compiled.max_depth if compiled is not None else None,
+                'checksums': {name: file_checksum(os.path.join(staging, name)) for name in files}
+            }
+            with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+                json.dump(manifest, f, indent=2)
+
+            # o diretório só aparece com o nome final depois de completo
+            os.replace(staging, os.path.join(self.directory, artifact))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        pointer = os.path.join(self.directory, '.CURRENT.tmp')
+        with open(pointer, 'w') as f:
+            f.write(artifact)
+        os.replace(pointer, self.current_path)
+
+        self.prune()
+        return artifact
+
+    def load(self, schema_version: int, artifact: str = None, load_sklearn: bool = True) -> Optional[Dict]:
+        """
+        Carrega a versão em uso (ou a indicada). Retorna None se não existir,
+        se o esquema de características for outro ou se algum checksum não conferir.
+        """
+        artifact = artifact or self.current_artifact()
+        if artifact is None:
+            return None
+        path = os.path.join(self.directory, artifact)
+
+        try:
+            with open(os.path.join(path, 'manifest.json')) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Manifesto do modelo ilegível: %s", e, extra={'artifact': artifact})
+            return None
+
+        if manifest.get('schema_version') != schema_version:
+            logger.warning("Modelo salvo com outro esquema de características", extra={
+                'artifact': artifact, 'schema_version': manifest.get('schema_version'), 'expected': schema_version
+            })
+            return None
+
+        if self.verify_checksums:
+            for name, expected in manifest.get('checksums', {}).items():
+                file_path = os.path.join(path, name)
+                if not os.path.exists(file_path) or file_checksum(file_path) != expected:
+                    logger.warning("Checksum não confere", extra={'artifact': artifact, 'file': name})
+                    return None
+
+        compiled = None
+        if manifest.get('compiled'):
+            arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in FOREST_ARRAYS}
+            compiled = CompiledForest(max_depth=manifest['max_depth'], **arrays)
+
+        with open(os.path.join(path, 'scaler.pkl'), 'rb') as f:
+            scaler = pickle.load(f)
+        model = None
+        if load_sklearn or compiled is None:
+            with open(os.path.join(path, 'model.pkl'), 'rb') as f:
+                model = pickle.load(f)
+
+        return {
+            'artifact': artifact,
+            'model': model,
+            'scaler': scaler,
+            'compiled': compiled,
+            'metrics': manifest.get('metrics', {}),
+            'trained_at': manifest.get('trained_at')
+        }
+
+    def prune(self) -> None:
+        """
+        Remove versões antigas, mantendo as `keep` mais recentes e a que está em uso
+        """
+        current = self.current_artifact()
+        artifacts = self.list_artifacts()
+        for artifact in artifacts[:max(len(artifacts) - self.keep, 0)]:
+            if artifact != current:
+                shutil.rmtree(os.path.join(self.directory, artifact), ignore_errors=True)
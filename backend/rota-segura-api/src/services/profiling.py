@@ -0,0 +1,199 @@
+import cProfile
+import hmac
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time as _time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from flask import Blueprint, Flask, Response, g, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+
+class RequestProfiler:
+    """
+    Profiling opcional de requisições com cProfile.
+
+    Desligado (padrão), nenhum hook é registrado na aplicação: custo zero.
+    Ligado, uma requisição é perfilada quando traz o cabeçalho configurado
+    com o token de admin ou é sorteada pela taxa de amostragem. Sem
+    PROFILING_ADMIN_TOKEN o cabeçalho é ignorado e o endpoint de administração
+    não é registrado: resta só a amostragem.
+    Só uma requisição é perfilada por vez e apenas os últimos perfis são guardados.
+    """
+
+    def __init__(self, enabled: bool = None, sample_rate: float = None, header: str = None,
+                 max_profiles: int = None, top_n: int = None, token: str = None):
+        if enabled is None:
+            enabled = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+        self.enabled = enabled
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+        self.header = header or os.getenv('PROFILING_HEADER', 'X-Profile')
+        self.max_profiles = max_profiles if max_profiles is not None else int(os.getenv('PROFILING_MAX_PROFILES', '50'))
+        self.top_n = top_n if top_n is not None else int(os.getenv('PROFILING_TOP_N', '40'))
+        self.token = token if token is not None else os.getenv('PROFILING_ADMIN_TOKEN', '')
+
+        self._profiles: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        # o cProfile não suporta dois perfis ativos ao mesmo tempo
+        self._active = threading.Lock()
+
+    def install(self, app: Flask, url_prefix: str = '/api/admin/profiles') -> None:
+        """
+        Registra os hooks e o endpoint de administração (apenas se habilitado)
+        """
+        if not self.enabled:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        if self.token:
+            app.register_blueprint(self.blueprint(), url_prefix=url_prefix)
+        else:
+            logger.warning(
+                "PROFILING_ENABLED sem PROFILING_ADMIN_TOKEN: endpoint %s não registrado "
+                "e cabeçalho %s ignorado (apenas amostragem)", url_prefix, self.header
+            )
+        logger.info("Profiling de requisições habilitado", extra={
+            'sample_rate': self.sample_rate, 'header': self.header, 'max_profiles': self.max_profiles
+        })
+
+    def authorized(self, value: Optional[str]) -> bool:
+        # sem token configurado ninguém é autorizado
+        if not self.token or value is None:
+            return False
+        return hmac.compare_digest(value.encode(), self.token.encode())
+
+    def should_profile(self) -> bool:
+        if self.authorized(request.headers.get(self.header)):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _before_request(self):
+        if request.blueprint == 'profiling' or not self.should_profile():
+            return None
+        if not self._active.acquire(blocking=False):
+            return None
+        try:
+            profile = cProfile.Profile()
+            profile.enable()
+        except Exception:
+            # outro profiler já ativo no processo
+            self._active.release()
+            return None
+        g._profile = profile
+        g._profile_started = _time.perf_counter()
+        return None
+
+    def _finish(self) -> Optional[cProfile.Profile]:
+        profile = g.pop('_profile', None)
+        if profile is not None:
+            profile.disable()
+            self._active.release()
+        return profile
+
+    def _after_request(self, response):
+        profile = self._finish()
+        if profile is None:
+            return response
+        elapsed = _time.perf_counter() - g.pop('_profile_started')
+        profile_id = self.store(profile, elapsed, response.status_code)
+        response.headers['X-Profile-Id'] = profile_id
+        return response
+
+    def _teardown_request(self, exc):
+        # se a requisição terminou com exceção, o after_request não roda
+        self._finish()
+
+    def store(self, profile: cProfile.Profile, elapsed: float, status: int) -> str:
+        """
+        Resume o perfil (top funções por tempo acumulado) e guarda, descartando os mais antigos
+        """
+        buffer = io.StringIO()
+        stats = pstats.Stats(profile, stream=buffer)
+        stats.sort_stats('cumulative').print_stats(self.top_n)
+
+        functions = []
+        for (filename, line, name), (primitive_calls, calls, total, cumulative, _) in stats.stats.items():
+            functions.append({
+                'function': f'{filename}:{line}({name})',
+                'calls': calls,
+                'total_seconds': round(total, 6),
+                'cumulative_seconds': round(cumulative, 6)
+            })
+        functions.sort(key=lambda item: item['cumulative_seconds'], reverse=True)
+
+        profile_id = uuid.uuid4().hex[:16]
+        entry = {
+            'id': profile_id,
+            'method': request.method,
+            'path': request.path,
+            'status': status,
+            'duration_ms': round(elapsed * 1000, 2),
+            'timestamp': datetime.now().isoformat(),
+            'functions': functions[:self.top_n],
+            'text': buffer.getvalue()
+        }
+        with self._lock:
+            self._profiles[profile_id] = entry
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+        return profile_id
+
+    def list_profiles(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {key: entry[key] for key in ('id', 'method', 'path', 'status', 'duration_ms', 'timestamp')}
+                for entry in reversed(self._profiles.values())
+            ]
+
+    def get_profile(self, profile_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._profiles.clear()
+
+    def blueprint(self) -> Blueprint:
+        """
+        Endpoints de administração: lista, detalhe (JSON ou texto do pstats) e limpeza
+        """
+        bp = Blueprint('profiling', __name__)
+
+        @bp.before_request
+        def check_token():
+            if not self.authorized(request.headers.get('X-Admin-Token')):
+                return jsonify({'error': 'Não autorizado'}), 401
+            return None
+
+        @bp.route('', methods=['GET'])
+        def list_profiles():
+            return jsonify({'profiles': self.list_profiles()}), 200
+
+        @bp.route('/<profile_id>', methods=['GET'])
+        def get_profile(profile_id):
+            entry = self.get_profile(profile_id)
+            if entry is None:
+                return jsonify({'error': 'Perfil não encontrado'}), 404
+            if request.args.get('format') == 'text':
+                return Response(entry['text'], mimetype='text/plain')
+            return jsonify({key: value for key, value in entry.items() if key != 'text'}), 200
+
+        @bp.route('', methods=['DELETE'])
+        def clear_profiles():
+            self.clear()
+            return jsonify({'message': 'Perfis removidos'}), 200
+
+        return bp
+
+
+# Instância global do profiler
+request_profiler = RequestProfiler()
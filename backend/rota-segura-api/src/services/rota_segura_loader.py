@@ -0,0 +1,318 @@
+import csv
+import json
+import logging
+import os
+import time as _time
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO
+
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.engine import Engine
+
+from src.models.rota_segura import RotaSegura, RotaSeguraSegmento
+from src.services.change_log import install_change_tracking
+from src.services.database import ensure_street_name_index
+from src.services.danger_index import parse_clock_minutes
+from src.services.text_utils import normalize_street_name
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('nomeRua', 'horarioInicio', 'horarioFim', 'indicePericulosidade')
+FORMATS = ('csv', 'ndjson', 'geojson')
+
+
+def detect_format(path: str) -> str:
+    """
+    Formato pelo sufixo do arquivo (.csv, .ndjson/.jsonl/.geojsonl, .geojson/.json)
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.ndjson', '.jsonl', '.geojsonl', '.geojsons'):
+        return 'ndjson'
+    if extension in ('.geojson', '.json'):
+        return 'geojson'
+    raise ValueError(f"Formato não reconhecido para {path}; use csv, ndjson ou geojson")
+
+
+def iter_json_array(f: TextIO, key: str, block_size: int = 1 << 16) -> Iterator[Dict]:
+    """
+    Itera os objetos do array `key` de um JSON grande (ex.: "features" de um
+    FeatureCollection) lendo o arquivo em blocos, sem carregá-lo inteiro
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    marker = f'"{key}"'
+
+    # localizar o início do array
+    while True:
+        position = buffer.find(marker)
+        if position >= 0:
+            bracket = buffer.find('[', position + len(marker))
+            if bracket >= 0:
+                buffer = buffer[bracket + 1:]
+                break
+        block = f.read(block_size)
+        if not block:
+            return
+        buffer += block
+
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            if not buffer:
+                raise ValueError('buffer vazio')
+            item, end = decoder.raw_decode(buffer)
+        except ValueError:
+            block = f.read(block_size)
+            if not block:
+                if buffer:
+                    raise ValueError(f'JSON truncado perto de: {buffer[:80]!r}')
+                return
+            buffer += block
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def feature_to_record(item: Dict) -> Dict:
+    """
+    Aceita tanto um objeto plano quanto um Feature GeoJSON (campos em "properties");
+    a geometria do Feature, se houver, fica em "geometry"
+    """
+    if item.get('type') == 'Feature':
+        record = dict(item.get('properties') or {})
+        if item.get('geometry'):
+            record['geometry'] = item['geometry']
+        return record
+    return item
+
+
+def geometry_segments(geometry) -> List[Dict]:
+    """
+    Trechos (pares de pontos consecutivos) de uma geometria LineString ou MultiLineString;
+    lista vazia para outros tipos ou coordenadas inválidas
+    """
+    if not isinstance(geometry, dict):
+        return []
+    if geometry.get('type') == 'LineString':
+        lines = [geometry.get('coordinates') or []]
+    elif geometry.get('type') == 'MultiLineString':
+        lines = geometry.get('coordinates') or []
+    else:
+        return []
+
+    segments = []
+    try:
+        for line in lines:
+            points = [(float(point[1]), float(point[0])) for point in line]
+            for (lat_start, lng_start), (lat_end, lng_end) in zip(points, points[1:]):
+                segments.append({
+                    'ordem': len(segments),
+                    'latInicio': lat_start,
+                    'lngInicio': lng_start,
+                    'latFim': lat_end,
+                    'lngFim': lng_end
+                })
+    except (TypeError, ValueError, IndexError):
+        return []
+    for segment in segments:
+        if not (-90 <= segment['latInicio'] <= 90 and -90 <= segment['latFim'] <= 90
+                and -180 <= segment['lngInicio'] <= 180 and -180 <= segment['lngFim'] <= 180):
+            return []
+    return segments
+
+
+def iter_records(path: str, file_format: str = None) -> Iterator[Dict]:
+    """
+    Lê o arquivo em streaming e produz um dict por linha/feature
+    """
+    file_format = file_format or detect_format(path)
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        if file_format == 'csv':
+            yield from csv.DictReader(f)
+        elif file_format == 'ndjson':
+            for line in f:
+                line = line.strip().lstrip('\x1e')  # GeoJSON Text Sequences usam RS como separador
+                if line:
+                    yield feature_to_record(json.loads(line))
+        elif file_format == 'geojson':
+            for item in iter_json_array(f, 'features'):
+                yield feature_to_record(item)
+        else:
+            raise ValueError(f"Formato inválido: {file_format}")
+
+
+def clean_record(record: Dict) -> Optional[Dict]:
+    """
+    Valida e normaliza uma linha; retorna None se for inválida
+    """
+    try:
+        name = ' '.join(str(record.get('nomeRua') or '').split())
+        start = str(record.get('horarioInicio') or '').strip()
+        end = str(record.get('horarioFim') or '').strip()
+        danger = float(record.get('indicePericulosidade'))
+    except (TypeError, ValueError):
+        return None
+
+    if not name or len(name) > 255:
+        return None
+    if parse_clock_minutes(start) < 0 or parse_clock_minutes(end) < 0:
+        return None
+    if not 0.0 <= danger <= 10.0:
+        return None
+
+    return {
+        'nomeRua': name,
+        'horarioInicio': start,
+        'horarioFim': end,
+        'indicePericulosidade': danger
+    }
+
+
+def chunked(records: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class RotaSeguraLoader:
+    """
+    Importação em lote para a tabela RotaSegura (SQLite ou PostgreSQL).
+
+    Cada bloco é deduplicado (pelo nome da rua) com uma única consulta IN contra o
+    banco, inserido com executemany e, se `update_existing`, atualiza as ruas já
+    cadastradas por id, tudo em uma transação por bloco. Registros com geometria
+    (LineString/MultiLineString) têm seus trechos gravados em RotaSeguraSegmento,
+    substituindo os anteriores das ruas inseridas ou atualizadas.
+    """
+
+    def __init__(self, engine: Engine, chunk_size: int = None, update_existing: bool = False,
+                 report_every: float = 5.0):
+        self.engine = engine
+        self.chunk_size = chunk_size if chunk_size is not None else int(os.getenv('LOADER_CHUNK_SIZE', '5000'))
+        self.update_existing = update_existing
+        self.report_every = report_every
+        self.table = RotaSegura.__table__
+        self.segment_table = RotaSeguraSegmento.__table__
+
+    def create_table(self) -> None:
+        self.table.create(self.engine, checkfirst=True)
+        self.segment_table.create(self.engine, checkfirst=True)
+        ensure_street_name_index(self.engine)
+        # registro de alterações: as APIs em execução aplicam a importação sem reiniciar
+        install_change_tracking(self.engine)
+
+    def load(self, records: Iterable[Dict]) -> Dict:
+        """
+        Importa os registros e retorna as estatísticas (lidos, inseridos, atualizados, ...)
+        """
+        stats = {'read': 0, 'inserted': 0, 'updated': 0, 'skipped_existing': 0,
+                 'duplicates': 0, 'invalid': 0, 'segments': 0}
+        started = _time.perf_counter()
+        last_report = started
+
+        table = self.table
+        insert_statement = insert(table)
+        # o UPDATE em lote não passa pelo default da coluna: nomeRuaNormalizado vai explícito
+        update_statement = (
+            update(table)
+            .where(table.c.id == bindparam('_id'))
+            .values({field: bindparam(f'_{field}') for field in FIELDS + ('nomeRuaNormalizado',)})
+        )
+
+        for chunk in chunked(records, self.chunk_size):
+            stats['read'] += len(chunk)
+
+            # dedupe dentro do bloco: a última ocorrência de cada rua prevalece
+            rows: Dict[str, Dict] = {}
+            segments: Dict[str, List[Dict]] = {}
+            for record in chunk:
+                row = clean_record(record)
+                if row is None:
+                    stats['invalid'] += 1
+                    continue
+                if row['nomeRua'] in rows:
+                    stats['duplicates'] += 1
+                rows[row['nomeRua']] = row
+                segments.pop(row['nomeRua'], None)
+                record_segments = geometry_segments(record.get('geometry'))
+                if record_segments:
+                    segments[row['nomeRua']] = record_segments
+
+            if not rows:
+                continue
+
+            with self.engine.begin() as connection:
+                # ordem decrescente: com nomes repetidos no banco, vale o menor id
+                existing = dict(connection.execute(
+                    select(table.c.nomeRua, table.c.id)
+                    .where(table.c.nomeRua.in_(list(rows)))
+                    .order_by(table.c.id.desc())
+                ).all())
+
+                new_rows = [row for name, row in rows.items() if name not in existing]
+                if new_rows:
+                    connection.execute(insert_statement, new_rows)
+                    stats['inserted'] += len(new_rows)
+
+                if existing:
+                    if self.update_existing:
+                        connection.execute(
+                            update_statement,
+                            [
+                                dict(
+                                    {f'_{field}': rows[name][field] for field in FIELDS},
+                                    _id=row_id, _nomeRuaNormalizado=normalize_street_name(name)
+                                )
+                                for name, row_id in existing.items()
+                            ]
+                        )
+                        stats['updated'] += len(existing)
+                    else:
+                        stats['skipped_existing'] += len(existing)
+
+                if not self.update_existing:
+                    for name in existing:
+                        segments.pop(name, None)
+                if segments:
+                    stats['segments'] += self.replace_segments(connection, segments)
+
+            now = _time.perf_counter()
+            if self.report_every and now - last_report >= self.report_every:
+                logger.info("Importação em andamento", extra={
+                    'read': stats['read'], 'rows_per_second': round(stats['read'] / (now - started))
+                })
+                last_report = now
+
+        elapsed = _time.perf_counter() - started
+        stats['seconds'] = round(elapsed, 3)
+        stats['rows_per_second'] = round(stats['read'] / elapsed, 1) if elapsed > 0 else None
+        return stats
+
+    def replace_segments(self, connection, segments: Dict[str, List[Dict]]) -> int:
+        """
+        Substitui os trechos das ruas indicadas (pelo nome) e retorna quantos foram gravados
+        """
+        table = self.table
+        ids = dict(connection.execute(
+            select(table.c.nomeRua, table.c.id)
+            .where(table.c.nomeRua.in_(list(segments)))
+            .order_by(table.c.id.desc())
+        ).all())
+        segment_table = self.segment_table
+        connection.execute(delete(segment_table).where(segment_table.c.rotaSeguraId.in_(list(ids.values()))))
+        rows = [
+            dict(segment, rotaSeguraId=ids[name])
+            for name, street_segments in segments.items() if name in ids
+            for segment in street_segments
+        ]
+        if rows:
+            connection.execute(insert(segment_table), rows)
+        return len(rows)
@@ -0,0 +1,58 @@
+import math
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from src.services.metrics import CACHE_EVENTS
+from src.services.ttl_cache import MISSING, TTLCache
+
+METERS_PER_DEGREE_LAT = 111320.0
+
+
+class RouteCache:
+    """
+    Cache de rotas já simplificadas (geometria, distância, duração e nomes das ruas),
+    com origem/destino alinhados a uma grade de alguns metros
+    """
+
+    def __init__(self, grid_meters: float = None, max_entries: int = None, ttl: float = None):
+        self.grid_meters = grid_meters if grid_meters is not None else float(os.getenv('ROUTE_CACHE_GRID_METERS', '25'))
+        max_entries = max_entries if max_entries is not None else int(os.getenv('ROUTE_CACHE_SIZE', '2000'))
+        ttl = ttl if ttl is not None else float(os.getenv('ROUTE_CACHE_TTL', str(6 * 3600)))
+        self._cache = TTLCache(max_entries, ttl)
+
+    def snap(self, coords: Tuple[float, float]) -> Tuple[int, int]:
+        """
+        Converte lat/lng na célula da grade (a largura em longitude é corrigida pela latitude)
+        """
+        lat, lng = coords
+        lat_cell = round(lat * METERS_PER_DEGREE_LAT / self.grid_meters)
+        snapped_lat = lat_cell * self.grid_meters / METERS_PER_DEGREE_LAT
+        meters_per_degree_lng = METERS_PER_DEGREE_LAT * max(math.cos(math.radians(snapped_lat)), 1e-6)
+        lng_cell = round(lng * meters_per_degree_lng / self.grid_meters)
+        return lat_cell, lng_cell
+
+    def key(self, start_coords: Tuple[float, float], end_coords: Tuple[float, float], profile: str) -> Tuple:
+        return (profile, self.snap(start_coords), self.snap(end_coords))
+
+    def get(self, start_coords: Tuple[float, float], end_coords: Tuple[float, float], profile: str) -> Optional[Dict]:
+        """
+        Rota cacheada para origem/destino/perfil, ou None
+        """
+        route = self._cache.get(self.key(start_coords, end_coords, profile))
+        CACHE_EVENTS.inc(cache='route', result='miss' if route is MISSING else 'hit')
+        return None if route is MISSING else route
+
+    def set(self, start_coords: Tuple[float, float], end_coords: Tuple[float, float], profile: str, route: Dict) -> None:
+        self._cache.set(self.key(start_coords, end_coords, profile), route)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._cache.stats()
+        stats['grid_meters'] = self.grid_meters
+        return stats
+
+
+# Instância global do cache de rotas
+route_cache = RouteCache()
@@ -1,91 +1,228 @@
-import requests
+import os
 import json
+import logging
+import time as _time
+import numpy as np
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from geopy.geocoders import Nominatim
 from geopy.distance import geodesic
-import networkx as nx
 from datetime import datetime, time
 from typing import List, Dict, Tuple, Optional
+from src.services.danger_index import StreetDangerIndex, danger_index, parse_clock_minutes
+from src.services.geocoding_cache import GeocodingCache, geocoding_cache
+from src.services.local_router import LocalRoutingEngine, local_router
+from src.services.http_client import OSRM_URL, get_http_session, nominatim_adapter_factory, nominatim_location
+from src.services.metrics import PHASE_SECONDS, UPSTREAM_ERRORS
+from src.services.route_cache import RouteCache, route_cache
+from src.services.segment_index import SegmentSpatialIndex, score_polylines, segment_index
+from src.services.single_flight import SingleFlight, SingleFlightTimeout
+from src.services.text_utils import normalize_street_name
+from src.services.ttl_cache import MISSING
+
+logger = logging.getLogger(__name__)
+
+# Pontuação pela geometria da rota (trechos perigosos próximos, via KD-tree)
+SAFETY_GEOMETRY_SCORING = os.getenv('SAFETY_GEOMETRY_SCORING', 'true').lower() == 'true'
+SEGMENT_SEARCH_RADIUS_METERS = float(os.getenv('SEGMENT_SEARCH_RADIUS_METERS', '40'))
+SEGMENT_NEIGHBORS = int(os.getenv('SEGMENT_NEIGHBORS', '4'))
+ROUTE_SAMPLE_METERS = float(os.getenv('ROUTE_SAMPLE_METERS', '20'))
+
+# Espera máxima por uma chamada idêntica já em andamento (geocoding, OSRM, rota completa)
+GEOCODING_FLIGHT_TIMEOUT_SECONDS = float(os.getenv('GEOCODING_FLIGHT_TIMEOUT_SECONDS', '12'))
+OSRM_FLIGHT_TIMEOUT_SECONDS = float(os.getenv('OSRM_FLIGHT_TIMEOUT_SECONDS', '10'))
+ROUTE_FLIGHT_TIMEOUT_SECONDS = float(os.getenv('ROUTE_FLIGHT_TIMEOUT_SECONDS', '20'))
 
 class GeocodingService:
-    def __init__(self):
-        self.geolocator = Nominatim(user_agent="rota-segura-app")
-    
+    def __init__(self, cache: GeocodingCache = None):
+        scheme, domain = nominatim_location()
+        self.geolocator = Nominatim(
+            user_agent="rota-segura-app",
+            scheme=scheme,
+            domain=domain,
+            adapter_factory=nominatim_adapter_factory
+        )
+        self.cache = cache if cache is not None else geocoding_cache
+        # endereços iguais pedidos ao mesmo tempo geram uma única consulta ao Nominatim
+        self.flights = SingleFlight('geocoding', timeout=GEOCODING_FLIGHT_TIMEOUT_SECONDS)
+
+    def _shared(self, cache_key: str, function, *args):
+        try:
+            return self.flights.do(cache_key, function, *args)
+        except SingleFlightTimeout:
+            UPSTREAM_ERRORS.inc(upstream='nominatim', kind='flight_timeout')
+            logger.warning("Geocoding em andamento não terminou a tempo", extra={'key': cache_key})
+            return None
+
     def geocode_address(self, address: str, city: str = "Campinas, SP") -> Optional[Tuple[float, float]]:
         """
         Converte um endereço em coordenadas lat/lng
         """
+        cache_key = self.cache.forward_key(address, city)
+        cached = self.cache.get(cache_key)
+        if cached is not MISSING:
+            logger.debug("Geocoding em cache", extra={'address': address, 'city': city})
+            return tuple(cached) if cached is not None else None
+        return self._shared(cache_key, self._geocode, address, city, cache_key)
+
+    def _geocode(self, address: str, city: str, cache_key: str) -> Optional[Tuple[float, float]]:
         try:
-            print(f"🔍 Geocoding: {address}, {city}")
             full_address = f"{address}, {city}, Brasil"
-            print(f"📍 Endereço completo: {full_address}")
             
             location = self.geolocator.geocode(full_address, timeout=3)  # Reduzido de 5 para 3
             if location:
                 coords = (location.latitude, location.longitude)
-                print(f"✅ Geocoding sucesso: {coords}")
+                logger.debug("Geocoding sucesso", extra={'address': full_address, 'coords': coords})
+                self.cache.set(cache_key, list(coords))
                 return coords
             else:
-                print(f"❌ Geocoding falhou para: {full_address}")
+                logger.info("Endereço não encontrado", extra={'address': full_address})
+                self.cache.set(cache_key, None)
                 return None
         except Exception as e:
-            print(f"❌ Erro no geocoding: {e}")
+            # erros de rede não são cacheados, apenas endereços inexistentes
+            UPSTREAM_ERRORS.inc(upstream='nominatim', kind=type(e).__name__)
+            logger.warning("Erro no geocoding: %s", e, extra={'address': address})
             return None
     
     def reverse_geocode(self, lat: float, lng: float) -> Optional[str]:
         """
         Converte coordenadas em endereço
         """
+        cache_key = self.cache.reverse_key(lat, lng)
+        cached = self.cache.get(cache_key)
+        if cached is not MISSING:
+            return cached
+        return self._shared(cache_key, self._reverse_geocode, lat, lng, cache_key)
+
+    def _reverse_geocode(self, lat: float, lng: float, cache_key: str) -> Optional[str]:
         try:
             location = self.geolocator.reverse((lat, lng), timeout=10)
-            if location:
-                return location.address
-            return None
+            address = location.address if location else None
+            self.cache.set(cache_key, address)
+            return address
         except Exception as e:
-            print(f"Erro no reverse geocoding: {e}")
+            UPSTREAM_ERRORS.inc(upstream='nominatim', kind=type(e).__name__)
+            logger.warning("Erro no reverse geocoding: %s", e)
             return None
 
+# Pool compartilhado para geocoding concorrente de origem/destino
+_geocoding_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('GEOCODING_WORKERS', '8')),
+    thread_name_prefix='geocoding'
+)
+
+def _timed_geocode(geocoding: GeocodingService, address: str, phase: str) -> Optional[Tuple[float, float]]:
+    with PHASE_SECONDS.time(phase=phase):
+        return geocoding.geocode_address(address)
+
 class RoutingService:
-    def __init__(self):
+    def __init__(self, geocoding_deadline: float = None, osrm_url: str = None, cache: RouteCache = None,
+                 local_engine: LocalRoutingEngine = None):
         self.geocoding = GeocodingService()
+        self.route_cache = cache if cache is not None else route_cache
+        self.local_router = local_engine if local_engine is not None else local_router
+        self.osrm_url = (osrm_url or OSRM_URL).rstrip('/')
+        self.http = get_http_session()
+        self.osrm_flights = SingleFlight('osrm', timeout=OSRM_FLIGHT_TIMEOUT_SECONDS)
+        self.route_flights = SingleFlight('route', timeout=ROUTE_FLIGHT_TIMEOUT_SECONDS)
+        if geocoding_deadline is None:
+            geocoding_deadline = float(os.getenv('GEOCODING_DEADLINE_SECONDS', '6'))
+        self.geocoding_deadline = geocoding_deadline
+
+    def geocode_endpoints(self, start_address: str, end_address: str) -> Tuple[Optional[Tuple[float, float]], Optional[Tuple[float, float]]]:
+        """
+        Faz o geocoding de origem e destino em paralelo, com um prazo total compartilhado.
+        Se um dos dois falhar (ou o prazo estourar), o outro é cancelado e não é aguardado.
+        """
+        deadline = _time.monotonic() + self.geocoding_deadline
+        futures = {
+            _geocoding_executor.submit(_timed_geocode, self.geocoding, start_address, 'geocode_origin'): 'start',
+            _geocoding_executor.submit(_timed_geocode, self.geocoding, end_address, 'geocode_destination'): 'end'
+        }
+        results = {'start': None, 'end': None}
+        pending = set(futures)
+
+        while pending:
+            remaining = deadline - _time.monotonic()
+            if remaining <= 0:
+                UPSTREAM_ERRORS.inc(upstream='nominatim', kind='deadline')
+                logger.warning("Prazo de geocoding esgotado", extra={'deadline_seconds': self.geocoding_deadline})
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            failed = False
+            for future in done:
+                try:
+                    coords = future.result()
+                except Exception as e:
+                    logger.warning("Erro no geocoding: %s", e)
+                    coords = None
+                results[futures[future]] = coords
+                failed = failed or not coords
+            if failed:
+                break
+
+        # Threads já em execução não podem ser interrompidas; o resultado delas apenas alimenta o cache
+        for future in pending:
+            future.cancel()
+
+        return results['start'], results['end']
     
-    def get_route_osrm(self, start_coords: Tuple[float, float], end_coords: Tuple[float, float]) -> Optional[Dict]:
+    def get_route_osrm(self, start_coords: Tuple[float, float], end_coords: Tuple[float, float], profile: str = 'driving') -> Optional[Dict]:
         """
         Obtém rota usando OSRM (Open Source Routing Machine)
         """
+        routes = self.get_routes_osrm(start_coords, end_coords, profile)
+        return routes[0] if routes else None
+
+    def get_routes_osrm(self, start_coords: Tuple[float, float], end_coords: Tuple[float, float], profile: str = 'driving',
+                        alternatives: int = 0) -> Optional[List[Dict]]:
+        """
+        Obtém a rota principal e, se pedido, até `alternatives` rotas alternativas do OSRM
+        (pedidos idênticos simultâneos compartilham a mesma chamada)
+        """
+        try:
+            return self.osrm_flights.do(
+                (profile, tuple(start_coords), tuple(end_coords), alternatives),
+                self._fetch_routes_osrm, start_coords, end_coords, profile, alternatives
+            )
+        except SingleFlightTimeout:
+            UPSTREAM_ERRORS.inc(upstream='osrm', kind='flight_timeout')
+            logger.warning("Chamada ao OSRM em andamento não terminou a tempo")
+            return None
+
+    def _fetch_routes_osrm(self, start_coords: Tuple[float, float], end_coords: Tuple[float, float], profile: str,
+                           alternatives: int) -> Optional[List[Dict]]:
         try:
-            print(f"🛣️ Calculando rota OSRM...")
-            print(f"📍 Start: {start_coords}")
-            print(f"🎯 End: {end_coords}")
-            
             start_lng, start_lat = start_coords[1], start_coords[0]
             end_lng, end_lat = end_coords[1], end_coords[0]
             
-            url = f"http://router.project-osrm.org/route/v1/driving/{start_lng},{start_lat};{end_lng},{end_lat}"
+            url = f"{self.osrm_url}/route/v1/{profile}/{start_lng},{start_lat};{end_lng},{end_lat}"
             params = {
                 'overview': 'full',
                 'geometries': 'geojson',
                 'steps': 'true'
             }
+            if alternatives:
+                params['alternatives'] = str(alternatives)
             
-            print(f"🌐 URL OSRM: {url}")
-            print(f"📤 Params: {params}")
-            
-            response = requests.get(url, params=params, timeout=8)  # Reduzido de 10 para 8
-            print(f"📥 Response status: {response.status_code}")
+            with PHASE_SECONDS.time(phase='osrm'):
+                response = self.http.get(url, params=params, timeout=8)  # Reduzido de 10 para 8
+                data = response.json() if response.status_code == 200 else None
             
-            if response.status_code == 200:
-                data = response.json()
-                print(f"📊 OSRM response code: {data.get('code', 'N/A')}")
+            if data is not None:
                 if data['code'] == 'Ok' and data['routes']:
-                    print(f"✅ Rota OSRM calculada com sucesso!")
-                    return data['routes'][0]
+                    logger.debug("Rota OSRM calculada", extra={'routes': len(data['routes'])})
+                    return data['routes'][:alternatives + 1]
                 else:
-                    print(f"❌ OSRM erro: {data}")
+                    UPSTREAM_ERRORS.inc(upstream='osrm', kind=f"code_{data.get('code')}")
+                    logger.warning("OSRM sem rota", extra={'osrm_code': data.get('code'), 'osrm_message': data.get('message')})
             else:
-                print(f"❌ HTTP Error: {response.status_code}")
+                UPSTREAM_ERRORS.inc(upstream='osrm', kind=f"http_{response.status_code}")
+                logger.warning("Erro HTTP no OSRM", extra={'status': response.status_code})
             return None
         except Exception as e:
-            print(f"❌ Erro ao obter rota: {e}")
+            UPSTREAM_ERRORS.inc(upstream='osrm', kind=type(e).__name__)
+            logger.warning("Erro ao obter rota: %s", e)
             return None
     
     def extract_street_names_from_route(self, route_data: Dict) -> List[str]:
@@ -100,150 +237,354 @@ class RoutingService:
                         if 'name' in step and step['name']:
                             street_names.append(step['name'])
         return list(set(street_names))  # Remove duplicatas
-    
-    def calculate_route(self, start_address: str, end_address: str) -> Optional[Dict]:
+
+    def strip_route(self, route_data: Dict) -> Dict:
+        """
+        Mantém apenas o que é usado da rota OSRM (descarta legs/steps)
+        """
+        return {
+            'geometry': route_data.get('geometry'),
+            'distance': route_data.get('distance', 0),
+            'duration': route_data.get('duration', 0),
+            'street_names': self.extract_street_names_from_route(route_data)
+        }
+
+    def get_route(self, start_coords: Tuple[float, float], end_coords: Tuple[float, float], profile: str = 'driving',
+                  current_time: time = None) -> Optional[Dict]:
+        """
+        Rota simplificada entre duas coordenadas, consultando o cache antes de calcular.
+        Com LOCAL_GRAPH_PATH configurado usa o motor local (ponderado pelo perigo no horário)
+        e recorre ao OSRM apenas se ele não encontrar caminho.
+        """
+        use_local = self.local_router.enabled
+        cache_profile = profile
+        if use_local:
+            if current_time is None:
+                current_time = datetime.now().time()
+            minute = current_time.hour * 60 + current_time.minute
+            cache_profile = f"local:{profile}:{self.local_router.time_bucket(minute)}"
+
+        cached = self.route_cache.get(start_coords, end_coords, cache_profile)
+        if cached is not None:
+            return cached
+
+        route_data = None
+        if use_local:
+            try:
+                with PHASE_SECONDS.time(phase='local_route'):
+                    route_data = self.local_router.route(start_coords, end_coords, minute)
+            except Exception as e:
+                UPSTREAM_ERRORS.inc(upstream='local_router', kind=type(e).__name__)
+                logger.exception("Erro no motor de rotas local")
+            if route_data is None:
+                logger.info("Rota local indisponível, usando OSRM")
+                cache_profile = profile
+
+        if route_data is None:
+            route_data = self.get_route_osrm(start_coords, end_coords, profile)
+        if not route_data:
+            return None
+
+        route = self.strip_route(route_data)
+        self.route_cache.set(start_coords, end_coords, cache_profile, route)
+        return route
+
+    def get_route_alternatives(self, start_coords: Tuple[float, float], end_coords: Tuple[float, float],
+                               profile: str = 'driving', alternatives: int = None) -> Optional[List[Dict]]:
+        """
+        Rota principal + alternativas do OSRM, já simplificadas e cacheadas como uma lista
+        """
+        if alternatives is None:
+            alternatives = int(os.getenv('OSRM_ALTERNATIVES', '3'))
+        cache_profile = f"{profile}:alternatives:{alternatives}"
+
+        cached = self.route_cache.get(start_coords, end_coords, cache_profile)
+        if cached is not None:
+            return cached
+
+        routes_data = self.get_routes_osrm(start_coords, end_coords, profile, alternatives)
+        if not routes_data:
+            return None
+
+        routes = [self.strip_route(route_data) for route_data in routes_data]
+        self.route_cache.set(start_coords, end_coords, cache_profile, routes)
+        return routes
+
+    def calculate_route(self, start_address: str, end_address: str, profile: str = 'driving',
+                        current_time: time = None) -> Optional[Dict]:
         """
         Calcula rota completa entre dois endereços
         """
-        print(f"🚀 Iniciando cálculo de rota...")
-        print(f"📍 Origem: {start_address}")
-        print(f"🎯 Destino: {end_address}")
-        
-        # Geocoding dos endereços
-        print(f"📍 Fase 1: Geocoding origem...")
-        start_coords = self.geocoding.geocode_address(start_address)
+        routes = self.calculate_route_options(start_address, end_address, profile, current_time)
+        return routes[0] if routes else None
+
+    def calculate_route_options(self, start_address: str, end_address: str, profile: str = 'driving',
+                                current_time: time = None, alternatives: bool = False) -> Optional[List[Dict]]:
+        """
+        Calcula a rota (e, opcionalmente, as alternativas do OSRM) entre dois endereços.
+        Pedidos iguais simultâneos (mesmos endereços, perfil e, no motor local, faixa de horário)
+        aguardam o primeiro e recebem o mesmo resultado, que não deve ser alterado.
+        """
+        bucket = None
+        if self.local_router.enabled:
+            if current_time is None:
+                current_time = datetime.now().time()
+            bucket = self.local_router.time_bucket(current_time.hour * 60 + current_time.minute)
+        key = (normalize_street_name(start_address), normalize_street_name(end_address), profile, alternatives, bucket)
+        try:
+            return self.route_flights.do(
+                key, self._calculate_route_options, start_address, end_address, profile, current_time, alternatives
+            )
+        except SingleFlightTimeout:
+            UPSTREAM_ERRORS.inc(upstream='route', kind='flight_timeout')
+            logger.warning("Cálculo de rota em andamento não terminou a tempo",
+                           extra={'start': start_address, 'end': end_address})
+            return None
+
+    def _calculate_route_options(self, start_address: str, end_address: str, profile: str, current_time: time,
+                                 alternatives: bool) -> Optional[List[Dict]]:
+        # Geocoding dos endereços (origem e destino em paralelo)
+        start_coords, end_coords = self.geocode_endpoints(start_address, end_address)
         if not start_coords:
-            print(f"❌ Falha no geocoding da origem")
+            logger.info("Falha no geocoding da origem", extra={'address': start_address})
             return None
-            
-        print(f"📍 Fase 2: Geocoding destino...")
-        end_coords = self.geocoding.geocode_address(end_address)
         if not end_coords:
-            print(f"❌ Falha no geocoding do destino")
+            logger.info("Falha no geocoding do destino", extra={'address': end_address})
             return None
         
-        print(f"📍 Fase 3: Calculando rota...")
-        # Obter rota
-        route_data = self.get_route_osrm(start_coords, end_coords)
-        if not route_data:
-            print(f"❌ Falha no cálculo da rota")
+        # Obter rota (já simplificada, com os nomes das ruas extraídos)
+        if alternatives and not self.local_router.enabled:
+            routes = self.get_route_alternatives(start_coords, end_coords, profile)
+        else:
+            route_data = self.get_route(start_coords, end_coords, profile, current_time)
+            routes = [route_data] if route_data else None
+        if not routes:
+            logger.info("Falha no cálculo da rota", extra={'start': start_address, 'end': end_address})
             return None
         
-        print(f"📍 Fase 4: Extraindo nomes das ruas...")
-        # Extrair nomes das ruas
-        street_names = self.extract_street_names_from_route(route_data)
-        print(f"🛣️ Ruas encontradas: {len(street_names)} ruas")
-        
-        result = {
-            'start_coords': start_coords,
-            'end_coords': end_coords,
-            'route_data': route_data,
-            'street_names': street_names,
-            'distance': route_data.get('distance', 0),
-            'duration': route_data.get('duration', 0)
-        }
+        results = []
+        for route_data in routes:
+            results.append({
+                'start_coords': start_coords,
+                'end_coords': end_coords,
+                'route_data': route_data,
+                'street_names': route_data['street_names'],
+                'distance': route_data.get('distance', 0),
+                'duration': route_data.get('duration', 0)
+            })
         
-        print("✅ Rota calculada com sucesso!")
-        return result
+        logger.debug("Rota calculada", extra={'options': len(results), 'streets': len(results[0]['street_names'])})
+        return results
 
 class SafetyAnalyzer:
-    def __init__(self, db_session):
+    def __init__(self, db_session, index: StreetDangerIndex = None, segments: SegmentSpatialIndex = None):
         self.db_session = db_session
+        self.index = index if index is not None else danger_index
+        self.segments = segments if segments is not None else segment_index
     
     def is_time_in_danger_period(self, current_time: time, start_time: str, end_time: str) -> bool:
         """
         Verifica se o horário atual está no período de perigo
         """
-        try:
-            start = datetime.strptime(start_time, "%H:%M").time()
-            end = datetime.strptime(end_time, "%H:%M").time()
-            
-            # Se o período cruza a meia-noite (ex: 20:00 às 05:00)
-            if start > end:
-                return current_time >= start or current_time <= end
-            else:
-                return start <= current_time <= end
-        except:
+        start = parse_clock_minutes(start_time)
+        end = parse_clock_minutes(end_time)
+        if start < 0 or end < 0:
             return False
+
+        minute = current_time.hour * 60 + current_time.minute
+        # Se o período cruza a meia-noite (ex: 20:00 às 05:00)
+        if start > end:
+            return minute >= start or minute <= end
+        else:
+            return start <= minute <= end
     
     def analyze_street_safety(self, street_name: str, current_time: time = None) -> Dict:
         """
         Analisa a segurança de uma rua específica
         """
+        return self.analyze_streets_batch([street_name], current_time)['street_analyses'][0]
+
+    def analyze_streets_batch(self, street_names: List[str], current_time: time = None) -> Dict:
+        """
+        Analisa a segurança de várias ruas com uma única consulta ao índice,
+        calculando índices, horários de perigo e médias de forma vetorizada
+        """
+        return self.analyze_routes_batch([street_names], current_time)[0]
+
+    def analyze_routes_batch(self, routes_street_names: List[List[str]], current_time: time = None,
+                             geometries: List[Optional[Dict]] = None) -> List[Dict]:
+        """
+        Analisa várias rotas de uma vez: a união das ruas de todas as rotas é
+        resolvida em uma única consulta ao índice e avaliada de forma vetorizada.
+        Com `geometries` (GeoJSON de cada rota), pontua também pelos trechos perigosos próximos.
+        """
         if current_time is None:
             current_time = datetime.now().time()
-        
-        # Buscar dados da rua no banco
-        from src.models.rota_segura import RotaSegura
-        street_data = self.db_session.query(RotaSegura).filter(
-            RotaSegura.nomeRua.ilike(f"%{street_name}%")
-        ).first()
-        
-        if street_data:
-            is_danger_time = self.is_time_in_danger_period(
-                current_time, 
-                street_data.horarioInicio, 
-                street_data.horarioFim
-            )
-            
-            # Ajustar índice baseado no horário
-            safety_index = street_data.indicePericulosidade
-            if is_danger_time:
-                safety_index = min(10.0, safety_index * 1.5)  # Aumenta o perigo no horário crítico
-            
-            return {
-                'street_name': street_name,
-                'found_in_db': True,
-                'base_danger_index': street_data.indicePericulosidade,
-                'current_danger_index': safety_index,
-                'is_danger_time': is_danger_time,
-                'danger_period': f"{street_data.horarioInicio} - {street_data.horarioFim}"
-            }
-        else:
-            return {
+        minute = current_time.hour * 60 + current_time.minute
+
+        # Buscar dados das ruas no índice em memória (sem SQL no caminho quente)
+        self.index.ensure_loaded(self.db_session)
+        snapshot = self.index.snapshot()
+        union = list(dict.fromkeys(name for street_names in routes_street_names for name in street_names))
+        slots = {name: i for i, name in enumerate(union)}
+        positions = snapshot.lookup_positions(union)
+
+        base_index = snapshot.base_indices(positions, default=2.0)  # 2.0: índice padrão para ruas não catalogadas
+        is_danger_time = snapshot.danger_mask(positions, minute)
+
+        # Ajustar índice baseado no horário (aumenta o perigo no horário crítico)
+        current_index = np.where(is_danger_time, np.minimum(10.0, base_index * 1.5), base_index)
+
+        geometry_analyses = [None] * len(routes_street_names)
+        if geometries is not None and SAFETY_GEOMETRY_SCORING:
+            self.segments.ensure_loaded(self.db_session)
+            segments = self.segments.snapshot()
+            if segments is not None and len(segments):
+                geometry_analyses = score_polylines(
+                    segments, snapshot, geometries, minute,
+                    SEGMENT_SEARCH_RADIUS_METERS, SEGMENT_NEIGHBORS, ROUTE_SAMPLE_METERS
+                )
+
+        analyses = []
+        for street_names, geometry_analysis in zip(routes_street_names, geometry_analyses):
+            route_slots = np.array([slots[name] for name in street_names], dtype=np.int64)
+            analyses.append(self._summarize_route(
+                street_names, snapshot, minute,
+                positions[route_slots], base_index[route_slots],
+                current_index[route_slots], is_danger_time[route_slots],
+                geometry_analysis
+            ))
+        return analyses
+
+    def _summarize_route(self, street_names: List[str], snapshot, minute: int, positions: np.ndarray,
+                         base_index: np.ndarray, current_index: np.ndarray, is_danger_time: np.ndarray,
+                         geometry_analysis: Optional[Dict] = None) -> Dict:
+        """
+        Monta o resultado da análise de uma rota a partir dos arrays já calculados
+        """
+        total_streets = len(street_names)
+        streets_in_db = int((positions >= 0).sum())
+        avg_danger = float(current_index.sum()) / total_streets if total_streets else 0
+        coverage = (streets_in_db / total_streets) * 100 if total_streets else 0
+
+        street_analyses = []
+        for street_name, position, base, current, danger in zip(
+            street_names, positions.tolist(), base_index.tolist(), current_index.tolist(), is_danger_time.tolist()
+        ):
+            record = snapshot.records[position] if position >= 0 else None
+            street_analyses.append({
                 'street_name': street_name,
-                'found_in_db': False,
-                'base_danger_index': 2.0,  # Índice padrão para ruas não catalogadas
-                'current_danger_index': 2.0,
-                'is_danger_time': False,
-                'danger_period': None
+                'found_in_db': record is not None,
+                'base_danger_index': base,
+                'current_danger_index': current,
+                'is_danger_time': danger,
+                'danger_period': f"{record.horarioInicio} - {record.horarioFim}" if record is not None else None
+            })
+
+        boundary_positions = positions
+        geometry = None
+        if geometry_analysis is not None:
+            nearby = geometry_analysis['positions']
+            boundary_positions = np.concatenate((positions, nearby))
+            geometry = {
+                'danger_index': geometry_analysis['danger_index'],
+                'max_danger_index': geometry_analysis['max_danger_index'],
+                'coverage': geometry_analysis['coverage'],
+                'sampled_points': geometry_analysis['sampled_points'],
+                'nearby_streets': [snapshot.records[position].nomeRua for position in nearby[:10].tolist()]
             }
-    
-    def analyze_route_safety(self, street_names: List[str], current_time: time = None) -> Dict:
+            if geometry_analysis['danger_index'] is not None:
+                # a parte da rota perto de trechos catalogados usa o índice da geometria;
+                # o restante mantém a média por nome da rua
+                fraction = geometry_analysis['coverage'] / 100
+                fallback = avg_danger if total_streets else geometry_analysis['danger_index']
+                avg_danger = fraction * geometry_analysis['danger_index'] + (1 - fraction) * fallback
+
+        # Minuto em que algum período começa ou termina: a análise vale até lá
+        boundary = snapshot.next_boundary(boundary_positions, minute)
+        valid_until = f"{boundary // 60:02d}:{boundary % 60:02d}" if boundary is not None else None
+
+        analysis = {
+            'street_analyses': street_analyses,
+            'average_danger_index': avg_danger,
+            'safety_level': self.classify_safety_level(avg_danger),
+            'database_coverage': coverage,
+            'total_streets': total_streets,
+            'streets_in_database': streets_in_db,
+            'valid_until': valid_until
+        }
+        if geometry is not None:
+            analysis['geometry_analysis'] = geometry
+        return analysis
+
+    def analyze_area(self, lat: float = None, lng: float = None, radius: float = None,
+                     bbox: Tuple[float, float, float, float] = None, current_time: time = None,
+                     limit: int = 200, min_danger: float = 0.0) -> Dict:
         """
-        Analisa a segurança de uma rota completa
+        Ruas catalogadas com geometria em um raio (lat/lng/radius em metros) ou retângulo
+        (south, west, north, east), com o índice ajustado ao horário, das mais perigosas
+        para as menos (desempate pela distância ao centro)
         """
         if current_time is None:
             current_time = datetime.now().time()
-        
-        street_analyses = []
-        total_danger = 0
-        streets_in_db = 0
-        
-        for street in street_names:
-            analysis = self.analyze_street_safety(street, current_time)
-            street_analyses.append(analysis)
-            total_danger += analysis['current_danger_index']
-            if analysis['found_in_db']:
-                streets_in_db += 1
-        
-        avg_danger = total_danger / len(street_names) if street_names else 0
-        coverage = (streets_in_db / len(street_names)) * 100 if street_names else 0
-        
-        # Classificar nível de segurança
-        if avg_danger <= 3:
-            safety_level = "SEGURA"
-        elif avg_danger <= 6:
-            safety_level = "MODERADA"
+        minute = current_time.hour * 60 + current_time.minute
+
+        self.index.ensure_loaded(self.db_session)
+        self.segments.ensure_loaded(self.db_session)
+        snapshot = self.index.snapshot()
+        segments = self.segments.snapshot()
+        if bbox is not None:
+            street_ids, distances, closest = segments.within_bbox(*bbox)
         else:
-            safety_level = "PERIGOSA"
-        
+            street_ids, distances, closest = segments.within_radius(lat, lng, radius)
+
+        positions = snapshot.positions_for_ids(street_ids)
+        is_danger_time = snapshot.danger_mask(positions, minute)
+        base_index = snapshot.base_indices(positions)
+        current_index = np.where(is_danger_time, np.minimum(10.0, base_index * 1.5), base_index)
+        keep = (positions >= 0) & (current_index >= min_danger)
+
+        matches = np.flatnonzero(keep)
+        order = matches[np.lexsort((distances[matches], -current_index[matches]))]
+        streets = []
+        for i in order[:limit].tolist():
+            record = snapshot.records[positions[i]]
+            streets.append({
+                'id': record.id,
+                'street_name': record.nomeRua,
+                'distance_meters': round(float(distances[i]), 1),
+                'closest_point': [float(closest[i, 0]), float(closest[i, 1])],
+                'base_danger_index': float(base_index[i]),
+                'current_danger_index': float(current_index[i]),
+                'is_danger_time': bool(is_danger_time[i]),
+                'danger_period': f"{record.horarioInicio} - {record.horarioFim}"
+            })
+
+        # Minuto em que algum período começa ou termina: a resposta vale até lá
+        boundary = snapshot.next_boundary(positions[keep], minute)
         return {
-            'street_analyses': street_analyses,
-            'average_danger_index': avg_danger,
-            'safety_level': safety_level,
-            'database_coverage': coverage,
-            'total_streets': len(street_names),
-            'streets_in_database': streets_in_db
+            'streets': streets,
+            'total': int(matches.size),
+            'truncated': int(matches.size) > limit,
+            'valid_until': f"{boundary // 60:02d}:{boundary % 60:02d}" if boundary is not None else None
         }
 
+    def classify_safety_level(self, avg_danger: float) -> str:
+        """
+        Classifica o nível de segurança a partir do índice médio
+        """
+        if avg_danger <= 3:
+            return "SEGURA"
+        elif avg_danger <= 6:
+            return "MODERADA"
+        else:
+            return "PERIGOSA"
+
+    def analyze_route_safety(self, street_names: List[str], current_time: time = None) -> Dict:
+        """
+        Analisa a segurança de uma rota completa
+        """
+        return self.analyze_streets_batch(street_names, current_time)
+
+# Instância global do serviço de rotas (criada uma vez por processo)
+routing_service = RoutingService()
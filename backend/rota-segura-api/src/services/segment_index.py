@@ -0,0 +1,357 @@
+import logging
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.models.rota_segura import RotaSeguraSegmento
+from src.services.danger_index import CHANGE_QUERY_CHUNK, DangerSnapshot
+from src.services.snapshot_index import SnapshotIndex
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_METERS = 6371008.8
+
+
+class LocalProjection:
+    """
+    Projeção equirretangular em metros em torno de um ponto de referência:
+    precisa o bastante na escala de uma cidade e permite distâncias euclidianas no KD-tree
+    """
+
+    def __init__(self, ref_lat: float, ref_lng: float):
+        self.ref_lat = ref_lat
+        self.ref_lng = ref_lng
+        self.x_scale = np.radians(1.0) * EARTH_RADIUS_METERS * np.cos(np.radians(ref_lat))
+        self.y_scale = np.radians(1.0) * EARTH_RADIUS_METERS
+
+    def to_xy(self, lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+        lat = np.asarray(lat, dtype=float)
+        lng = np.asarray(lng, dtype=float)
+        return np.column_stack(((lng - self.ref_lng) * self.x_scale, (lat - self.ref_lat) * self.y_scale))
+
+    def to_latlng(self, xy: np.ndarray) -> np.ndarray:
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        return np.column_stack((xy[:, 1] / self.y_scale + self.ref_lat, xy[:, 0] / self.x_scale + self.ref_lng))
+
+
+def densify_segments(start: np.ndarray, end: np.ndarray, spacing: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Amostra cada trecho (início -> fim, em metros) a cada `spacing` metros, incluindo as pontas.
+    Retorna (pontos, índice do trecho de cada ponto), sem laço por trecho.
+    """
+    if len(start) == 0:
+        return np.empty((0, 2)), np.empty(0, dtype=np.int64)
+    delta = end - start
+    lengths = np.hypot(delta[:, 0], delta[:, 1])
+    pieces = np.maximum(1, np.ceil(lengths / spacing)).astype(np.int64)
+    counts = pieces + 1
+    owner = np.repeat(np.arange(len(start)), counts)
+    offsets = np.cumsum(counts) - counts
+    step = np.arange(owner.size) - offsets[owner]
+    fraction = step / pieces[owner]
+    return start[owner] + delta[owner] * fraction[:, None], owner
+
+
+def sample_polyline(xy: np.ndarray, spacing: float) -> np.ndarray:
+    """
+    Pontos igualmente espaçados ao longo de uma polilinha (em metros), incluindo as pontas
+    """
+    if len(xy) == 0:
+        return np.empty((0, 2))
+    steps = np.hypot(*np.diff(xy, axis=0).T)
+    distance = np.concatenate(([0.0], np.cumsum(steps)))
+    total = distance[-1]
+    if total <= 0:
+        return xy[:1].copy()
+    marks = np.append(np.arange(0.0, total, spacing), total)
+    return np.column_stack((np.interp(marks, distance, xy[:, 0]), np.interp(marks, distance, xy[:, 1])))
+
+
+def geometry_coordinates(geometry) -> Optional[np.ndarray]:
+    """
+    Coordenadas [lng, lat] de uma geometria GeoJSON (LineString ou MultiLineString, também como dict
+    'geometry' de rota do OSRM); None se não houver ao menos dois pontos
+    """
+    if not isinstance(geometry, dict):
+        return None
+    coordinates = geometry.get('coordinates') or []
+    if geometry.get('type') == 'MultiLineString':
+        coordinates = [point for line in coordinates for point in line]
+    try:
+        array = np.asarray(coordinates, dtype=float)
+    except (TypeError, ValueError):
+        return None
+    if array.ndim != 2 or array.shape[0] < 2 or array.shape[1] < 2:
+        return None
+    return array[:, :2]
+
+
+class SegmentSnapshot:
+    """
+    Estrutura imutável com os trechos das ruas amostrados em pontos e indexados em um KD-tree.
+    Cada ponto guarda o id da rua (RotaSegura) a que pertence.
+    """
+
+    def __init__(self, street_ids: np.ndarray, coordinates: np.ndarray, sample_spacing: float,
+                 projection: LocalProjection = None, points: np.ndarray = None, owner: np.ndarray = None):
+        """
+        coordinates: uma linha por trecho com (latInicio, lngInicio, latFim, lngFim).
+        projection/points/owner podem vir prontos (atualização incremental)
+        """
+        self.segment_count = len(street_ids)
+        self.sample_spacing = sample_spacing
+        self.segment_street_id = np.asarray(street_ids, dtype=np.int64)
+        self.coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 4)
+        if projection is None:
+            if self.segment_count:
+                projection = LocalProjection(
+                    float(np.mean(self.coordinates[:, [0, 2]])), float(np.mean(self.coordinates[:, [1, 3]]))
+                )
+            else:
+                # Centro de Campinas: referência para projetar rotas mesmo sem trechos carregados
+                projection = LocalProjection(-22.9064, -47.0616)
+        self.projection = projection
+        if points is None:
+            points, owner = self.densify(self.coordinates)
+        self.points = points
+        self.point_segment = owner
+        self.point_street_id = self.segment_street_id[owner]
+        self.extent = (points.min(axis=0), points.max(axis=0)) if len(points) else None
+        # árvore sem balanceamento/compactação: constrói ~2x mais rápido, consultas quase iguais
+        self.tree = cKDTree(points, balanced_tree=False, compact_nodes=False) if len(points) else None
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def densify(self, coordinates: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Pontos amostrados (na projeção do snapshot) e índice do trecho de cada ponto
+        """
+        start = self.projection.to_xy(coordinates[:, 0], coordinates[:, 1])
+        end = self.projection.to_xy(coordinates[:, 2], coordinates[:, 3])
+        return densify_segments(start, end, self.sample_spacing)
+
+    def with_changes(self, street_ids: np.ndarray, coordinates: np.ndarray, changed_ids) -> 'SegmentSnapshot':
+        """
+        Novo snapshot em que os trechos das ruas `changed_ids` são substituídos pelos informados.
+        Só os trechos novos são amostrados; o KD-tree é reconstruído sobre os pontos combinados
+        (o cKDTree não aceita inserções).
+        """
+        changed = np.fromiter(set(changed_ids), dtype=np.int64)
+        coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 4)
+        keep = ~np.isin(self.segment_street_id, changed)
+        new_position = np.cumsum(keep) - 1
+        kept_points = keep[self.point_segment]
+        points, owner = self.densify(coordinates)
+        return SegmentSnapshot(
+            np.concatenate((self.segment_street_id[keep], np.asarray(street_ids, dtype=np.int64))),
+            np.concatenate((self.coordinates[keep], coordinates)),
+            self.sample_spacing,
+            projection=self.projection,
+            points=np.concatenate((self.points[kept_points], points)),
+            owner=np.concatenate((new_position[self.point_segment[kept_points]], owner + int(keep.sum())))
+        )
+
+    def query(self, xy: np.ndarray, radius: float, neighbors: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Até `neighbors` pontos de trecho a no máximo `radius` metros de cada ponto, em uma consulta
+        vetorizada ao KD-tree. Retorna (distâncias, ids das ruas), ambos (n, neighbors), com inf / -1 nas vagas.
+        """
+        n = len(xy)
+        if self.tree is None or n == 0:
+            return np.full((n, neighbors), np.inf), np.full((n, neighbors), -1, dtype=np.int64)
+        distances, indices = self.tree.query(xy, k=neighbors, distance_upper_bound=radius)
+        distances = distances.reshape(n, neighbors)
+        indices = indices.reshape(n, neighbors)
+        found = indices < len(self.points)
+        street_ids = np.where(found, self.point_street_id[np.where(found, indices, 0)], -1)
+        return distances, street_ids
+
+    def segments_in_bbox(self, south: float, west: float, north: float, east: float, margin: float = 0.0) -> np.ndarray:
+        """
+        Índices (ordenados) dos trechos com algum ponto amostrado dentro do retângulo
+        ampliado em `margin` metros
+        """
+        if self.tree is None:
+            return np.empty(0, dtype=np.int64)
+        corners = self.projection.to_xy([south, north], [west, east])
+        low, high = corners[0] - margin, corners[1] + margin
+        if (low <= self.extent[0]).all() and (high >= self.extent[1]).all():
+            return np.arange(self.segment_count)
+        # quadrado circunscrito (norma do máximo) e, depois, o filtro exato do retângulo
+        center = (low + high) / 2
+        indices = np.asarray(self.tree.query_ball_point(center, float((high - low).max()) / 2, p=np.inf,
+                                                        return_sorted=False), dtype=np.int64)
+        points = self.points[indices]
+        inside = ((points[:, 0] >= low[0]) & (points[:, 0] <= high[0])
+                  & (points[:, 1] >= low[1]) & (points[:, 1] <= high[1]))
+        return np.unique(self.point_segment[indices[inside]])
+
+    def _closest_per_street(self, indices: np.ndarray, center: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Para os pontos encontrados, o mais próximo do centro em cada rua: (ids, distâncias, [lat, lng])
+        """
+        if len(indices) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0), np.empty((0, 2))
+        points = self.points[indices]
+        distances = np.hypot(points[:, 0] - center[0], points[:, 1] - center[1])
+        street_ids = self.point_street_id[indices]
+        order = np.lexsort((distances, street_ids))
+        _, first = np.unique(street_ids[order], return_index=True)
+        closest = order[first]
+        return street_ids[closest], distances[closest], self.projection.to_latlng(points[closest])
+
+    def within_radius(self, lat: float, lng: float, radius: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Ruas com algum trecho a até `radius` metros do ponto: (ids, distância em metros, ponto mais próximo)
+        """
+        center = self.projection.to_xy(lat, lng)[0]
+        if self.tree is None:
+            return self._closest_per_street(np.empty(0, dtype=np.int64), center)
+        indices = np.asarray(self.tree.query_ball_point(center, radius, return_sorted=False), dtype=np.int64)
+        return self._closest_per_street(indices, center)
+
+    def within_bbox(self, south: float, west: float, north: float, east: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Ruas com algum trecho dentro do retângulo; distâncias medidas a partir do centro dele
+        """
+        corners = self.projection.to_xy([south, north], [west, east])
+        center = corners.mean(axis=0)
+        if self.tree is None:
+            return self._closest_per_street(np.empty(0, dtype=np.int64), center)
+        # o círculo que circunscreve o retângulo e, depois, o filtro exato (a projeção preserva retângulos)
+        half_diagonal = float(np.hypot(*(corners[1] - corners[0]))) / 2
+        indices = np.asarray(self.tree.query_ball_point(center, half_diagonal, return_sorted=False), dtype=np.int64)
+        points = self.points[indices]
+        inside = ((points[:, 0] >= corners[0, 0]) & (points[:, 0] <= corners[1, 0])
+                  & (points[:, 1] >= corners[0, 1]) & (points[:, 1] <= corners[1, 1]))
+        return self._closest_per_street(indices[inside], center)
+
+
+def score_polylines(segments: SegmentSnapshot, danger: DangerSnapshot, geometries: Sequence, minute: int,
+                    radius: float, neighbors: int, route_spacing: float) -> List[Optional[Dict]]:
+    """
+    Exposição de cada rota aos trechos perigosos próximos: a geometria é amostrada a cada
+    `route_spacing` metros, todos os pontos de todas as rotas são consultados de uma vez no KD-tree
+    e cada ponto recebe a média dos índices (ajustados ao horário) dos trechos vizinhos, ponderada
+    por 1 - distância / raio. None para rotas sem geometria.
+    """
+    polylines = [geometry_coordinates(geometry) for geometry in geometries]
+    samples = []
+    for coordinates in polylines:
+        if coordinates is None:
+            samples.append(np.empty((0, 2)))
+            continue
+        samples.append(sample_polyline(segments.projection.to_xy(coordinates[:, 1], coordinates[:, 0]), route_spacing))
+    sizes = np.array([len(points) for points in samples], dtype=np.int64)
+    route_of_point = np.repeat(np.arange(len(samples)), sizes)
+    points = np.concatenate(samples) if len(samples) else np.empty((0, 2))
+
+    distances, street_ids = segments.query(points, radius, neighbors)
+    positions = danger.positions_for_ids(street_ids)
+    found = positions >= 0
+    weights = np.where(found, np.clip(1.0 - distances / radius, 0.0, 1.0), 0.0)
+    current = np.where(found, danger.current_indices(positions, minute), 0.0)
+
+    weight_sum = weights.sum(axis=1)
+    covered = weight_sum > 0
+    point_danger = np.divide((weights * current).sum(axis=1), weight_sum,
+                             out=np.zeros(len(points)), where=covered)
+
+    routes = len(samples)
+    covered_count = np.bincount(route_of_point, weights=covered, minlength=routes)
+    danger_sum = np.bincount(route_of_point, weights=point_danger, minlength=routes)
+    max_danger = np.zeros(routes)
+    np.maximum.at(max_danger, route_of_point, point_danger)
+
+    # ruas próximas de cada rota, ordenadas pela exposição acumulada (soma dos pesos)
+    pair_route = np.repeat(route_of_point, neighbors)[found.ravel()]
+    pair_position = positions[found]
+    pair_weight = weights[found]
+    pairs, inverse = np.unique(np.column_stack((pair_route, pair_position)), axis=0, return_inverse=True)
+    exposure = np.bincount(inverse.ravel(), weights=pair_weight, minlength=len(pairs))
+
+    results = []
+    for route, coordinates in enumerate(polylines):
+        if coordinates is None:
+            results.append(None)
+            continue
+        mask = pairs[:, 0] == route
+        order = np.argsort(-exposure[mask], kind='stable')
+        nearby_positions = pairs[mask, 1][order]
+        count = int(covered_count[route])
+        results.append({
+            'sampled_points': int(sizes[route]),
+            'covered_points': count,
+            'coverage': float(count / sizes[route] * 100) if sizes[route] else 0.0,
+            'danger_index': float(danger_sum[route]) / count if count else None,
+            'max_danger_index': float(max_danger[route]),
+            'positions': nearby_positions
+        })
+    return results
+
+
+class SegmentSpatialIndex(SnapshotIndex):
+    """
+    Índice espacial em memória (por processo) dos trechos de RotaSeguraSegmento,
+    recarregado periodicamente como o índice de periculosidade
+    """
+
+    size_key = 'segments'
+
+    def __init__(self, refresh_interval: float = None, sample_spacing: float = None):
+        super().__init__(refresh_interval)
+        if sample_spacing is None:
+            sample_spacing = float(os.getenv('SEGMENT_SAMPLE_METERS', '10'))
+        self.sample_spacing = sample_spacing
+
+    def _query(self, db_session, ids: List[int] = None) -> np.ndarray:
+        """
+        Trechos como array (rotaSeguraId, latInicio, lngInicio, latFim, lngFim); todos ou só das ruas `ids`
+        """
+        table = RotaSeguraSegmento.__table__
+        columns = (table.c.rotaSeguraId, table.c.latInicio, table.c.lngInicio, table.c.latFim, table.c.lngFim)
+        statement = select(*columns).order_by(table.c.rotaSeguraId, table.c.ordem)
+        if ids is None:
+            rows = db_session.execute(statement).tuples().all()
+        else:
+            rows = []
+            for begin in range(0, len(ids), CHANGE_QUERY_CHUNK):
+                chunk = ids[begin:begin + CHANGE_QUERY_CHUNK]
+                rows.extend(db_session.execute(statement.where(table.c.rotaSeguraId.in_(chunk))).tuples().all())
+        # fromiter sobre os valores achatados: np.array(rows) com objetos Row é ~50x mais lento
+        return np.fromiter(
+            (value for row in rows for value in row), dtype=float, count=len(rows) * len(columns)
+        ).reshape(-1, len(columns))
+
+    def _build(self, db_session) -> SegmentSnapshot:
+        # KD-tree com uma única consulta à tabela
+        try:
+            data = self._query(db_session)
+        except SQLAlchemyError as e:
+            # banco sem a tabela de trechos (migração não aplicada): segue só com a análise por nome
+            db_session.rollback()
+            logger.warning("Trechos de ruas indisponíveis: %s", e)
+            data = np.empty((0, 5))
+
+        snapshot = SegmentSnapshot(data[:, 0].astype(np.int64), data[:, 1:], self.sample_spacing)
+        logger.info("Índice espacial carregado", extra={
+            'segments': snapshot.segment_count, 'points': len(snapshot)
+        })
+        return snapshot
+
+    def _build_changes(self, db_session, snapshot: SegmentSnapshot, street_ids: List[int]) -> SegmentSnapshot:
+        # substitui apenas os trechos das ruas alteradas
+        data = self._query(db_session, street_ids)
+        return snapshot.with_changes(data[:, 0].astype(np.int64), data[:, 1:], street_ids)
+
+    def _size(self, snapshot: SegmentSnapshot) -> int:
+        return snapshot.segment_count
+
+
+# Instância global do índice espacial
+segment_index = SegmentSpatialIndex()
@@ -0,0 +1,75 @@
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from src.services.metrics import SINGLE_FLIGHT_EVENTS
+
+
+class SingleFlightTimeout(TimeoutError):
+    """
+    A chamada em andamento para a chave não terminou dentro do prazo de espera
+    """
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Agrupa chamadas concorrentes com a mesma chave: a primeira (líder) executa a função
+    e as demais aguardam e recebem o mesmo resultado, ou a mesma exceção. Nada é guardado
+    depois que a chamada termina (isso é papel dos caches). O resultado é compartilhado
+    entre as threads e deve ser tratado como somente leitura.
+    """
+
+    def __init__(self, name: str, timeout: float = None):
+        self.name = name
+        # prazo de espera de quem aguarda; o líder segue limitado pelos timeouts do próprio serviço externo
+        self.timeout = timeout if timeout is not None else float(os.getenv('SINGLE_FLIGHT_TIMEOUT_SECONDS', '15'))
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, function: Callable, *args, timeout: float = None, **kwargs) -> Any:
+        """
+        Executa function(*args, **kwargs), ou aguarda a execução já em andamento para `key`
+        por até `timeout` segundos (SingleFlightTimeout se esgotar)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if leader:
+            SINGLE_FLIGHT_EVENTS.inc(flight=self.name, result='leader')
+            try:
+                call.result = function(*args, **kwargs)
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+            return call.result
+
+        SINGLE_FLIGHT_EVENTS.inc(flight=self.name, result='shared')
+        if not call.done.wait(self.timeout if timeout is None else timeout):
+            SINGLE_FLIGHT_EVENTS.inc(flight=self.name, result='timeout')
+            raise SingleFlightTimeout(f"{self.name}: chamada em andamento não terminou a tempo")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def in_flight(self) -> int:
+        """
+        Chaves com chamada em andamento
+        """
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,128 @@
+import os
+import threading
+import time as _time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from src.services.change_log import ChangeCursor, recent_change_ids
+
+
+class SnapshotIndex:
+    """
+    Base dos índices em memória (por processo) construídos a partir das ruas do banco.
+    O snapshot é imutável e trocado atomicamente; é recarregado por completo a cada
+    `refresh_interval` segundos e atualizado por rua pelo IndexWatcher.
+
+    As subclasses implementam `_build` (snapshot completo), `_build_changes`
+    (snapshot com as ruas alteradas relidas) e `_size`.
+    """
+
+    # chave do tamanho do índice em stats()
+    size_key = 'items'
+
+    def __init__(self, refresh_interval: float = None):
+        if refresh_interval is None:
+            refresh_interval = float(os.getenv('DANGER_INDEX_REFRESH_SECONDS', '300'))
+        self.refresh_interval = refresh_interval
+        self._snapshot: Optional[Any] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        # geração: incrementada a cada troca de snapshot; cursor: alterações de
+        # RotaSeguraAlteracao já refletidas no snapshot
+        self.generation = 0
+        self.cursor = ChangeCursor()
+        self.updated_at: Optional[datetime] = None
+
+    def _build(self, db_session) -> Any:
+        raise NotImplementedError
+
+    def _build_changes(self, db_session, snapshot: Any, street_ids: List[int]) -> Any:
+        raise NotImplementedError
+
+    def _size(self, snapshot: Any) -> int:
+        raise NotImplementedError
+
+    @property
+    def change_id(self) -> int:
+        return self.cursor.change_id
+
+    def _swap(self, snapshot: Any, change_ids: Optional[List[int]], full: bool) -> None:
+        # troca atômica: as requisições em andamento seguem com o snapshot que já leram
+        with self._lock:
+            self._snapshot = snapshot
+            if full:
+                # só a recarga completa adia a próxima: ela independe do registro de alterações
+                self._loaded_at = _time.monotonic()
+                if change_ids is not None:
+                    self.cursor.reset(change_ids)
+            elif change_ids:
+                self.cursor.advance(change_ids)
+            self.generation += 1
+            self.updated_at = datetime.now()
+
+    def load(self, db_session) -> None:
+        """
+        (Re)constrói o índice a partir do banco
+        """
+        # lido antes da tabela: alterações confirmadas durante a carga serão aplicadas depois
+        change_ids = recent_change_ids(db_session)
+        self._swap(self._build(db_session), change_ids, full=True)
+
+    def apply_changes(self, db_session, street_ids: List[int], change_ids: List[int]) -> None:
+        """
+        Atualiza apenas as ruas alteradas (relidas do banco; as ausentes foram removidas)
+        """
+        with self._reload_lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                return
+            updated = self._build_changes(db_session, snapshot, list(street_ids))
+            self._swap(updated, change_ids, full=False)
+
+    def reload(self, db_session) -> None:
+        """
+        Recarga completa, sem concorrer com uma atualização incremental
+        """
+        with self._reload_lock:
+            self.load(db_session)
+
+    def stats(self) -> Dict:
+        return {
+            'generation': self.generation,
+            'change_id': self.change_id,
+            self.size_key: len(self),
+            'updated_at': self.updated_at.isoformat() if self.updated_at is not None else None
+        }
+
+    def ensure_loaded(self, db_session) -> None:
+        """
+        Carrega o índice na primeira chamada ou quando o intervalo de atualização expira
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and _time.monotonic() - self._loaded_at < self.refresh_interval:
+            return
+        # apenas uma thread recarrega; as demais seguem com o snapshot atual
+        if not self._reload_lock.acquire(blocking=snapshot is None):
+            return
+        try:
+            if self._snapshot is snapshot:
+                self.load(db_session)
+        finally:
+            self._reload_lock.release()
+
+    def invalidate(self) -> None:
+        """
+        Força a recarga na próxima consulta
+        """
+        self._loaded_at = float('-inf')
+
+    def snapshot(self) -> Optional[Any]:
+        """
+        Snapshot atual; use o mesmo objeto durante toda uma análise
+        """
+        return self._snapshot
+
+    def __len__(self) -> int:
+        snapshot = self._snapshot
+        return self._size(snapshot) if snapshot is not None else 0
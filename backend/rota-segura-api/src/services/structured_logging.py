@@ -0,0 +1,105 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+
+# Atributos padrão do LogRecord; o resto veio de `extra=` e vira campo do log
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Uma linha JSON por evento: timestamp, nível, logger, mensagem e os campos de `extra`
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """
+    Formato legível para desenvolvimento, com os campos de `extra` como chave=valor
+    """
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = [
+            f'{key}={value}' for key, value in record.__dict__.items()
+            if key not in _RESERVED and not key.startswith('_')
+        ]
+        return f"{line} {' '.join(fields)}" if fields else line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Resolve a mensagem e a exceção antes de enfileirar, preservando os campos de `extra`
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configure_logging(level: str = None, log_format: str = None) -> None:
+    """
+    Configura o logging da aplicação (LOG_LEVEL, LOG_FORMAT=json|text).
+    A escrita no stdout acontece em uma thread separada (QueueListener),
+    então as requisições não ficam bloqueadas esperando o terminal.
+    """
+    global _listener
+    level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    log_format = log_format or os.getenv('LOG_FORMAT', 'json')
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if log_format == 'json' else TextFormatter())
+
+    _stop_listener()
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_QueueHandler(log_queue))
+    root.setLevel(level)
+
+
+# Esvaziar a fila antes de o processo terminar
+atexit.register(_stop_listener)
@@ -0,0 +1,14 @@
+import unicodedata
+
+
+def normalize_street_name(name: str) -> str:
+    """
+    Normaliza o nome da rua: remove acentos e caracteres de controle,
+    converte para minúsculas e colapsa espaços
+    """
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    stripped = ''.join(
+        c for c in decomposed
+        if not unicodedata.combining(c) and unicodedata.category(c)[0] != 'C'
+    )
+    return ' '.join(stripped.casefold().split())
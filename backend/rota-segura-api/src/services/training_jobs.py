@@ -0,0 +1,128 @@
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Dict, Optional
+
+from src.services.ai_service import RouteOptimizationAI, fit_route_model, route_ai
+
+logger = logging.getLogger(__name__)
+
+
+class TrainingJobManager:
+    """
+    Executa o treinamento da IA fora do processo da API e publica o modelo ao terminar.
+    As predições continuam usando o modelo atual até a troca atômica.
+    """
+
+    def __init__(self, ai: RouteOptimizationAI = None, max_jobs: int = None, mp_context: str = None):
+        self.ai = ai if ai is not None else route_ai
+        self.max_jobs = max_jobs if max_jobs is not None else int(os.getenv('AI_TRAINING_MAX_JOBS', '50'))
+        # 'spawn' evita herdar locks de threads da API no processo filho
+        self.mp_context = mp_context if mp_context is not None else os.getenv('AI_TRAINING_MP_CONTEXT', 'spawn')
+        self._jobs: "OrderedDict[str, Dict]" = OrderedDict()
+        self._futures: Dict[str, Future] = {}
+        self._active_job: Optional[str] = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            try:
+                context = multiprocessing.get_context(self.mp_context)
+                self._executor = ProcessPoolExecutor(max_workers=1, mp_context=context)
+            except (OSError, ValueError, NotImplementedError) as e:
+                logger.warning("Pool de processos indisponível, treinando em thread: %s", e)
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ai-training')
+        return self._executor
+
+    def submit(self, num_samples: int = None) -> Dict:
+        """
+        Agenda um retreino; se já houver um em andamento, retorna o mesmo job
+        """
+        num_samples = num_samples or int(os.getenv('AI_TRAINING_SAMPLES', '2000'))
+        with self._lock:
+            if self._active_job is not None:
+                job = self._snapshot(self._active_job)
+                job['already_running'] = True
+                return job
+
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                'job_id': job_id,
+                'status': 'queued',
+                'num_samples': num_samples,
+                'submitted_at': datetime.now().isoformat(),
+                'finished_at': None,
+                'model_version': None,
+                'metrics': None,
+                'error': None
+            }
+            while len(self._jobs) > self.max_jobs:
+                old_id, _ = self._jobs.popitem(last=False)
+                self._futures.pop(old_id, None)
+
+            future = self._get_executor().submit(
+                fit_route_model, num_samples, 42, self.ai.inference_backend
+            )
+            self._futures[job_id] = future
+            self._active_job = job_id
+            job = self._snapshot(job_id)
+
+        future.add_done_callback(lambda f: self._on_done(job_id, f))
+        return job
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """
+        Situação do job (queued, running, succeeded, failed) ou None se desconhecido
+        """
+        with self._lock:
+            if job_id not in self._jobs:
+                return None
+            return self._snapshot(job_id)
+
+    def _snapshot(self, job_id: str) -> Dict:
+        job = dict(self._jobs[job_id])
+        future = self._futures.get(job_id)
+        if job['status'] == 'queued' and future is not None and future.running():
+            job['status'] = 'running'
+        return job
+
+    def _on_done(self, job_id: str, future: Future) -> None:
+        error = None
+        bundle = None
+        try:
+            bundle = future.result()
+            self.ai.swap_bundle(bundle)
+            self.ai.save_bundle(bundle)
+        except Exception as e:
+            error = str(e)
+            if isinstance(e, BrokenProcessPool):
+                # o processo de treino morreu: o próximo job cria um pool novo
+                with self._lock:
+                    self._executor = None
+            logger.error("Erro no treinamento da IA: %s", e, extra={'job_id': job_id})
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job['finished_at'] = datetime.now().isoformat()
+                if error is None:
+                    job['status'] = 'succeeded'
+                    job['model_version'] = bundle.version
+                    job['metrics'] = bundle.metrics
+                else:
+                    job['status'] = 'failed'
+                    job['error'] = error
+            self._futures.pop(job_id, None)
+            if self._active_job == job_id:
+                self._active_job = None
+
+
+# Instância global do gerenciador de treinamentos
+training_jobs = TrainingJobManager()
@@ -0,0 +1,75 @@
+import threading
+import time as _time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+# Sentinela para diferenciar "não está no cache" de um valor None cacheado
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Cache LRU em memória, limitado em número de entradas e com expiração por entrada
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Retorna o valor cacheado ou MISSING
+        """
+        now = _time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return MISSING
+
+    def set(self, key: Hashable, value: Any, ttl: float = None, expires_at: float = None) -> None:
+        """
+        Armazena o valor, descartando as entradas menos usadas além do limite
+        """
+        if expires_at is None:
+            expires_at = _time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        """
+        Contadores de acertos/falhas do cache
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries)
+            }
@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy.orm import Session
+
+# mesmo ajuste do main.py: os testes importam o pacote src a partir da raiz da API
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.rota_segura import RotaSegura, RotaSeguraSegmento  # noqa: E402
+from src.services.change_log import install_change_tracking  # noqa: E402
+from src.services.database import create_database_engine, ensure_street_name_index  # noqa: E402
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """
+    SQLite em arquivo com as tabelas, índices e triggers que a API instala ao iniciar
+    """
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'rota_segura.db'}")
+    RotaSegura.__table__.create(engine)
+    RotaSeguraSegmento.__table__.create(engine)
+    ensure_street_name_index(engine)
+    assert install_change_tracking(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    with Session(engine) as session:
+        yield session
+
+
+def add_streets(session, streets):
+    """
+    Grava ruas (nome, início, fim, índice) e devolve os objetos, na ordem dos ids
+    """
+    rows = [
+        RotaSegura(nomeRua=name, horarioInicio=start, horarioFim=end, indicePericulosidade=danger)
+        for name, start, end, danger in streets
+    ]
+    session.add_all(rows)
+    session.commit()
+    return rows
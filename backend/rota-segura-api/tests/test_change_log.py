@@ -0,0 +1,163 @@
+from sqlalchemy import func, select, text
+
+from conftest import add_streets
+from src.models.rota_segura import RotaSegura, RotaSeguraAlteracao
+from src.services import change_log
+from src.services.change_log import ChangeCursor, latest_change_id, oldest_change_id, prune_changes
+from src.services.danger_index import StreetDangerIndex
+from src.services.index_watcher import IndexWatcher
+
+STREETS = [
+    ('Rua Goiás', '20:00', '05:00', 6.0),
+    ('Avenida Brasil', '08:00', '18:00', 3.0),
+    ('Rua das Flores', '22:00', '03:00', 8.0),
+    ('Rua Tiradentes', '17:00', '04:00', 7.0),
+    ('Praça da Sé', '00:00', '23:59', 2.0),
+]
+
+
+def test_cursor_reset_starts_after_visible_changes():
+    cursor = ChangeCursor(window=10)
+    cursor.reset([3, 1, 2])
+    assert cursor.change_id == 3
+    assert cursor.pending([(1, 7), (2, 8), (3, 9)]) == ([], [])
+    assert cursor.pending([(3, 9), (4, 10)]) == ([4], [10])
+
+
+def test_cursor_applies_out_of_order_ids_once():
+    cursor = ChangeCursor(window=10)
+    cursor.reset([1])
+    # a transação com id 3 confirmou antes da de id 2
+    changes, streets = cursor.pending([(3, 30)])
+    assert (changes, streets) == ([3], [30])
+    cursor.advance(changes)
+
+    changes, streets = cursor.pending([(2, 20), (3, 30)])
+    assert (changes, streets) == ([2], [20])
+    cursor.advance(changes)
+    assert cursor.change_id == 3
+    assert cursor.pending([(2, 20), (3, 30)]) == ([], [])
+
+
+def test_cursor_deduplicates_streets_and_repeated_ids():
+    cursor = ChangeCursor(window=10)
+    changes, streets = cursor.pending([(1, 5), (2, 5), (2, 5), (3, 4)])
+    assert changes == [1, 2, 2, 3]
+    assert streets == [4, 5]
+    cursor.advance(changes)
+    assert cursor.pending([(1, 5), (2, 5), (3, 4)]) == ([], [])
+
+
+def test_cursor_ignores_ids_below_the_window():
+    cursor = ChangeCursor(window=5)
+    cursor.advance([20])
+    assert cursor.low == 15
+    assert cursor.pending([(15, 1), (16, 2)]) == ([16], [2])
+    cursor.advance([16, 30])
+    # ids que saíram da janela deixam de ser guardados
+    assert cursor.seen == {30}
+
+
+def test_prune_keeps_at_least_the_window(session, monkeypatch):
+    monkeypatch.setattr(change_log, 'CHANGE_WINDOW', 5)
+    add_streets(session, [(f'Rua {i}', '08:00', '18:00', 1.0) for i in range(20)])
+    assert latest_change_id(session) == 20
+
+    assert prune_changes(session, keep=3) == 15
+    assert oldest_change_id(session) == 16
+    assert session.execute(select(func.count()).select_from(RotaSeguraAlteracao)).scalar() == 5
+    assert prune_changes(session, keep=3) == 0
+
+
+def test_prune_without_enough_changes(session, monkeypatch):
+    monkeypatch.setattr(change_log, 'CHANGE_WINDOW', 5)
+    add_streets(session, STREETS)
+    assert prune_changes(session, keep=10) == 0
+    assert oldest_change_id(session) == 1
+
+
+def watched(session, **kwargs):
+    index = StreetDangerIndex(refresh_interval=3600)
+    index.load(session)
+    kwargs.setdefault('full_reload_ratio', 1.0)
+    return index, IndexWatcher({'danger': index}, interval=0, keep=0, **kwargs)
+
+
+def test_watcher_applies_insert_update_and_delete(session):
+    rows = add_streets(session, STREETS)
+    index, watcher = watched(session)
+
+    rows[1].indicePericulosidade = 9.0
+    session.delete(rows[2])
+    add_streets(session, [('Rua Nova', '08:00', '18:00', 4.0)])
+    watcher.poll(session)
+
+    assert index.lookup('Avenida Brasil').indicePericulosidade == 9.0
+    assert index.lookup('Rua das Flores') is None
+    assert index.lookup('rua nova') is not None
+    assert len(index) == len(STREETS)
+    assert index.stats()['change_id'] == latest_change_id(session)
+
+
+def test_watcher_finds_renamed_street(session):
+    rows = add_streets(session, STREETS)
+    index, watcher = watched(session)
+
+    session.execute(text('UPDATE "RotaSegura" SET "nomeRua" = :name WHERE id = :id'),
+                    {'name': 'Avenida Nova Exemplo', 'id': rows[3].id})
+    session.commit()
+    watcher.poll(session)
+
+    assert index.lookup('Avenida Nova Exemplo').id == rows[3].id
+    assert index.lookup('Rua Tiradentes') is None
+
+
+def test_watcher_applies_change_committed_late_with_lower_id(session):
+    rows = add_streets(session, STREETS)
+    index, watcher = watched(session)
+    latest = latest_change_id(session)
+
+    # uma alteração com id bem à frente confirma primeiro...
+    session.add(RotaSeguraAlteracao(id=latest + 10, rotaSeguraId=rows[0].id))
+    session.commit()
+    watcher.poll(session)
+    assert index.change_id == latest + 10
+
+    # ...e uma com id menor (sequência consumida antes) só aparece depois
+    rows[1].indicePericulosidade = 9.5
+    session.commit()
+    late = latest_change_id(session)
+    session.execute(text('UPDATE "RotaSeguraAlteracao" SET id = :low WHERE id = :id'), {'low': latest + 3, 'id': late})
+    session.commit()
+    generation = index.generation
+    watcher.poll(session)
+
+    assert index.generation == generation + 1
+    assert index.lookup('Avenida Brasil').indicePericulosidade == 9.5
+    # já aplicada: não é aplicada de novo
+    watcher.poll(session)
+    assert index.generation == generation + 1
+
+
+def test_watcher_reloads_everything_after_pruned_gap(session, monkeypatch):
+    monkeypatch.setattr(change_log, 'CHANGE_WINDOW', 2)
+    rows = add_streets(session, STREETS)
+    index, watcher = watched(session)
+
+    for danger in (5.0, 6.0, 7.0, 8.0):
+        rows[0].indicePericulosidade = danger
+        session.commit()
+    prune_changes(session, keep=1)
+    loaded_at = index._loaded_at
+    watcher.poll(session)
+
+    assert index._loaded_at > loaded_at
+    assert index.lookup('Rua Goiás').indicePericulosidade == 8.0
+
+
+def test_watcher_without_change_log(session):
+    session.execute(text('DROP TABLE "RotaSeguraAlteracao"'))
+    session.commit()
+    index = StreetDangerIndex(refresh_interval=3600)
+    assert not IndexWatcher({'danger': index}, interval=0).poll(session)
+    assert session.execute(select(func.count()).select_from(RotaSegura)).scalar() == 0
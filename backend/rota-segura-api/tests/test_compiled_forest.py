@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+from src.services.compiled_forest import CompiledForest
+
+
+@pytest.fixture(scope='module')
+def trained():
+    rng = np.random.default_rng(42)
+    n = 600
+    # mistura de características contínuas e discretas, em escalas bem diferentes
+    X = np.column_stack([
+        rng.uniform(100, 20000, n),
+        rng.uniform(60, 3600, n),
+        rng.integers(0, 24, n).astype(np.float64),
+        rng.integers(0, 2, n).astype(np.float64),
+        rng.normal(5.0, 2.0, n)
+    ])
+    y = X[:, 0] / 2000 - X[:, 2] / 4 + 3 * X[:, 3] + rng.normal(0, 0.5, n)
+    train, held_out = X[:450], X[450:]
+
+    scaler = StandardScaler().fit(train)
+    model = RandomForestRegressor(n_estimators=15, max_depth=8, random_state=0)
+    model.fit(scaler.transform(train), y[:450])
+    return model, scaler, CompiledForest.from_sklearn(model, scaler), held_out
+
+
+def assert_parity(model, scaler, compiled, X):
+    scaled = scaler.transform(X)
+    # mesmas decisões em todos os nós: cada árvore chega à mesma folha que no sklearn
+    leaves = np.column_stack([estimator.apply(scaled) for estimator in model.estimators_])
+    np.testing.assert_array_equal(compiled.apply(X), leaves)
+    # a média das folhas pode diferir só no arredondamento da ordem da soma
+    np.testing.assert_allclose(compiled.predict(X), model.predict(scaled), rtol=0, atol=1e-12)
+
+
+def boundary_rows(model, scaler, compiled, base):
+    """
+    Linhas com uma característica exatamente sobre cada limiar (o do sklearn levado ao
+    espaço original e o limiar já convertido), e nos floats vizinhos
+    """
+    rows = []
+    split = np.isfinite(compiled.threshold)
+    for feature, threshold in zip(compiled.feature[split], compiled.threshold[split]):
+        for value in (threshold, np.nextafter(threshold, -np.inf), np.nextafter(threshold, np.inf)):
+            row = base.copy()
+            row[feature] = value
+            rows.append(row)
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        for feature, threshold in zip(tree.feature[tree.children_left >= 0], tree.threshold[tree.children_left >= 0]):
+            row = base.copy()
+            row[feature] = scaler.mean_[feature] + threshold * scaler.scale_[feature]
+            rows.append(row)
+    return np.array(rows)
+
+
+def test_held_out_rows_match_sklearn(trained):
+    model, scaler, compiled, held_out = trained
+    assert_parity(model, scaler, compiled, held_out)
+
+
+def test_threshold_boundaries_match_sklearn(trained):
+    model, scaler, compiled, held_out = trained
+    X = boundary_rows(model, scaler, compiled, held_out[0])
+    assert len(X) > 0
+    assert_parity(model, scaler, compiled, X)
+
+
+def test_single_row(trained):
+    model, scaler, compiled, held_out = trained
+    assert compiled.predict(held_out[3]).shape == (1,)
+    assert_parity(model, scaler, compiled, held_out[3:4])
+
+
+def test_verify(trained):
+    model, scaler, compiled, held_out = trained
+    assert compiled.verify(model, scaler, held_out) <= 1e-12
+
+    tampered = CompiledForest(compiled.feature, compiled.threshold, compiled.left, compiled.right,
+                              compiled.value + 1.0, compiled.roots, compiled.max_depth)
+    assert tampered.verify(model, scaler, held_out) is None
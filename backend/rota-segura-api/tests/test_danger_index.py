@@ -0,0 +1,116 @@
+import pytest
+
+from conftest import add_streets
+from src.models.rota_segura import RotaSegura
+from src.services.danger_index import DangerSnapshot, StreetDangerIndex, StreetRecord
+from src.services.text_utils import normalize_street_name
+
+# ordem de inserção = ordem dos ids; "Goiás Velha" vem antes de "Goiás" de propósito
+STREETS = [
+    ('Rua Goiás Velha', '20:00', '05:00', 6.0),
+    ('Avenida Brasil', '08:00', '18:00', 3.0),
+    ('Rua Goiás', '22:00', '03:00', 8.0),
+    ('Rua São João', '17:00', '04:00', 7.0),
+    ('Travessa  São   João', '00:00', '23:59', 2.0),
+    ('Rua Goiás', '10:00', '11:00', 9.0),
+    ('AVENIDA PAULISTA', '18:00', '23:00', 5.0),
+]
+
+QUERIES = [
+    # exatos
+    'Avenida Brasil', 'Rua Goiás', 'Rua São João', 'AVENIDA PAULISTA',
+    # sem acento
+    'Rua Goias', 'rua sao joao', 'Goias Velha',
+    # maiúsculas
+    'AVENIDA BRASIL', 'RUA GOIÁS VELHA', 'avenida paulista',
+    # trechos do nome
+    'Goiás', 'Brasil', 'São', 'joão', 'Travessa São João', 'Paulista',
+    # ausentes
+    'Rua Inexistente', 'Goiás Novo',
+]
+
+
+@pytest.fixture
+def streets(session):
+    return add_streets(session, STREETS)
+
+
+def baseline(session, street_name):
+    """
+    Consulta antiga: ILIKE '%nome%' ... first(), em ordem de id
+    """
+    return session.query(RotaSegura).filter(
+        RotaSegura.nomeRua.ilike(f"%{street_name}%")
+    ).order_by(RotaSegura.id).first()
+
+
+def reference(session, street_name):
+    """
+    O mesmo critério com os nomes normalizados (acentos, caixa e espaços ignorados)
+    """
+    term = normalize_street_name(street_name)
+    for street in session.query(RotaSegura).order_by(RotaSegura.id):
+        if term in normalize_street_name(street.nomeRua):
+            return street
+    return None
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_lookup_matches_first_street_by_id(session, streets, query):
+    index = StreetDangerIndex(refresh_interval=3600)
+    index.load(session)
+    found = index.lookup(query)
+    expected = reference(session, query)
+    assert (found.id if found else None) == (expected.id if expected else None)
+
+    # onde a consulta antiga encontra algo, o índice devolve a mesma rua
+    old = baseline(session, query)
+    if old is not None:
+        assert found is not None and found.id == old.id
+
+
+def test_substring_returns_earlier_longer_name(session, streets):
+    index = StreetDangerIndex(refresh_interval=3600)
+    index.load(session)
+    # como no ILIKE, "Rua Goiás" casa primeiro com "Rua Goiás Velha" (menor id)
+    assert index.lookup('Rua Goiás').id == streets[0].id
+    assert index.lookup('Rua Goiás').nomeRua == 'Rua Goiás Velha'
+
+
+def test_exact_name_before_longer_name():
+    records = [
+        StreetRecord(1, 'Rua Goiás', '20:00', '05:00', 6.0),
+        StreetRecord(2, 'Rua Goiás Velha', '20:00', '05:00', 7.0),
+        StreetRecord(3, 'Rua Goiás', '20:00', '05:00', 8.0),
+    ]
+    snapshot = DangerSnapshot(records)
+    assert snapshot.find('rua goias') == 0
+    assert snapshot.find('rua goias velha') == 1
+    assert snapshot.find('velha') == 1
+    assert snapshot.find('rua goias nova') == -1
+
+
+def test_term_does_not_match_across_names():
+    snapshot = DangerSnapshot([
+        StreetRecord(1, 'Rua A', '20:00', '05:00', 6.0),
+        StreetRecord(2, 'Rua B', '20:00', '05:00', 6.0),
+    ])
+    # o haystack concatena os nomes: o separador impede casar "a" + "rua"
+    assert snapshot.find('a rua') == -1
+    assert snapshot.find('') == 0
+
+
+def test_lookup_positions_and_memo():
+    snapshot = DangerSnapshot([
+        StreetRecord(1, 'Rua São João', '20:00', '05:00', 6.0),
+        StreetRecord(2, 'Avenida Brasil', '20:00', '05:00', 6.0),
+    ])
+    positions = snapshot.lookup_positions(['AVENIDA BRASIL', 'rua sao joao', 'Nenhuma', 'Avenida Brasil'])
+    assert positions.tolist() == [1, 0, -1, 1]
+    assert snapshot.memo == {'avenida brasil': 1, 'rua sao joao': 0, 'nenhuma': -1}
+
+
+def test_empty_index():
+    snapshot = DangerSnapshot([])
+    assert snapshot.find('rua') == -1
+    assert StreetDangerIndex().lookup('rua') is None
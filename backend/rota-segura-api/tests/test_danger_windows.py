@@ -0,0 +1,157 @@
+from datetime import time
+
+import numpy as np
+import pytest
+
+from conftest import add_streets
+from src.services.danger_index import DangerSnapshot, StreetDangerIndex, StreetRecord, parse_clock_minutes
+from src.services.routing_service import SafetyAnalyzer
+
+
+def clock(value: str) -> int:
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def snapshot_of(*windows):
+    return DangerSnapshot([
+        StreetRecord(i + 1, f'Rua {i + 1}', start, end, 4.0) for i, (start, end) in enumerate(windows)
+    ])
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('00:00', 0),
+    ('04:00', 240),
+    ('17:00', 1020),
+    ('23:59', 1439),
+    ('7:05', 425),
+    ('24:00', -1),
+    ('12:60', -1),
+    ('', -1),
+    ('meia-noite', -1),
+    (None, -1),
+])
+def test_parse_clock_minutes(value, expected):
+    assert parse_clock_minutes(value) == expected
+
+
+WINDOWS = [
+    # período, horário, em perigo
+    (('17:00', '04:00'), '16:59', False),
+    (('17:00', '04:00'), '17:00', True),
+    (('17:00', '04:00'), '23:59', True),
+    (('17:00', '04:00'), '00:00', True),
+    (('17:00', '04:00'), '04:00', True),
+    (('17:00', '04:00'), '04:01', False),
+    (('17:00', '04:00'), '12:00', False),
+    (('22:00', '03:00'), '21:59', False),
+    (('22:00', '03:00'), '22:00', True),
+    (('22:00', '03:00'), '00:00', True),
+    (('22:00', '03:00'), '03:00', True),
+    (('22:00', '03:00'), '03:01', False),
+    (('00:00', '23:59'), '00:00', True),
+    (('00:00', '23:59'), '12:00', True),
+    (('00:00', '23:59'), '23:59', True),
+    (('08:00', '18:00'), '07:59', False),
+    (('08:00', '18:00'), '08:00', True),
+    (('08:00', '18:00'), '18:00', True),
+    (('08:00', '18:00'), '18:01', False),
+    (('25:00', '03:00'), '01:00', False),
+    (('22:00', 'fim'), '23:00', False),
+]
+
+
+@pytest.mark.parametrize('window, at, expected', WINDOWS)
+def test_danger_mask(window, at, expected):
+    snapshot = snapshot_of(window)
+    assert snapshot.danger_mask(np.array([0]), clock(at)).tolist() == [expected]
+    # mesma resposta da verificação escalar de antes
+    assert SafetyAnalyzer(None).is_time_in_danger_period(
+        time(*divmod(clock(at), 60)), *window
+    ) == expected
+
+
+def test_danger_mask_all_windows_at_once():
+    snapshot = snapshot_of(*[window for window, _, _ in WINDOWS])
+    positions = np.arange(len(WINDOWS))
+    for at in {at for _, at, _ in WINDOWS}:
+        expected = [
+            SafetyAnalyzer(None).is_time_in_danger_period(time(*divmod(clock(at), 60)), *window)
+            for window, _, _ in WINDOWS
+        ]
+        assert snapshot.danger_mask(positions, clock(at)).tolist() == expected
+
+
+def test_unknown_streets_are_never_in_danger():
+    snapshot = snapshot_of(('00:00', '23:59'))
+    assert snapshot.danger_mask(np.array([-1, 0, -1]), 600).tolist() == [False, True, False]
+    assert snapshot.current_indices(np.array([-1, 0]), 600).tolist() == [2.0, 6.0]
+
+
+def test_current_indices_capped_at_ten():
+    snapshot = DangerSnapshot([StreetRecord(1, 'Rua 1', '17:00', '04:00', 8.0)])
+    assert snapshot.current_indices(np.array([0]), clock('17:00')).tolist() == [10.0]
+    assert snapshot.current_indices(np.array([0]), clock('16:59')).tolist() == [8.0]
+
+
+@pytest.mark.parametrize('windows, at, expected', [
+    ([('17:00', '04:00')], '12:00', '17:00'),
+    ([('17:00', '04:00')], '16:59', '17:00'),
+    ([('17:00', '04:00')], '17:00', '04:01'),
+    ([('17:00', '04:00')], '23:59', '04:01'),
+    ([('17:00', '04:00')], '04:00', '04:01'),
+    ([('17:00', '04:00')], '04:01', '17:00'),
+    ([('22:00', '03:00')], '23:00', '03:01'),
+    ([('22:00', '03:00')], '03:01', '22:00'),
+    # dia inteiro: a única fronteira é a meia-noite
+    ([('00:00', '23:59')], '12:00', '00:00'),
+    ([('00:00', '23:59')], '00:00', '00:00'),
+    # várias ruas: a fronteira mais próxima
+    ([('17:00', '04:00'), ('22:00', '03:00')], '18:00', '22:00'),
+    ([('17:00', '04:00'), ('22:00', '03:00')], '02:00', '03:01'),
+    ([('17:00', '04:00'), ('22:00', '03:00')], '03:30', '04:01'),
+])
+def test_next_boundary(windows, at, expected):
+    snapshot = snapshot_of(*windows)
+    boundary = snapshot.next_boundary(np.arange(len(windows)), clock(at))
+    assert f"{boundary // 60:02d}:{boundary % 60:02d}" == expected
+
+
+def test_next_boundary_without_windows():
+    snapshot = snapshot_of(('25:00', '03:00'))
+    assert snapshot.next_boundary(np.array([0]), 600) is None
+    assert snapshot.next_boundary(np.array([-1]), 600) is None
+    assert snapshot.next_boundary(np.array([], dtype=np.int64), 600) is None
+
+
+@pytest.fixture
+def analyzer(session):
+    add_streets(session, [
+        ('Rua Noturna', '17:00', '04:00', 6.0),
+        ('Rua Madrugada', '22:00', '03:00', 8.0),
+        ('Rua Dia Todo', '00:00', '23:59', 2.0),
+    ])
+    return SafetyAnalyzer(session, index=StreetDangerIndex(refresh_interval=3600))
+
+
+@pytest.mark.parametrize('at, expected_danger, valid_until', [
+    ('12:00', [False, False, True], '17:00'),
+    ('17:00', [True, False, True], '22:00'),
+    ('22:00', [True, True, True], '00:00'),
+    ('02:59', [True, True, True], '03:01'),
+    ('03:00', [True, True, True], '03:01'),
+    ('03:01', [True, False, True], '04:01'),
+    ('04:01', [False, False, True], '17:00'),
+])
+def test_route_analysis_valid_until(analyzer, at, expected_danger, valid_until):
+    analysis = analyzer.analyze_route_safety(
+        ['Rua Noturna', 'Rua Madrugada', 'Rua Dia Todo'], time(*divmod(clock(at), 60))
+    )
+    assert [street['is_danger_time'] for street in analysis['street_analyses']] == expected_danger
+    assert analysis['valid_until'] == valid_until
+
+
+def test_route_analysis_without_catalogued_streets(analyzer):
+    analysis = analyzer.analyze_route_safety(['Rua Desconhecida'], time(12, 0))
+    assert analysis['valid_until'] is None
+    assert analysis['streets_in_database'] == 0
@@ -0,0 +1,113 @@
+import time
+
+import pytest
+
+from src.services.geocoding_cache import GeocodingCache
+from src.services.ttl_cache import MISSING
+
+
+class Clock:
+    """
+    Relógio controlado pelo teste para time.time e time.monotonic
+    """
+
+    def __init__(self, monkeypatch):
+        self.now = 1_000_000.0
+        monkeypatch.setattr(time, 'time', lambda: self.now)
+        monkeypatch.setattr(time, 'monotonic', lambda: self.now)
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    return Clock(monkeypatch)
+
+
+def make_cache(path, **kwargs):
+    options = dict(max_entries=100, ttl=3600, negative_ttl=60)
+    options.update(kwargs)
+    return GeocodingCache(path=str(path), **options)
+
+
+def test_forward_key_is_normalized(tmp_path):
+    cache = make_cache(tmp_path / 'cache.sqlite3')
+    assert cache.forward_key('  Rua  GOIÁS ', 'São Paulo') == cache.forward_key('rua goias', 'sao paulo')
+
+
+def test_hit_and_miss(tmp_path):
+    cache = make_cache(tmp_path / 'cache.sqlite3')
+    assert cache.get('forward:rua a|sp') is MISSING
+    cache.set('forward:rua a|sp', [-23.5, -46.6])
+    assert cache.get('forward:rua a|sp') == [-23.5, -46.6]
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['disk_hits']) == (1, 1, 0)
+
+
+def test_negative_result_uses_shorter_ttl(tmp_path, clock):
+    cache = make_cache(tmp_path / 'cache.sqlite3')
+    cache.set('negativo', None)
+    cache.set('positivo', [1.0, 2.0])
+    assert cache.get('negativo') is None
+    assert cache.stats()['negative_hits'] == 1
+
+    clock.advance(61)
+    assert cache.get('negativo') is MISSING
+    assert cache.get('positivo') == [1.0, 2.0]
+    # o disco respeita a mesma expiração: um processo novo também não vê o negativo
+    fresh = make_cache(tmp_path / 'cache.sqlite3')
+    assert fresh.get('negativo') is MISSING
+    assert fresh.get('positivo') == [1.0, 2.0]
+    assert fresh.purge_expired() == 1
+
+
+def test_disk_tier_survives_memory(tmp_path):
+    make_cache(tmp_path / 'cache.sqlite3').set('reverse:-23.5500,-46.6300', {'road': 'Rua A'})
+
+    cache = make_cache(tmp_path / 'cache.sqlite3')
+    assert cache.get('reverse:-23.5500,-46.6300') == {'road': 'Rua A'}
+    assert cache.get('reverse:-23.5500,-46.6300') == {'road': 'Rua A'}
+    stats = cache.stats()
+    # a primeira leitura veio do disco e promoveu a entrada para a memória
+    assert (stats['hits'], stats['disk_hits'], stats['memory_entries']) == (2, 1, 1)
+
+
+def test_disk_failure_falls_back_to_memory_and_retries(tmp_path, clock):
+    directory = tmp_path / 'ainda-nao-existe'
+    cache = make_cache(directory / 'cache.sqlite3', max_entries=1)
+    cache.retry_seconds = 10
+    cache.max_retry_seconds = 15
+
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    assert cache.stats()['disk_failures'] == 1
+
+    # dentro do intervalo nem tenta abrir o arquivo
+    directory.mkdir()
+    cache.set('b', 2)
+    assert cache.stats()['disk_failures'] == 1
+    assert not (directory / 'cache.sqlite3').exists()
+
+    # passado o intervalo, volta a usar o disco
+    clock.advance(10)
+    cache.set('c', 3)
+    assert cache.stats()['disk_failures'] == 0
+    assert make_cache(directory / 'cache.sqlite3').get('c') == 3
+    # 'b' ficou só na memória e foi descartada pelo LRU
+    assert cache.get('b') is MISSING
+
+
+def test_disk_retry_backoff_doubles_up_to_limit(tmp_path, clock):
+    cache = make_cache(tmp_path / 'ausente' / 'cache.sqlite3')
+    cache.retry_seconds = 10
+    cache.max_retry_seconds = 25
+
+    delays = []
+    for _ in range(4):
+        cache.get('x')
+        delays.append(cache._disk_retry_at - clock.now)
+        clock.advance(delays[-1])
+    assert delays == [10, 20, 25, 25]
+    assert cache.stats()['disk_failures'] == 4
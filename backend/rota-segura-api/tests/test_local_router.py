@@ -0,0 +1,115 @@
+import csv
+import random
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from conftest import add_streets
+from src.services.danger_index import StreetDangerIndex
+from src.services.local_router import LocalRoutingEngine
+
+NAMES = ['Rua Bahia', 'Rua Goiás', 'Avenida Paulista', 'Rua Ceará', '']
+
+
+@pytest.fixture
+def router(tmp_path, session):
+    """
+    Grade 6x6 com ruas de mão única, arestas paralelas e nomes com perigo variado
+    """
+    add_streets(session, [
+        ('Rua Bahia', '00:00', '23:59', 9.0),
+        ('Rua Goiás', '18:00', '06:00', 7.0),
+        ('Avenida Paulista', '08:00', '12:00', 3.0),
+    ])
+    index = StreetDangerIndex(refresh_interval=3600)
+    index.load(session)
+
+    rng = random.Random(7)
+    path = tmp_path / 'grafo.csv'
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['from_lat', 'from_lng', 'to_lat', 'to_lng', 'length_m', 'speed_kmh', 'name', 'oneway'])
+        for i in range(6):
+            for j in range(6):
+                lat, lng = -23.55 + i * 0.001, -46.63 + j * 0.001
+                for di, dj in ((1, 0), (0, 1)):
+                    if i + di < 6 and j + dj < 6:
+                        writer.writerow([
+                            lat, lng, lat + di * 0.001, lng + dj * 0.001,
+                            '', rng.choice([20, 30, 50]), rng.choice(NAMES), rng.choice(['0', '0', '1'])
+                        ])
+        # aresta paralela mais lenta: o A* precisa escolher a melhor das duas
+        writer.writerow([-23.55, -46.63, -23.55, -46.629, '', 5, 'Rua Bahia', '1'])
+
+    engine = LocalRoutingEngine(graph_path=str(path), index=index, danger_weight=2.0, max_snap_meters=50)
+    engine.load()
+    return engine
+
+
+def reference_graph(router, weights):
+    """
+    DiGraph equivalente ao CSR, com o menor peso entre arestas paralelas
+    """
+    graph = nx.DiGraph()
+    graph.add_nodes_from(range(len(router.node_lat)))
+    sources = np.repeat(np.arange(len(router.node_lat)), np.diff(router.indptr))
+    for edge, (u, v) in enumerate(zip(sources.tolist(), router.indices)):
+        weight = float(weights[edge])
+        if not graph.has_edge(u, v) or weight < graph[u][v]['weight']:
+            graph.add_edge(u, v, weight=weight)
+    return graph
+
+
+@pytest.mark.parametrize('minute', [3 * 60, 10 * 60, 20 * 60])
+def test_shortest_path_matches_networkx(router, minute):
+    weights = router.edge_weights(minute)
+    graph = reference_graph(router, weights)
+    sources = np.repeat(np.arange(len(router.node_lat)), np.diff(router.indptr))
+
+    for source in graph.nodes:
+        for target in graph.nodes:
+            path = router.shortest_path(source, target, minute)
+            if not nx.has_path(graph, source, target):
+                assert path is None
+                continue
+            expected = nx.shortest_path_length(graph, source, target, weight='weight')
+
+            # caminho contíguo de source até target
+            nodes = [source] + [router.indices[edge] for edge in path]
+            assert nodes[-1] == target
+            assert sources[path].tolist() == nodes[:-1]
+            cost = sum(float(weights[edge]) for edge in path)
+            assert cost == pytest.approx(expected, rel=1e-6)
+            # mesmo caminho que o networkx quando ele é o único ótimo
+            reference = nx.shortest_path(graph, source, target, weight='weight')
+            if len(list(nx.all_shortest_paths(graph, source, target, weight='weight'))) == 1:
+                assert nodes == reference
+
+
+def test_edge_weights_cache(router):
+    night = router.edge_weights(20 * 60)
+    assert isinstance(night, np.ndarray) and night.dtype == np.float32
+    assert router.edge_weights(20 * 60 + 5) is night
+    assert not np.array_equal(router.edge_weights(10 * 60), night)
+    # arestas da Rua Bahia (perigo 9 o dia todo) pesam mais que o tempo de viagem
+    bahia = router.edge_name == router.names.index('Rua Bahia')
+    assert np.all(night[bahia] > router.edge_time[bahia])
+
+
+def test_edge_weights_cache_is_bounded(router, monkeypatch):
+    monkeypatch.setattr('src.services.local_router.WEIGHTS_CACHE_BUCKETS', 3)
+    for hour in range(6):
+        router.edge_weights(hour * 60)
+    assert list(router._weights_cache) == [3 * 60, 4 * 60, 5 * 60]
+
+
+def test_route_format(router):
+    route = router.route((-23.55, -46.63), (-23.545, -46.625), 12 * 60)
+    assert route is not None
+    coordinates = route['geometry']['coordinates']
+    assert coordinates[0] == pytest.approx([-46.63, -23.55])
+    assert coordinates[-1] == pytest.approx([-46.625, -23.545])
+    assert route['distance'] == pytest.approx(sum(step['distance'] for step in route['legs'][0]['steps']), rel=1e-6)
+    # ponto longe do grafo não é encaixado
+    assert router.route((-23.0, -46.0), (-23.545, -46.625), 12 * 60) is None
@@ -0,0 +1,38 @@
+from flask import Flask
+
+from src.services.profiling import RequestProfiler
+
+
+def make_app(token):
+    profiler = RequestProfiler(enabled=True, sample_rate=0.0, token=token)
+    app = Flask(__name__)
+
+    @app.route('/ping')
+    def ping():
+        return 'pong'
+
+    profiler.install(app)
+    return app.test_client(), profiler
+
+
+def test_without_token_header_is_ignored_and_admin_not_mounted():
+    client, profiler = make_app('')
+    response = client.get('/ping', headers={'X-Profile': '1'})
+    assert 'X-Profile-Id' not in response.headers
+    assert profiler.list_profiles() == []
+    assert client.get('/api/admin/profiles').status_code == 404
+
+
+def test_with_token():
+    client, profiler = make_app('segredo')
+    assert 'X-Profile-Id' not in client.get('/ping', headers={'X-Profile': 'errado'}).headers
+
+    response = client.get('/ping', headers={'X-Profile': 'segredo'})
+    profile_id = response.headers['X-Profile-Id']
+    assert [entry['id'] for entry in profiler.list_profiles()] == [profile_id]
+
+    assert client.get('/api/admin/profiles').status_code == 401
+    assert client.get('/api/admin/profiles', headers={'X-Admin-Token': 'ã'}).status_code == 401
+    listing = client.get('/api/admin/profiles', headers={'X-Admin-Token': 'segredo'})
+    assert listing.status_code == 200
+    assert listing.get_json()['profiles'][0]['path'] == '/ping'
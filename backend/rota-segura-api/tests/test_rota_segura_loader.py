@@ -0,0 +1,38 @@
+from sqlalchemy import select, text
+
+from conftest import add_streets
+from src.models.rota_segura import RotaSegura
+from src.services.rota_segura_loader import RotaSeguraLoader
+
+
+def normalized_names(engine):
+    table = RotaSegura.__table__
+    with engine.connect() as connection:
+        return dict(connection.execute(select(table.c.nomeRua, table.c.nomeRuaNormalizado)).all())
+
+
+def test_insert_sets_normalized_name(engine):
+    stats = RotaSeguraLoader(engine).load([
+        {'nomeRua': 'Rua  São João', 'horarioInicio': '20:00', 'horarioFim': '05:00', 'indicePericulosidade': '7'},
+        {'nomeRua': 'Avenida Goiás', 'horarioInicio': '08:00', 'horarioFim': '18:00', 'indicePericulosidade': 2},
+    ])
+    assert stats['inserted'] == 2
+    assert normalized_names(engine) == {'Rua São João': 'rua sao joao', 'Avenida Goiás': 'avenida goias'}
+
+
+def test_update_existing_sets_normalized_name(engine, session):
+    add_streets(session, [('Rua Ceará', '08:00', '18:00', 1.0), ('Rua Pará', '08:00', '18:00', 1.0)])
+    # linhas antigas ou gravadas por fora da API: sem o nome normalizado
+    with engine.begin() as connection:
+        connection.execute(text('UPDATE "RotaSegura" SET "nomeRuaNormalizado" = NULL'))
+
+    stats = RotaSeguraLoader(engine, update_existing=True).load([
+        {'nomeRua': 'Rua Ceará', 'horarioInicio': '22:00', 'horarioFim': '04:00', 'indicePericulosidade': 8},
+    ])
+    assert stats['updated'] == 1
+    assert normalized_names(engine) == {'Rua Ceará': 'rua ceara', 'Rua Pará': None}
+    with engine.connect() as connection:
+        row = connection.execute(
+            select(RotaSegura.__table__).where(RotaSegura.__table__.c.nomeRua == 'Rua Ceará')
+        ).one()
+    assert (row.horarioInicio, row.horarioFim, row.indicePericulosidade) == ('22:00', '04:00', 8.0)
@@ -0,0 +1,95 @@
+from datetime import time
+
+import pytest
+
+from conftest import add_streets
+from src.services.danger_index import StreetDangerIndex
+from src.services.routing_service import SafetyAnalyzer
+
+ROUTES = [
+    ['Rua Goiás', 'Avenida Brasil', 'Rua Desconhecida'],
+    # ruas repetidas entre rotas e dentro da mesma rota
+    ['Avenida Brasil', 'RUA GOIAS', 'Avenida Brasil', 'Rua das Flores'],
+    ['Rua Desconhecida', 'Outra Rua Qualquer'],
+    [],
+    ['Rua das Flores'],
+]
+
+
+@pytest.fixture
+def analyzer(session):
+    add_streets(session, [
+        ('Rua Goiás', '20:00', '05:00', 6.0),
+        ('Avenida Brasil', '08:00', '18:00', 3.0),
+        ('Rua das Flores', '22:00', '03:00', 8.0),
+    ])
+    return SafetyAnalyzer(session, index=StreetDangerIndex(refresh_interval=3600))
+
+
+def expected_route(analyzer, street_names, current_time):
+    """
+    Análise rua a rua, como antes do lote: uma busca por rua e a média simples
+    """
+    streets = []
+    for name in street_names:
+        record = analyzer.index.lookup(name)
+        base = record.indicePericulosidade if record is not None else 2.0
+        danger = record is not None and analyzer.is_time_in_danger_period(
+            current_time, record.horarioInicio, record.horarioFim
+        )
+        streets.append({
+            'street_name': name,
+            'found_in_db': record is not None,
+            'base_danger_index': base,
+            'current_danger_index': min(10.0, base * 1.5) if danger else base,
+            'is_danger_time': danger,
+            'danger_period': f"{record.horarioInicio} - {record.horarioFim}" if record is not None else None
+        })
+    total = len(street_names)
+    found = sum(street['found_in_db'] for street in streets)
+    average = sum(street['current_danger_index'] for street in streets) / total if total else 0
+    return {
+        'street_analyses': streets,
+        'average_danger_index': average,
+        'safety_level': analyzer.classify_safety_level(average),
+        'database_coverage': found / total * 100 if total else 0,
+        'total_streets': total,
+        'streets_in_database': found
+    }
+
+
+@pytest.mark.parametrize('current_time', [time(2, 0), time(12, 0), time(21, 0), time(23, 30)])
+def test_batch_matches_per_route_analysis(analyzer, current_time):
+    batch = analyzer.analyze_routes_batch(ROUTES, current_time)
+    assert len(batch) == len(ROUTES)
+    for street_names, analysis in zip(ROUTES, batch):
+        assert analysis == analyzer.analyze_route_safety(street_names, current_time)
+
+        expected = expected_route(analyzer, street_names, current_time)
+        analysis = dict(analysis)
+        # valid_until é coberto em test_danger_windows; só existe com ruas catalogadas
+        assert (analysis.pop('valid_until') is None) == (expected['streets_in_database'] == 0)
+        assert analysis.pop('average_danger_index') == pytest.approx(expected.pop('average_danger_index'))
+        assert analysis == expected
+
+
+def test_duplicates_and_unknown_streets(analyzer):
+    first, second, unknown, empty, _ = analyzer.analyze_routes_batch(ROUTES, time(12, 0))
+
+    assert [street['found_in_db'] for street in second['street_analyses']] == [True, True, True, True]
+    assert second['total_streets'] == 4
+    assert second['street_analyses'][0] == second['street_analyses'][2]
+    assert first['street_analyses'][1]['current_danger_index'] == second['street_analyses'][0]['current_danger_index']
+
+    assert unknown['streets_in_database'] == 0
+    assert unknown['database_coverage'] == 0
+    assert unknown['average_danger_index'] == 2.0
+    assert empty['total_streets'] == 0 and empty['average_danger_index'] == 0
+
+
+def test_single_street_analysis(analyzer):
+    street = analyzer.analyze_street_safety('rua das flores', time(23, 0))
+    assert street['found_in_db']
+    assert street['is_danger_time']
+    assert street['current_danger_index'] == 10.0
+    assert not analyzer.analyze_street_safety('Rua Desconhecida', time(23, 0))['found_in_db']
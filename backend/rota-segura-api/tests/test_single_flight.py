@@ -0,0 +1,90 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.services.metrics import SINGLE_FLIGHT_EVENTS
+from src.services.single_flight import SingleFlight, SingleFlightTimeout
+
+THREADS = 16
+
+
+def wait_for_waiters(name, count, timeout=5.0):
+    """
+    Aguarda `count` threads entrarem como seguidoras da chamada em andamento
+    """
+    deadline = time.monotonic() + timeout
+    while SINGLE_FLIGHT_EVENTS.value(flight=name, result='shared') < count:
+        assert time.monotonic() < deadline, 'seguidoras não chegaram a tempo'
+        time.sleep(0.001)
+
+
+def test_concurrent_calls_share_one_upstream_call():
+    flight = SingleFlight('teste-compartilhado', timeout=5)
+    release = threading.Event()
+    calls = []
+
+    def upstream(value):
+        calls.append(value)
+        assert release.wait(5)
+        return {'rota': value}
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        futures = [executor.submit(flight.do, 'chave', upstream, 'A') for _ in range(THREADS)]
+        wait_for_waiters('teste-compartilhado', THREADS - 1)
+        assert flight.in_flight() == 1
+        release.set()
+        results = [future.result(timeout=5) for future in futures]
+
+    assert calls == ['A']
+    # todas recebem o mesmo objeto
+    assert all(result is results[0] for result in results)
+    assert flight.in_flight() == 0
+    assert SINGLE_FLIGHT_EVENTS.value(flight='teste-compartilhado', result='leader') == 1
+
+
+def test_leader_error_reaches_waiters():
+    flight = SingleFlight('teste-erro', timeout=5)
+    release = threading.Event()
+    calls = []
+
+    def upstream():
+        calls.append(1)
+        assert release.wait(5)
+        raise ConnectionError('OSRM indisponível')
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        futures = [executor.submit(flight.do, 'chave', upstream) for _ in range(THREADS)]
+        wait_for_waiters('teste-erro', THREADS - 1)
+        release.set()
+        errors = [future.exception(timeout=5) for future in futures]
+
+    assert len(calls) == 1
+    assert all(isinstance(error, ConnectionError) for error in errors)
+    assert all(error is errors[0] for error in errors)
+    # o erro não fica guardado: a próxima chamada executa de novo
+    assert flight.do('chave', lambda: 'ok') == 'ok'
+
+
+def test_waiter_times_out_when_leader_hangs():
+    flight = SingleFlight('teste-timeout', timeout=5)
+    release = threading.Event()
+
+    with ThreadPoolExecutor(1) as executor:
+        leader = executor.submit(flight.do, 'chave', release.wait, 5)
+        while flight.in_flight() == 0:
+            time.sleep(0.001)
+
+        started = time.monotonic()
+        with pytest.raises(SingleFlightTimeout):
+            flight.do('chave', lambda: pytest.fail('seguidora não deve executar'), timeout=0.05)
+        assert time.monotonic() - started < 2
+        assert SINGLE_FLIGHT_EVENTS.value(flight='teste-timeout', result='timeout') == 1
+
+        # chaves diferentes não esperam umas pelas outras
+        assert flight.do('outra', lambda: 'livre') == 'livre'
+
+        release.set()
+        assert leader.result(timeout=5) is True
+    assert flight.in_flight() == 0
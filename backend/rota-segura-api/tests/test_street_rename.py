@@ -0,0 +1,99 @@
+from sqlalchemy import select, text
+
+from conftest import add_streets
+from src.models.rota_segura import RotaSegura
+from src.services.danger_index import StreetDangerIndex
+from src.services.database import ensure_street_name_index
+from src.services.index_watcher import IndexWatcher
+
+STREETS = [
+    ('Rua Teste 1', '20:00', '05:00', 6.0),
+    ('Rua Teste 2', '08:00', '18:00', 3.0),
+    ('Rua Teste 3', '22:00', '03:00', 8.0),
+    ('Rua Teste 4', '17:00', '04:00', 7.0),
+    ('Rua Teste 5', '00:00', '23:59', 2.0),
+]
+
+
+def stored_name(session, street_id):
+    return session.execute(
+        select(RotaSegura.nomeRuaNormalizado).where(RotaSegura.id == street_id)
+    ).scalar_one()
+
+
+def rename_with_sql(session, street_id, name):
+    # como o psql ou o Prisma: só nomeRua muda
+    session.execute(text('UPDATE "RotaSegura" SET "nomeRua" = :name WHERE id = :id'), {'name': name, 'id': street_id})
+    session.commit()
+
+
+def loaded_index(session):
+    index = StreetDangerIndex(refresh_interval=3600)
+    index.load(session)
+    return index
+
+
+def test_sql_rename_clears_stored_name(session):
+    rows = add_streets(session, STREETS)
+    assert stored_name(session, rows[3].id) == 'rua teste 4'
+    rename_with_sql(session, rows[3].id, 'Avenida Nova Exemplo')
+    assert stored_name(session, rows[3].id) is None
+
+
+def test_orm_rename_updates_stored_name(session):
+    rows = add_streets(session, STREETS)
+    rows[3].nomeRua = 'Avenida Nova Exemplo'
+    session.commit()
+    assert stored_name(session, rows[3].id) == 'avenida nova exemplo'
+
+
+def test_sql_rename_applied_incrementally(session):
+    rows = add_streets(session, STREETS)
+    index = loaded_index(session)
+    watcher = IndexWatcher({'danger': index}, interval=0, full_reload_ratio=1.0, keep=0)
+    generation = index.generation
+
+    rename_with_sql(session, rows[3].id, 'Avenida Nova Exemplo')
+    assert watcher.poll(session)
+
+    assert index.generation == generation + 1
+    assert index.lookup('Avenida Nova Exemplo').id == rows[3].id
+    assert index.lookup('Rua Teste 4') is None
+    # o watcher preenche de novo o valor anulado pelo trigger
+    assert stored_name(session, rows[3].id) == 'avenida nova exemplo'
+
+
+def test_orm_rename_applied_incrementally(session):
+    rows = add_streets(session, STREETS)
+    index = loaded_index(session)
+    watcher = IndexWatcher({'danger': index}, interval=0, full_reload_ratio=1.0, keep=0)
+
+    rows[3].nomeRua = 'Avenida Nova Exemplo'
+    session.commit()
+    watcher.poll(session)
+
+    assert index.lookup('avenida nova exemplo').id == rows[3].id
+    assert index.lookup('Rua Teste 4') is None
+
+
+def test_rename_applied_by_full_reload(session):
+    rows = add_streets(session, STREETS)
+    index = loaded_index(session)
+    rename_with_sql(session, rows[3].id, 'Avenida Nova Exemplo')
+    index.reload(session)
+    assert index.lookup('Avenida Nova Exemplo').id == rows[3].id
+    assert index.lookup('Rua Teste 4') is None
+
+
+def test_startup_corrects_stale_stored_names(session, engine):
+    rows = add_streets(session, STREETS)
+    # valor gravado antes do trigger existir
+    session.execute(
+        text('UPDATE "RotaSegura" SET "nomeRua" = :name, "nomeRuaNormalizado" = :stale WHERE id = :id'),
+        {'name': 'Avenida Nova Exemplo', 'stale': 'rua teste 4', 'id': rows[3].id}
+    )
+    session.commit()
+
+    assert ensure_street_name_index(engine) == 1
+    assert stored_name(session, rows[3].id) == 'avenida nova exemplo'
+    assert loaded_index(session).lookup('Rua Teste 4') is None
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from src.services.ai_service import SYNTHETIC_BLOCK_SIZE, RouteOptimizationAI
+
+# atravessa várias fronteiras de bloco lógico e termina no meio de um
+NUM_SAMPLES = 2 * SYNTHETIC_BLOCK_SIZE + 1234
+
+
+@pytest.fixture(scope='module')
+def trainer():
+    return RouteOptimizationAI()
+
+
+@pytest.fixture(scope='module')
+def reference(trainer):
+    return trainer.generate_synthetic_training_data(NUM_SAMPLES, seed=3)
+
+
+@pytest.mark.parametrize('chunk_size', [777, SYNTHETIC_BLOCK_SIZE, SYNTHETIC_BLOCK_SIZE + 1, 100000])
+def test_data_does_not_depend_on_chunk_size(trainer, reference, chunk_size):
+    chunks = list(trainer.iter_synthetic_training_data(NUM_SAMPLES, seed=3, chunk_size=chunk_size))
+    assert all(len(y) == chunk_size for _, y in chunks[:-1])
+    assert 0 < len(chunks[-1][1]) <= chunk_size
+
+    np.testing.assert_array_equal(np.concatenate([X for X, _ in chunks]), reference[0])
+    np.testing.assert_array_equal(np.concatenate([y for _, y in chunks]), reference[1])
+
+
+def test_prefix_and_seed(trainer, reference):
+    # menos amostras: os blocos completos são os mesmos; outra semente: outros dados
+    X, y = trainer.generate_synthetic_training_data(SYNTHETIC_BLOCK_SIZE + 10, seed=3)
+    np.testing.assert_array_equal(X[:SYNTHETIC_BLOCK_SIZE], reference[0][:SYNTHETIC_BLOCK_SIZE])
+    np.testing.assert_array_equal(y[:SYNTHETIC_BLOCK_SIZE], reference[1][:SYNTHETIC_BLOCK_SIZE])
+
+    other, _ = trainer.generate_synthetic_training_data(100, seed=4)
+    assert not np.array_equal(other, reference[0][:100])
+
+    X, y = trainer.generate_synthetic_training_data(0, seed=3)
+    assert X.shape == (0, 13) and y.shape == (0,)
+
+
+def test_write_matches_generate(trainer, reference, tmp_path):
+    X_path, y_path = trainer.write_synthetic_training_data(
+        str(tmp_path / 'sintetico'), NUM_SAMPLES, seed=3, chunk_size=5000
+    )
+    np.testing.assert_array_equal(np.load(X_path), reference[0])
+    np.testing.assert_array_equal(np.load(y_path), reference[1])